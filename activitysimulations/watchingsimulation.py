@@ -1,7 +1,264 @@
-from domainmodel.movie import Movie
+"""simulated users watching and reviewing movies, for load generation and test data
+
+run from the repository root to write events to a file:
+    python -m activitysimulations.watchingsimulation [data file] --events N --out PATH [--csv] [--workers N]"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from datafilereaders.movie_file_csv_reader import POOL_START_METHOD, MovieFileCSVReader
 from domainmodel.user import User
 from domainmodel.review import Review
 
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), "..", "datafiles", "Data1000Movies.csv")
+# one watched movie, rating is 0 when the viewing was not reviewed
+EVENT_DTYPE = np.dtype([("timestamp", "<f8"), ("user", "<u4"), ("movie", "<u4"), ("minutes", "<u2"), ("rating", "u1")])
+# rating given to movies without one when sampling review ratings
+DEFAULT_RATING = 6.5
+# review ratings are spread around the movie's rating with this standard deviation
+RATING_SPREAD = 1.5
+# review texts by rating, 1-3, 4-7 and 8-10
+REVIEW_TEXTS = ("not for me", "worth a watch", "loved it")
+
+# the parameters of the simulation a worker process generates batches for, set by _init_worker
+_worker_parameters = None
+
+
+def zipf_cdf(count, exponent):
+    """cumulative probabilities of ranks 0..count-1 when rank r is drawn with weight 1 / (r + 1) ** exponent"""
+    weights = 1.0 / np.arange(1, count + 1, dtype=np.float64) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def _sample(cdf, uniform):
+    return np.minimum(np.searchsorted(cdf, uniform, side="right"), len(cdf) - 1)
+
+
+def generate_batch(parameters, index, start, size):
+    """events start..start + size of a simulation, drawn from a generator seeded with (seed, index)
+    so every batch is the same whichever process generates it"""
+    seed, movie_cdf, movies_by_rank, user_cdf, runtimes, ratings, review_probability, start_time, rate = parameters
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+    events = np.empty(size, dtype=EVENT_DTYPE)
+    # (position + jitter) / rate never decreases, so events come out in time order
+    events["timestamp"] = start_time + (np.arange(start, start + size) + rng.random(size)) / rate
+    events["user"] = _sample(user_cdf, rng.random(size))
+    movies = movies_by_rank[_sample(movie_cdf, rng.random(size))]
+    events["movie"] = movies
+    # most viewings are finished, some are abandoned part way
+    completion = np.minimum(1.0, rng.beta(5.0, 1.0, size) * 1.1)
+    events["minutes"] = np.rint(runtimes[movies] * completion)
+    reviewed = rng.random(size) < review_probability
+    review_ratings = np.clip(np.rint(rng.normal(ratings[movies], RATING_SPREAD)), 1, 10)
+    events["rating"] = np.where(reviewed, review_ratings, 0)
+    return events
+
+
+def _init_worker(parameters):
+    global _worker_parameters
+    _worker_parameters = parameters
+
+
+def _generate_in_worker(index, start, size):
+    return generate_batch(_worker_parameters, index, start, size)
+
 
 class MovieWatchingSimulation:
-    pass
+    """users watching movies picked by popularity, generated in batches of EVENT_DTYPE records
+
+    movies are ranked by votes and drawn from a zipf distribution over that rank, and users are
+    drawn from a second zipf distribution so a few users are much more active than the rest.
+    every batch is generated with vectorised numpy sampling from its own seeded generator, so a
+    run is reproducible from its seed whatever the number of worker processes, and batches are
+    handed to a sink as they are made instead of being kept in memory"""
+
+    def __init__(
+        self,
+        movies,
+        users=10_000,
+        seed=None,
+        movie_exponent=1.1,
+        user_exponent=0.8,
+        review_probability=0.05,
+        events_per_second=100.0,
+        start_time=None,
+    ):
+        """movies is a list of Movies, e.g. MovieFileCSVReader.dataset_of_movies, events name them by
+        their position in it and name users by a number below users"""
+        if not len(movies):
+            raise ValueError("no movies to watch")
+        if users < 1:
+            raise ValueError("users must be at least 1")
+        self._movies = movies
+        self._users = users
+        self._seed = np.random.SeedSequence().entropy if seed is None else seed
+        votes = np.array([x.votes if x.votes is not None else 0 for x in movies], dtype=np.int64)
+        runtimes = np.array([x.runtime_minutes or 0 for x in movies], dtype=np.float64)
+        ratings = np.array([x.rating if x.rating is not None else DEFAULT_RATING for x in movies], dtype=np.float64)
+        # most voted first, ties keep the list order
+        movies_by_rank = np.argsort(-votes, kind="stable").astype(np.uint32)
+        self._parameters = (
+            self._seed,
+            zipf_cdf(len(movies), movie_exponent),
+            movies_by_rank,
+            zipf_cdf(users, user_exponent),
+            runtimes,
+            ratings,
+            review_probability,
+            time.time() if start_time is None else start_time,
+            events_per_second,
+        )
+
+    @property
+    def movies(self):
+        return self._movies
+
+    @property
+    def users(self):
+        return self._users
+
+    @property
+    def seed(self):
+        """the seed the run is generated from, pass it to a new simulation to repeat the run"""
+        return self._seed
+
+    def batch(self, index, batch_size=100_000):
+        """batch number index of a run made with batch_size"""
+        return generate_batch(self._parameters, index, index * batch_size, batch_size)
+
+    def iter_batches(self, events, batch_size=100_000, workers=1):
+        """yields the batches of a run of events events in order, workers > 1 (or None for one per cpu)
+        generates them in a process pool, holding at most two batches per worker at a time"""
+        tasks = [(i, start, min(batch_size, events - start)) for i, start in enumerate(range(0, events, batch_size))]
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 1 or len(tasks) <= 1:
+            for task in tasks:
+                yield generate_batch(self._parameters, *task)
+            return
+        # workers are never forked from this process, which may be running other threads
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(tasks)),
+            mp_context=multiprocessing.get_context(POOL_START_METHOD),
+            initializer=_init_worker,
+            initargs=(self._parameters,),
+        ) as executor:
+            pending = deque()
+            tasks = iter(tasks)
+            for task in tasks:
+                pending.append(executor.submit(_generate_in_worker, *task))
+                if len(pending) >= 2 * workers:
+                    break
+            while pending:
+                batch = pending.popleft().result()
+                task = next(tasks, None)
+                if task is not None:
+                    pending.append(executor.submit(_generate_in_worker, *task))
+                yield batch
+
+    def run(self, events, sink, batch_size=100_000, workers=1):
+        """streams events events to sink.write(batch) in order and returns the number written"""
+        written = 0
+        for batch in self.iter_batches(events, batch_size, workers):
+            sink.write(batch)
+            written += len(batch)
+        return written
+
+
+class BinaryEventSink:
+    """appends batches to a file as raw EVENT_DTYPE records, read them back with read_events"""
+
+    def __init__(self, path):
+        self._file = open(path, "wb")
+
+    def write(self, batch):
+        batch.tofile(self._file)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_events(path):
+    """memory maps a file written by BinaryEventSink"""
+    return np.memmap(path, dtype=EVENT_DTYPE, mode="r")
+
+
+class CsvEventSink(BinaryEventSink):
+    """writes batches as csv rows with a header"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._file.write((",".join(EVENT_DTYPE.names) + "\n").encode("utf-8"))
+
+    def write(self, batch):
+        np.savetxt(self._file, batch, fmt=["%.3f", "%d", "%d", "%d", "%d"], delimiter=",")
+
+
+class UserSink:
+    """applies events to User objects, created on a user's first event, so a simulation fills in
+    watched movies, watch time and reviews of the domain model
+
+    catalogue numbers movies for every User, e.g. the registry of the reader the movies came from,
+    without one each User numbers its own movies. users maps user numbers to their User
+    NOTE: this runs python code for every event, use it for test data rather than load generation"""
+
+    def __init__(self, movies, catalogue=None):
+        self._movies = movies
+        self._catalogue = catalogue
+        self._users = {}
+
+    @property
+    def users(self):
+        return self._users
+
+    def write(self, batch):
+        users = self._users
+        for user_id, movie_id, minutes, rating in zip(
+            batch["user"].tolist(), batch["movie"].tolist(), batch["minutes"].tolist(), batch["rating"].tolist()
+        ):
+            user = users.get(user_id)
+            if user is None:
+                user = users[user_id] = User(f"user{user_id}", "password", self._catalogue)
+            movie = self._movies[movie_id]
+            user.watch_movie(movie, minutes)
+            if rating:
+                user.add_review(Review(movie, REVIEW_TEXTS[(rating >= 4) + (rating >= 8)], rating))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data_path", nargs="?", default=SAMPLE_PATH)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--out", required=True, help="file the events are written to")
+    parser.add_argument("--csv", action="store_true", help="write csv instead of raw records")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=None, help="generator processes, one per cpu by default")
+    args = parser.parse_args()
+    reader = MovieFileCSVReader(args.data_path)
+    reader.read_csv_file()
+    simulation = MovieWatchingSimulation(reader.dataset_of_movies, users=args.users, seed=args.seed)
+    started = time.perf_counter()
+    with (CsvEventSink if args.csv else BinaryEventSink)(args.out) as sink:
+        written = simulation.run(args.events, sink, args.batch_size, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"{written} events in {elapsed:.2f}s ({written / elapsed * 60:,.0f} per minute), seed {simulation.seed}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
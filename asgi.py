@@ -0,0 +1,116 @@
+"""ASGI application serving main.app
+
+one event loop keeps any number of idle keep-alive connections open while the short CPU bound
+part of a request, main.app itself, runs on a small thread pool. every thread reads the same
+immutable index published by main.index_manager
+
+run it with any ASGI server, e.g. `python serve.py` or `uvicorn asgi:app`"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+
+THREADS_ENV = "MOVIE_MODEL_VIEWER_THREADS"
+FOLLOW_INTERVAL_ENV = "MOVIE_MODEL_VIEWER_FOLLOW_INTERVAL"
+
+# the work of a request holds the GIL, a few threads only keep the event loop free while it runs
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get(THREADS_ENV, 4)))
+
+# serve.py watches the data file in one process and rewrites the snapshot, every worker only maps
+# the rewritten snapshot when it sees it change, checking every this many seconds (0 never checks)
+follow_interval = float(os.environ.get(FOLLOW_INTERVAL_ENV, 0))
+if follow_interval > 0:
+    main.index_manager.follow(follow_interval)
+
+
+def wsgi_environ(scope, body: bytes):
+    """the PEP 3333 environ of an ASGI http scope and its request body"""
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ[name] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            # repeated headers are joined like a WSGI server joins them
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_wsgi(environ):
+    """runs main.app on environ, returns the status code, headers and body, runs on the executor"""
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(" ", 1)[0]), headers]
+
+    iterable = main.app(environ, start_response)
+    try:
+        body = b"".join(iterable)
+    finally:
+        if hasattr(iterable, "close"):
+            iterable.close()
+    status, headers = started
+    return status, headers, body
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    environ = wsgi_environ(scope, await _read_body(receive))
+    # NOTE: responses are small json and html pages, so they are sent whole rather than streamed
+    status, headers, body = await asyncio.get_running_loop().run_in_executor(executor, call_wsgi, environ)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
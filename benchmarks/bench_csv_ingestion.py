@@ -0,0 +1,56 @@
+"""compares the serial csv reader with the chunked process pool reader
+
+run from the repository root:
+    python -m benchmarks.bench_csv_ingestion [--copies N] [--workers N ...]
+
+the sample dataset is repeated copies times into a temporary file to get a catalogue large
+enough for the process pool to pay off"""
+import argparse
+import os
+import tempfile
+import time
+
+from datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), "..", "datafiles", "Data1000Movies.csv")
+
+
+def write_large_csv(path, copies):
+    with open(SAMPLE_PATH, "r", encoding="utf-8-sig", newline="") as f:
+        header = f.readline()
+        body = f.read()
+    if not body.endswith("\n"):
+        body += "\n"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(header)
+        for _ in range(copies):
+            f.write(body)
+
+
+def time_read(path, workers):
+    reader = MovieFileCSVReader(path)
+    start = time.perf_counter()
+    reader.read_csv_file(workers=workers)
+    return time.perf_counter() - start, len(reader.dataset_of_movies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=200, help="times the sample dataset is repeated")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "movies.csv")
+        write_large_csv(path, args.copies)
+        size_mb = os.path.getsize(path) / (1 << 20)
+        serial, rows = time_read(path, 1)
+        print(f"{rows} rows, {size_mb:.1f} MiB")
+        print(f"serial      {serial:8.3f}s")
+        for workers in sorted(set(args.workers)):
+            elapsed, parallel_rows = time_read(path, workers)
+            assert parallel_rows == rows
+            print(f"{workers:3d} workers {elapsed:8.3f}s  {serial / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
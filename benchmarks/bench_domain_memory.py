@@ -0,0 +1,92 @@
+"""reports bytes per movie of the domain model object graph
+
+run from the repository root:
+    python -m benchmarks.bench_domain_memory [data file]
+
+the movies read from the file are copied twice, reusing the same strings so only the object
+overhead is measured: once with the slotted domain classes and once with plain __dict__ backed
+objects holding the same attributes and an eagerly allocated colleague set per actor, which is
+how the classes were laid out before they used __slots__"""
+import os
+import sys
+import tracemalloc
+
+from datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+from domainmodel.movie import Movie
+from domainmodel.actor import Actor
+from domainmodel.genre import Genre
+from domainmodel.director import Director
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), "..", "datafiles", "Data1000Movies.csv")
+
+
+class _DictObject:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+def copy_slotted(movies):
+    entities = {}
+
+    def shared(cls, name):
+        return entities.setdefault((cls, name), cls(name))
+
+    copies = []
+    for movie in movies:
+        copy = Movie(movie.title, movie.year)
+        copy.actors = [shared(Actor, x.actor_full_name) for x in movie.actors]
+        copy.genres = [shared(Genre, x.genre_name) for x in movie.genres]
+        copy.director = shared(Director, movie.director.director_full_name)
+        copy.description = movie.description
+        copy.runtime_minutes = movie.runtime_minutes
+        copies.append(copy)
+    return copies
+
+
+def copy_dict_backed(movies):
+    entities = {}
+
+    def shared(key, name, **extra):
+        return entities.setdefault((key, name), _DictObject(name=name, **extra))
+
+    copies = []
+    for movie in movies:
+        copies.append(
+            _DictObject(
+                _title=movie.title,
+                _year=movie.year,
+                _actors=[shared("actor", x.actor_full_name, colleague_set=set()) for x in movie.actors],
+                _genres=[shared("genre", x.genre_name) for x in movie.genres],
+                _director=shared("director", movie.director.director_full_name),
+                _description=movie.description,
+                _runtime_minutes=movie.runtime_minutes,
+            )
+        )
+    return copies
+
+
+def measure(copy, movies):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    copies = copy(movies)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del copies
+    return used
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else SAMPLE_PATH
+    reader = MovieFileCSVReader(path)
+    reader.read_csv_file()
+    movies = reader.dataset_of_movies
+    dict_backed = measure(copy_dict_backed, movies)
+    slotted = measure(copy_slotted, movies)
+    print(f"{len(movies)} movies, {len(reader.dataset_of_actors)} actors")
+    print(f"__dict__ objects  {dict_backed / len(movies):8.1f} bytes per movie")
+    print(f"__slots__ objects {slotted / len(movies):8.1f} bytes per movie")
+    print(f"saved             {1 - slotted / dict_backed:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""reports memory per user and watch list operation latency as lists grow
+
+run from the repository root:
+    python -m benchmarks.bench_watchlist [--users N] [--sizes N ...]
+
+users are filled with the same random movie ids, once as Users and once as naive users holding a
+list of references plus a set for membership, so only the containers differ. latencies are
+measured on a list while it grows from its size to at most twice that"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from domainmodel.user import User
+from domainmodel.watchlist import WatchList
+
+CATALOGUE_SIZE = 1_000_000
+
+
+class _NaiveUser:
+    def __init__(self, user_name):
+        self.user_name = user_name
+        self.watched_movies = []
+        self.watched_set = set()
+
+    def watch_movie(self, movie):
+        if movie not in self.watched_set:
+            self.watched_set.add(movie)
+            self.watched_movies.append(movie)
+
+
+def bytes_per_user(make_user, watch, users, size, movies):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    population = []
+    for i in range(users):
+        user = make_user(f"user{i}")
+        for movie in movies[i % len(movies)][:size]:
+            watch(user, movie)
+        population.append(user)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / users
+
+
+def latency(size):
+    """mean seconds of add, contains and remove on a watch list holding size movies"""
+    operations = min(20_000, max(100, size))
+    watchlist = WatchList()
+    ids = random.sample(range(CATALOGUE_SIZE), size + operations)
+    for movie_id in ids[:size]:
+        watchlist.add_movie(movie_id)
+    probes = ids[size:]
+    start = time.perf_counter()
+    for movie_id in probes:
+        watchlist.add_movie(movie_id)
+    add = time.perf_counter() - start
+    start = time.perf_counter()
+    for movie_id in probes:
+        movie_id in watchlist
+    contains = time.perf_counter() - start
+    start = time.perf_counter()
+    for movie_id in probes:
+        watchlist.remove_movie(movie_id)
+    remove = time.perf_counter() - start
+    return add / operations, contains / operations, remove / operations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000, help="users measured at each size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 8, 100, 1000, 5000])
+    args = parser.parse_args()
+    random.seed(0)
+    movies = [random.sample(range(CATALOGUE_SIZE), max(args.sizes)) for _ in range(16)]
+    print("movies   User bytes  naive bytes   add us  contains us  remove us")
+    for size in args.sizes:
+        users = max(1, min(args.users, 2_000_000 // max(size, 1)))
+        compact = bytes_per_user(lambda name: User(name, "pw"), User.watch_movie, users, size, movies)
+        naive = bytes_per_user(_NaiveUser, _NaiveUser.watch_movie, users, size, movies)
+        add, contains, remove = latency(size)
+        print(f"{size:6d} {compact:12.0f} {naive:12.0f} {add * 1e6:8.2f} {contains * 1e6:12.2f} {remove * 1e6:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
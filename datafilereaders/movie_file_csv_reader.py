@@ -1,18 +1,93 @@
 import csv
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from domainmodel.movie import Movie
-from domainmodel.actor import Actor
-from domainmodel.genre import Genre
-from domainmodel.director import Director
+from domainmodel.entity_registry import EntityRegistry
 
+# every movie needs these columns, the rest can be left out with iter_movies(columns=...)
+REQUIRED_COLUMNS = ("Title", "Year")
+# chunks smaller than this are not worth the cost of a worker process
+MIN_CHUNK_BYTES = 1 << 20
+_SCAN_BLOCK_BYTES = 1 << 20
+# workers are started from a clean server process, forking a process that already runs threads
+# (e.g. a web server's) can deadlock
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def find_record_boundaries(file_name, chunks):
+    """byte offsets splitting the rows of a csv file into at most chunks parts
+
+    returns [header end, ..., file size]; every offset is just after a newline that is not
+    inside a quoted field, found by tracking the parity of quote characters (escaped quotes
+    come in pairs so they never change it)"""
+    size = os.path.getsize(file_name)
+    targets = [size * i // chunks for i in range(1, chunks)]
+    boundaries = []
+    in_quotes = False
+    position = 0
+    with open(file_name, "rb") as f:
+        while targets or not boundaries:
+            block = f.read(_SCAN_BLOCK_BYTES)
+            if not block:
+                break
+            start = 0
+            while targets or not boundaries:
+                if boundaries and targets[0] - position > start:
+                    # nothing to find before the next target, only the quote parity matters
+                    skip_to = min(targets[0] - position, len(block))
+                    in_quotes ^= block.count(b'"', start, skip_to) % 2 == 1
+                    start = skip_to
+                newline = block.find(b"\n", start)
+                if newline == -1:
+                    in_quotes ^= block.count(b'"', start) % 2 == 1
+                    break
+                in_quotes ^= block.count(b'"', start, newline) % 2 == 1
+                start = newline + 1
+                if not in_quotes:
+                    # the first boundary ends the header
+                    boundaries.append(position + start)
+                    while targets and targets[0] <= position + start:
+                        targets.pop(0)
+            position += len(block)
+    if not boundaries or boundaries[-1] != size:
+        boundaries.append(size)
+    return boundaries
+
+
+def _optional_number(value, convert):
+    try:
+        return convert(value)
+    except ValueError:
+        return None
+
+
+def _parse_chunk(file_name, header, columns, start, stop):
+    """parses the rows between two record boundaries, run in a worker process"""
+    with open(file_name, "rb") as f:
+        f.seek(start)
+        text = f.read(stop - start).decode("utf-8")
+    projection = MovieFileCSVReader._column_projection(header, columns)
+    registry = EntityRegistry()
+    movies = []
+    for values in csv.reader(io.StringIO(text, newline="")):
+        if not values:
+            continue
+        movies.append(MovieFileCSVReader._movie_from_row({name: values[i] for name, i in projection}, registry))
+    # only the movies go back to the parent, which collects the entities as it interns them
+    return movies
 
-class MovieFileCSVReader:
-    _dataset_of_movies = []
-    _dataset_of_actors = set()
-    _dataset_of_directors = set()
-    _dataset_of_genres = set()
 
+class MovieFileCSVReader:
     def __init__(self, file_name: str):
         self._file_name = file_name
+        self._dataset_of_movies = []
+        self._dataset_of_actors = set()
+        self._dataset_of_directors = set()
+        self._dataset_of_genres = set()
+        self._registry = EntityRegistry()
 
     @property
     def file_name(self):
@@ -34,26 +109,108 @@ class MovieFileCSVReader:
     def dataset_of_genres(self):
         return self._dataset_of_genres
 
-    def read_csv_file(self):
-        with open(self.file_name, mode="r", encoding="utf-8-sig") as csvfile:
-            movie_file_reader = csv.DictReader(csvfile)
-            for row in movie_file_reader:
-                title = row["Title"]
-                release_year = int(row["Year"])
-                movie_obj = Movie(title, release_year)
-                actor_names = row["Actors"].split(",")
-                actors = [Actor(name) for name in actor_names]
-                for actor in actors:
-                    self._dataset_of_actors.add(actor)
-                movie_obj.actors = actors
-                genre_names = row["Genre"].split(",")
-                genres = [Genre(name) for name in genre_names]
-                for genre in genres:
-                    self._dataset_of_genres.add(genre)
-                movie_obj.genres = genres
-                movie_obj.description = row["Description"]
-                director = Director(row["Director"])
-                self._dataset_of_directors.add(director)
-                movie_obj.director = director
-                movie_obj.runtime_minutes = int(row["Runtime (Minutes)"])
-                self._dataset_of_movies.append(movie_obj)
+    @property
+    def registry(self):
+        """shared actor, genre and director instances of every movie read, with reverse indexes after read_csv_file"""
+        return self._registry
+
+    def iter_movies(self, columns=None):
+        """yields one Movie per row without keeping any of them
+        columns optionally limits which csv columns are read, e.g. ("Actors", "Genre"),
+        attributes of columns that are left out are never set on the Movie"""
+        with open(self.file_name, mode="r", encoding="utf-8-sig", newline="") as csvfile:
+            movie_file_reader = csv.reader(csvfile)
+            header = next(movie_file_reader, None)
+            if header is None:
+                return
+            projection = self._column_projection(header, columns)
+            for values in movie_file_reader:
+                if not values:
+                    continue
+                yield self._movie_from_row({name: values[i] for name, i in projection}, self._registry)
+
+    @staticmethod
+    def _column_projection(header, columns):
+        """(column name, position) pairs for the columns to read from rows with the given header"""
+        positions = {name: i for i, name in enumerate(header)}
+        if columns is None:
+            columns = header
+        wanted = set(columns) | set(REQUIRED_COLUMNS)
+        missing = [x for x in wanted if x not in positions]
+        if missing:
+            raise ValueError(f"missing columns: {', '.join(sorted(missing))}")
+        return [(name, positions[name]) for name in header if name in wanted]
+
+    @staticmethod
+    def _movie_from_row(row, registry):
+        title = row["Title"]
+        release_year = int(row["Year"])
+        movie_obj = Movie(title, release_year)
+        if "Actors" in row:
+            actor_names = row["Actors"].split(",")
+            movie_obj.actors = [registry.actor(name) for name in actor_names]
+        if "Genre" in row:
+            genre_names = row["Genre"].split(",")
+            movie_obj.genres = [registry.genre(name) for name in genre_names]
+        if "Description" in row:
+            movie_obj.description = row["Description"]
+        if "Director" in row:
+            movie_obj.director = registry.director(row["Director"])
+        if "Runtime (Minutes)" in row:
+            movie_obj.runtime_minutes = int(row["Runtime (Minutes)"])
+        # missing values are written as N/A or left blank, these stay None
+        if "Rating" in row:
+            movie_obj.rating = _optional_number(row["Rating"], float)
+        if "Votes" in row:
+            movie_obj.votes = _optional_number(row["Votes"], int)
+        if "Revenue (Millions)" in row:
+            movie_obj.revenue_millions = _optional_number(row["Revenue (Millions)"], float)
+        if "Metascore" in row:
+            movie_obj.metascore = _optional_number(row["Metascore"], int)
+        return movie_obj
+
+    def iter_chunks(self, workers=None, columns=None):
+        """yields the list of movies of consecutive chunks of the file in file order,
+        chunks are split at record boundaries and parsed by up to workers processes (None for one per cpu)"""
+        if workers is None:
+            workers = os.cpu_count() or 1
+        chunks = max(1, min(workers, os.path.getsize(self.file_name) // MIN_CHUNK_BYTES))
+        boundaries = find_record_boundaries(self.file_name, chunks)
+        with open(self.file_name, mode="r", encoding="utf-8-sig", newline="") as csvfile:
+            header = next(csv.reader(csvfile), None)
+        if header is None:
+            return
+        # fails early on missing columns instead of once per worker
+        self._column_projection(header, columns)
+        starts, stops = boundaries[:-1], boundaries[1:]
+        if len(starts) <= 1:
+            for start, stop in zip(starts, stops):
+                yield _parse_chunk(self.file_name, header, columns, start, stop)
+            return
+        context = multiprocessing.get_context(POOL_START_METHOD)
+        with ProcessPoolExecutor(max_workers=min(workers, len(starts)), mp_context=context) as executor:
+            # map keeps the chunks in file order whatever order the workers finish in
+            yield from executor.map(
+                _parse_chunk, repeat(self.file_name), repeat(header), repeat(columns), starts, stops
+            )
+
+    def read_csv_file(self, workers=1):
+        """reads the whole file into the dataset_of_* properties
+        workers > 1 (or None for one per cpu) parses chunks of the file in a process pool"""
+        self._dataset_of_movies = []
+        self._registry = EntityRegistry()
+        if workers == 1:
+            movies = self.iter_movies()
+        else:
+            # each worker interned its own chunk, share the instances across chunks as well
+            movies = (
+                self._registry.intern_movie(movie_obj)
+                for chunk_movies in self.iter_chunks(workers)
+                for movie_obj in chunk_movies
+            )
+        for movie_obj in movies:
+            self._registry.add_movie(movie_obj)
+            self._dataset_of_movies.append(movie_obj)
+        self._dataset_of_actors = set(self._registry.actors)
+        self._dataset_of_genres = set(self._registry.genres)
+        self._dataset_of_directors = set(self._registry.directors)
@@ -1,6 +1,10 @@
 class Actor:
+    # no per-instance __dict__, a catalogue holds a lot of actors
+    __slots__ = ("__actor_full_name", "_colleague_set")
+
     def __init__(self, actor_full_name: str):
-        self.colleague_set = set()
+        # most actors never get a colleague, so the set is only allocated when one is added
+        self._colleague_set = None
         # defines an attribute
         if actor_full_name == "" or type(actor_full_name) is not str:
             self.__actor_full_name = None
@@ -11,13 +15,24 @@ class Actor:
     def actor_full_name(self) -> str:
         return self.__actor_full_name
 
+    @property
+    def colleague_set(self) -> set:
+        if self._colleague_set is None:
+            self._colleague_set = set()
+        return self._colleague_set
+
+    @colleague_set.setter
+    def colleague_set(self, val):
+        self._colleague_set = val
+
     def __repr__(self):
         # defines the unique string representation of the object
         return f"<Actor {self.__actor_full_name}>"
 
     def __eq__(self, other):
         # check for equality of two Actor object instances by comparing the actor_full names
-        return self.__actor_full_name == other.__actor_full_name
+        # interned instances compare by identity without looking at the names
+        return self is other or self.__actor_full_name == other.__actor_full_name
 
     def __lt__(self, other):
         # implement a sorting order defined by the name
@@ -32,6 +47,18 @@ class Actor:
         # we allow for the colleague to be added to this actor's set of colleagues
         self.colleague_set.add(colleague)
 
-    def check_if_this_actor_worked_with(self, colleague):
+    def check_if_this_actor_worked_with(self, colleague, costar_graph=None):
         # this method checks if a given colleague Actor has worked with the actor at least once in the same movie
-        return colleague in self.colleague_set
+        # colleagues added by hand are checked first, then costar_graph when one is given, e.g. a
+        # MovieIndex.costar_graph, otherwise the movies of the EntityRegistry that interned this actor
+        if self._colleague_set is not None and colleague in self._colleague_set:
+            return True
+        if costar_graph is None:
+            # imported here, entity_registry imports this module
+            from domainmodel.entity_registry import registry_of
+
+            registry = registry_of(self)
+            return registry is not None and registry.worked_with(self, colleague)
+        actor_id = costar_graph.actor_id(self.__actor_full_name)
+        colleague_id = costar_graph.actor_id(colleague.actor_full_name)
+        return actor_id is not None and colleague_id is not None and costar_graph.worked_with(actor_id, colleague_id)
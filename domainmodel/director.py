@@ -1,4 +1,6 @@
 class Director:
+    __slots__ = ("__director_full_name",)
+
     def __init__(self, director_full_name: str):
         if director_full_name == "" or type(director_full_name) is not str:
             self.__director_full_name = None
@@ -14,7 +16,8 @@ class Director:
 
     def __eq__(self, other):
         # check for equality of two Director object instances by comparing the names
-        return self.__director_full_name == other.__director_full_name
+        # interned instances compare by identity without looking at the names
+        return self is other or self.__director_full_name == other.__director_full_name
 
     def __lt__(self, other):
         # implement a sorting order defined by the name
@@ -0,0 +1,157 @@
+import weakref
+from array import array
+
+from domainmodel.actor import Actor
+from domainmodel.genre import Genre
+from domainmodel.director import Director
+
+# every live registry, so an actor finds the registry that interned it without holding a reference to it
+_registries = weakref.WeakSet()
+
+
+def registry_of(actor):
+    """the live EntityRegistry that interned actor, None when no registry did"""
+    for registry in list(_registries):
+        if registry.interned(actor):
+            return registry
+    return None
+
+
+class EntityRegistry:
+    """hands out one shared Actor, Genre and Director instance per name
+
+    movies built through a registry share their entities instead of each holding copies,
+    and the registry keeps actor -> movies and director -> movies reverse indexes and the casts
+    of the movies added to it. movies added are numbered in order, so watch lists and users can
+    hold ids instead of references"""
+
+    def __init__(self):
+        # canonical instances keyed on the stripped name the entity reports
+        self._actors = {}
+        self._genres = {}
+        self._directors = {}
+        # raw names as read from a file, e.g. " Vin Diesel", so repeats skip building an entity
+        self._raw_actors = {}
+        self._raw_genres = {}
+        self._raw_directors = {}
+        self._actor_movies = {}
+        self._director_movies = {}
+        self._movies = []
+        self._movie_ids = {}
+        # the cast of every movie added as actor ids in order of appearance, see casts
+        self._actor_ids = {}
+        self._cast_offsets = array("Q", [0])
+        self._cast_codes = array("I")
+        _registries.add(self)
+
+    @staticmethod
+    def _lookup(raw_table, table, cls, name):
+        entity = raw_table.get(name)
+        if entity is None:
+            entity = cls(name)
+            entity = table.setdefault(_entity_name(entity), entity)
+            if isinstance(name, str):
+                raw_table[name] = entity
+        return entity
+
+    def actor(self, name: str) -> Actor:
+        return self._lookup(self._raw_actors, self._actors, Actor, name)
+
+    def genre(self, name: str) -> Genre:
+        return self._lookup(self._raw_genres, self._genres, Genre, name)
+
+    def director(self, name: str) -> Director:
+        return self._lookup(self._raw_directors, self._directors, Director, name)
+
+    def intern(self, entity):
+        """returns the canonical instance equal to entity, registering entity if it is the first"""
+        if isinstance(entity, Actor):
+            table = self._actors
+        elif isinstance(entity, Genre):
+            table = self._genres
+        elif isinstance(entity, Director):
+            table = self._directors
+        else:
+            raise TypeError(f"cannot intern {type(entity).__name__}")
+        return table.setdefault(_entity_name(entity), entity)
+
+    def intern_movie(self, movie):
+        """replaces the entities of movie, e.g. one unpickled from a worker, with canonical instances"""
+        movie.actors = [self.intern(x) for x in movie.actors]
+        movie.genres = [self.intern(x) for x in movie.genres]
+        if movie.director is not None:
+            movie.director = self.intern(movie.director)
+        return movie
+
+    def add_movie(self, movie):
+        """numbers movie and records it in the actor and director reverse indexes and the casts, a
+        movie equal to one already added keeps the first one's number"""
+        if movie not in self._movie_ids:
+            self._movie_ids[movie] = len(self._movies)
+            self._movies.append(movie)
+        for actor in movie.actors:
+            self._actor_movies.setdefault(actor.actor_full_name, []).append(movie)
+        ids = self._actor_ids
+        self._cast_codes.extend(ids.setdefault(x.actor_full_name, len(ids)) for x in movie.actors)
+        self._cast_offsets.append(len(self._cast_codes))
+        if movie.director is not None:
+            self._director_movies.setdefault(movie.director.director_full_name, []).append(movie)
+
+    @property
+    def actors(self):
+        return self._actors.values()
+
+    @property
+    def genres(self):
+        return self._genres.values()
+
+    @property
+    def directors(self):
+        return self._directors.values()
+
+    @property
+    def movies(self):
+        return self._movies
+
+    def movie_id(self, movie):
+        """the number of a movie added with add_movie, None for any other movie"""
+        return self._movie_ids.get(movie)
+
+    def movie(self, movie_id):
+        return self._movies[movie_id]
+
+    def interned(self, actor) -> bool:
+        """whether actor is the instance this registry hands out for its name"""
+        return self._actors.get(actor.actor_full_name) is actor
+
+    @property
+    def casts(self):
+        """(offsets, codes, names) of the movies added, the cast of the i-th movie added is
+        codes[offsets[i]:offsets[i + 1]] and codes are positions in names, e.g. for CoStarGraph.from_casts"""
+        return self._cast_offsets, self._cast_codes, list(self._actor_ids)
+
+    def worked_with(self, actor, colleague):
+        """whether two actors (Actor instances or names) appear in a movie added with add_movie together"""
+        name = actor.actor_full_name if isinstance(actor, Actor) else actor
+        other = colleague.actor_full_name if isinstance(colleague, Actor) else colleague
+        if name == other:
+            return False
+        return any(x.actor_full_name == other for movie in self._actor_movies.get(name, []) for x in movie.actors)
+
+    def movies_of_actor(self, actor):
+        """movies added with add_movie that actor (an Actor or a name) appears in"""
+        name = actor.actor_full_name if isinstance(actor, Actor) else actor
+        return self._actor_movies.get(name, [])
+
+    def movies_of_director(self, director):
+        """movies added with add_movie that director (a Director or a name) directed"""
+        name = director.director_full_name if isinstance(director, Director) else director
+        return self._director_movies.get(name, [])
+
+
+def _entity_name(entity):
+    if isinstance(entity, Actor):
+        return entity.actor_full_name
+    if isinstance(entity, Genre):
+        return entity.genre_name
+    return entity.director_full_name
@@ -1,4 +1,6 @@
 class Genre:
+    __slots__ = ("__genre_name",)
+
     def __init__(self, genre_name: str):
         if genre_name == "" or type(genre_name) is not str:
             self.__genre_name = None
@@ -15,7 +17,8 @@ class Genre:
 
     def __eq__(self, other):
         # check for equality of two Genre object instances by comparing the genre names
-        return self.__genre_name == other.__genre_name
+        # interned instances compare by identity without looking at the names
+        return self is other or self.__genre_name == other.__genre_name
 
     def __lt__(self, other):
         # implement a sorting order defined by the genre name
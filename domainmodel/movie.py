@@ -4,10 +4,31 @@ from domainmodel.director import Director
 
 
 class Movie:
-    _actors = []
-    _genres = []
+    # no per-instance __dict__, a catalogue holds a lot of movies
+    __slots__ = (
+        "_title",
+        "_year",
+        "_description",
+        "_director",
+        "_actors",
+        "_genres",
+        "_runtime_minutes",
+        "_rating",
+        "_votes",
+        "_revenue_millions",
+        "_metascore",
+    )
 
     def __init__(self, title: str, year: int):
+        self._actors = []
+        self._genres = []
+        self._description = None
+        self._director = None
+        self._runtime_minutes = None
+        self._rating = None
+        self._votes = None
+        self._revenue_millions = None
+        self._metascore = None
         if not isinstance(title, str) or title.strip() == "":
             self._title = None
         else:
@@ -45,6 +66,22 @@ class Movie:
     def runtime_minutes(self):
         return self._runtime_minutes
 
+    @property
+    def rating(self):
+        return self._rating
+
+    @property
+    def votes(self):
+        return self._votes
+
+    @property
+    def revenue_millions(self):
+        return self._revenue_millions
+
+    @property
+    def metascore(self):
+        return self._metascore
+
     """Setters"""
 
     @actors.setter
@@ -75,6 +112,34 @@ class Movie:
             raise ValueError
         self._runtime_minutes = val
 
+    @rating.setter
+    def rating(self, val):
+        if not isinstance(val, (int, float)) or not 0 <= val <= 10:
+            self._rating = None
+            return
+        self._rating = float(val)
+
+    @votes.setter
+    def votes(self, val):
+        if not isinstance(val, int) or val < 0:
+            self._votes = None
+            return
+        self._votes = val
+
+    @revenue_millions.setter
+    def revenue_millions(self, val):
+        if not isinstance(val, (int, float)) or val < 0:
+            self._revenue_millions = None
+            return
+        self._revenue_millions = float(val)
+
+    @metascore.setter
+    def metascore(self, val):
+        if not isinstance(val, int) or not 0 <= val <= 100:
+            self._metascore = None
+            return
+        self._metascore = val
+
     @title.setter
     def title(self, val):
         if not isinstance(val, str) or val.strip() == "":
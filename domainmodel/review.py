@@ -4,11 +4,11 @@ from domainmodel.movie import Movie
 
 
 class Review:
-    _movie = None
-    _review_text = None
-    _rating = None
+    __slots__ = ("_movie", "_review_text", "_rating", "_timestamp")
 
     def __init__(self, movie, review_text, rating):
+        self._movie = None
+        self._rating = None
         if isinstance(movie, Movie):
             self._movie = movie
         self._review_text = review_text
@@ -1,6 +1,102 @@
 from domainmodel.movie import Movie
 from domainmodel.review import Review
+from domainmodel.watchlist import WatchList
 
 
 class User:
-    pass
+    # no per-instance __dict__, there can be millions of users
+    __slots__ = (
+        "_user_name",
+        "_password",
+        "_catalogue",
+        "_watched",
+        "_watchlist",
+        "_reviews",
+        "_time_spent_watching_movies_minutes",
+    )
+
+    def __init__(self, user_name: str, password: str, catalogue=None):
+        """catalogue resolves movies to ids and back, see WatchList"""
+        if not isinstance(user_name, str) or user_name.strip() == "":
+            self._user_name = None
+        else:
+            # user names are case insensitive
+            self._user_name = user_name.strip().lower()
+        self._password = password if isinstance(password, str) else None
+        self._catalogue = catalogue
+        # each watched movie once in the order first watched, and the movies to watch, every list is
+        # only allocated on first use since most users fill in neither
+        self._watched = None
+        self._watchlist = None
+        # most users never write a review, the list is only allocated for the first one
+        self._reviews = None
+        self._time_spent_watching_movies_minutes = 0
+
+    @property
+    def user_name(self):
+        return self._user_name
+
+    @property
+    def password(self):
+        return self._password
+
+    @property
+    def watched_movies(self):
+        return [] if self._watched is None else list(self._watched)
+
+    @property
+    def watched(self) -> WatchList:
+        if self._watched is None:
+            self._watched = WatchList(self._catalogue)
+        return self._watched
+
+    @property
+    def watchlist(self) -> WatchList:
+        if self._watchlist is None:
+            self._watchlist = WatchList(self._catalogue)
+        return self._watchlist
+
+    @property
+    def reviews(self):
+        return [] if self._reviews is None else self._reviews
+
+    @property
+    def time_spent_watching_movies_minutes(self):
+        return self._time_spent_watching_movies_minutes
+
+    def watch_movie(self, movie, runtime_minutes=None):
+        """records a viewing of movie (a Movie or an id), adding its runtime to the time spent watching
+        NOTE: runtime_minutes is looked up in the catalogue when movie is an id and it is not given"""
+        watched = self.watched
+        watched.add_movie(movie)
+        if runtime_minutes is None:
+            if not isinstance(movie, Movie) and watched.catalogue is not None:
+                movie = watched.catalogue.movie(movie)
+            if isinstance(movie, Movie):
+                runtime_minutes = movie.runtime_minutes
+        if runtime_minutes is not None:
+            self._time_spent_watching_movies_minutes += runtime_minutes
+
+    def has_watched(self, movie):
+        return self._watched is not None and movie in self._watched
+
+    def add_review(self, review):
+        if not isinstance(review, Review):
+            return
+        if self._reviews is None:
+            self._reviews = []
+        self._reviews.append(review)
+
+    def __repr__(self):
+        return f"<User {self._user_name}>"
+
+    def __eq__(self, other):
+        if not isinstance(other, User):
+            return False
+        return self._user_name == other._user_name
+
+    def __lt__(self, other):
+        return self._user_name < other._user_name
+
+    def __hash__(self):
+        return hash(self._user_name)
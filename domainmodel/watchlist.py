@@ -1,5 +1,200 @@
+from array import array
+
 from domainmodel.movie import Movie
 
+# marks a removed entry in the order array, and an unused slot in the hash table
+_EMPTY = 0xFFFFFFFF
+# a hash table slot whose entry was removed, probing continues past it
+_DELETED = 0xFFFFFFFE
+# lists up to this size are scanned instead of hashed, their table is never allocated
+SMALL_WATCHLIST = 8
+
+
+class _ListCatalogue:
+    """numbers the movies of a list made without a catalogue, in the order they are first added"""
+
+    __slots__ = ("_movies", "_ids")
+
+    def __init__(self):
+        self._movies = []
+        self._ids = {}
+
+    def add(self, movie):
+        movie_id = self._ids.get(movie)
+        if movie_id is None:
+            movie_id = self._ids[movie] = len(self._movies)
+            self._movies.append(movie)
+        return movie_id
+
+    def movie_id(self, movie):
+        return self._ids.get(movie)
+
+    def movie(self, movie_id):
+        return self._movies[movie_id]
+
+
+def _slot(movie_id, mask):
+    # fibonacci hashing spreads consecutive ids over the table
+    return ((movie_id * 2654435761) & 0xFFFFFFFF) & mask
+
 
 class WatchList:
-    pass
+    """movies in the order they were added, without repeats
+
+    movies are kept as 4 byte ids in an array, with removed entries blanked out until they are
+    compacted away. lists longer than SMALL_WATCHLIST also get an open addressing hash table
+    of positions in that array, between a third and two thirds full, so add, remove and
+    membership are O(1) at about 11 to 13 bytes per movie (see benchmarks/bench_watchlist.py)
+    instead of a Python object per movie
+
+    movies are given as Movie objects or as ids of the catalogue, any object with
+    movie_id(movie) and movie(movie_id) such as an EntityRegistry
+    NOTE: a list made without a catalogue numbers the Movies added to it in a catalogue of its
+    own, which holds a reference and a dict entry per movie, share one to keep lists compact"""
+
+    __slots__ = ("_catalogue", "_order", "_table", "_removed", "_deleted_slots")
+
+    def __init__(self, catalogue=None):
+        self._catalogue = catalogue
+        self._order = array("I")
+        self._table = None
+        # blank entries in _order and deleted slots in _table
+        self._removed = 0
+        self._deleted_slots = 0
+
+    @property
+    def catalogue(self):
+        return self._catalogue
+
+    def _id(self, movie, add=False):
+        """the id of movie, None for a Movie the catalogue does not know unless add is set"""
+        if isinstance(movie, Movie):
+            if self._catalogue is None:
+                if not add:
+                    return None
+                if self.size():
+                    raise ValueError("a list of movie ids has no catalogue to number Movies")
+                self._catalogue = _ListCatalogue()
+            if add and isinstance(self._catalogue, _ListCatalogue):
+                return self._catalogue.add(movie)
+            movie_id = self._catalogue.movie_id(movie)
+            if movie_id is None and add:
+                raise ValueError(f"{movie!r} is not in the catalogue")
+            return movie_id
+        if not isinstance(movie, int) or not 0 <= movie < _DELETED:
+            raise ValueError(f"bad movie id {movie!r}")
+        return movie
+
+    def _movie(self, movie_id):
+        return movie_id if self._catalogue is None else self._catalogue.movie(movie_id)
+
+    def _find(self, movie_id):
+        """(position in _order, table slot) of movie_id, (None, None) when it is not in the list"""
+        if self._table is None:
+            try:
+                return self._order.index(movie_id), None
+            except ValueError:
+                return None, None
+        table = self._table
+        mask = len(table) - 1
+        slot = _slot(movie_id, mask)
+        while True:
+            position = table[slot]
+            if position == _EMPTY:
+                return None, None
+            if position != _DELETED and self._order[position] == movie_id:
+                return position, slot
+            slot = (slot + 1) & mask
+
+    def _insert_slot(self, movie_id, position):
+        table = self._table
+        mask = len(table) - 1
+        slot = _slot(movie_id, mask)
+        while table[slot] < _DELETED:
+            slot = (slot + 1) & mask
+        if table[slot] == _DELETED:
+            self._deleted_slots -= 1
+        table[slot] = position
+
+    def _rebuild(self):
+        """drops removed entries and rehashes into a table about twice the number of movies"""
+        if self._removed:
+            self._order = array("I", (x for x in self._order if x != _EMPTY))
+            self._removed = 0
+        self._deleted_slots = 0
+        if len(self._order) <= SMALL_WATCHLIST:
+            self._table = None
+            return
+        capacity = 16
+        while capacity < 2 * len(self._order):
+            capacity *= 2
+        self._table = array("I", [_EMPTY]) * capacity
+        for position, movie_id in enumerate(self._order):
+            self._insert_slot(movie_id, position)
+
+    def add_movie(self, movie):
+        """appends movie unless it is already in the list"""
+        movie_id = self._id(movie, add=True)
+        if self._find(movie_id)[0] is not None:
+            return
+        self._order.append(movie_id)
+        if self._table is None:
+            if len(self._order) > SMALL_WATCHLIST:
+                self._rebuild()
+        elif 3 * (len(self._order) + self._deleted_slots) > 2 * len(self._table):
+            # past two thirds full probes get long
+            self._rebuild()
+        else:
+            self._insert_slot(movie_id, len(self._order) - 1)
+
+    def remove_movie(self, movie):
+        """removes movie, a movie not in the list is ignored"""
+        movie_id = self._id(movie)
+        if movie_id is None:
+            return
+        position, slot = self._find(movie_id)
+        if position is None:
+            return
+        if self._table is None:
+            del self._order[position]
+            return
+        self._order[position] = _EMPTY
+        self._table[slot] = _DELETED
+        self._removed += 1
+        self._deleted_slots += 1
+        if self._removed > len(self._order) // 2:
+            self._rebuild()
+
+    def __contains__(self, movie):
+        try:
+            movie_id = self._id(movie)
+        except ValueError:
+            return False
+        return movie_id is not None and self._find(movie_id)[0] is not None
+
+    def size(self):
+        return len(self._order) - self._removed
+
+    def __len__(self):
+        return self.size()
+
+    def movie_ids(self):
+        """ids of the movies in the list, in order"""
+        return (x for x in self._order if x != _EMPTY)
+
+    def __iter__(self):
+        return (self._movie(x) for x in self.movie_ids())
+
+    def select_movie_to_watch(self, index):
+        """the movie at index, None when index is out of range"""
+        if not isinstance(index, int) or not 0 <= index < self.size():
+            return None
+        if self._removed:
+            self._rebuild()
+        return self._movie(self._order[index])
+
+    def first_movie_in_watchlist(self):
+        return self.select_movie_to_watch(0)
+
+    def __repr__(self):
+        return f"<WatchList {self.size()} movies>"
@@ -1,128 +1,133 @@
 #!/usr/bin/env python3
 from flask import Flask, request, jsonify, send_from_directory
-from jinja2 import Template
-from datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from searchindexes.cursor import Cursor
+from searchindexes.index_manager import IndexManager
+from searchindexes.movie_index import (
+    ROW_FIELDS,
+    SORTBY_FIELDS,
+    SEARCHBY_FIELDS,
+    TEXT_SEARCH_FIELDS,
+    RANGE_FIELDS,
+    FUZZY_FIELDS,
+    SUBSTRING_FIELDS,
+    SUGGEST_FIELDS,
+)
+from searchindexes.suggest_index import SUGGEST_K
+from searchindexes.posting_list import PostingList, union
+from searchindexes.query_cache import QueryCache
+from searchindexes.query_parser import parse_query, evaluate_query
+from searchindexes.snapshot import default_snapshot_path
+from datetime import datetime, timezone
+import hashlib
+import json
 import os
 import math
 
 # CONSTANTS
 DATA_PATH_ENV = "MOVIE_MODEL_VIEWER_DATA_PATH"
+SNAPSHOT_PATH_ENV = "MOVIE_MODEL_VIEWER_SNAPSHOT_PATH"
+DEBUG_ENV = "MOVIE_MODEL_VIEWER_DEBUG"
+QUERY_CACHE_SIZE_ENV = "MOVIE_MODEL_VIEWER_QUERY_CACHE_SIZE"
+QUERY_CACHE_TTL_ENV = "MOVIE_MODEL_VIEWER_QUERY_CACHE_TTL"
+WATCH_INTERVAL_ENV = "MOVIE_MODEL_VIEWER_WATCH_INTERVAL"
+TEMPLATE_DIR = "templates"
 MIN_RESULTS_PER_PAGE = 5
 MAX_RESULTS_PER_PAGE = 100
+MAX_BATCH_QUERIES = 100
+# neighbours computed and cached per movie, the most a /movie/<idx>/similar request can ask for
+MAX_SIMILAR = 50
+# seconds clients and proxies may reuse a /suggest response
+SUGGEST_MAX_AGE = 300
+
+# templates and static pages are only checked for changes in debug mode
+debug = os.environ.get(DEBUG_ENV, "false").lower() == "true"
 
 data_path = "./datafiles/Data1000Movies.csv"
 if DATA_PATH_ENV in os.environ:
     data_path = os.environ[DATA_PATH_ENV]
 
-data_reader = MovieFileCSVReader(data_path)
-data_reader.read_csv_file()
-
-movies_index = []
-title_index = {}
-year_index = {}
-actor_index = {}
-genre_index = {}
-for i in range(len(data_reader.dataset_of_movies)):
-    data = {
-        "idx": i,
-        "title": data_reader.dataset_of_movies[i].title,
-        "year": data_reader.dataset_of_movies[i].year,
-        "actors": "\n".join(x.actor_full_name for x in data_reader.dataset_of_movies[i].actors),
-        "genres": "\n".join(x.genre_name for x in data_reader.dataset_of_movies[i].genres),
-    }
-    movies_index.append(data)
-    title_str = data["title"].lower()
-    if title_str not in title_index:
-        title_index[title_str] = []
-    title_index[title_str].append(data)
-    year_str = str(data["year"])
-    if year_str not in year_index:
-        year_index[year_str] = []
-    year_index[year_str].append(data)
-    for actor in data_reader.dataset_of_movies[i].actors:
-        # actor_full_name is expected to identify an actor
-        name = actor.actor_full_name.lower()
-        if name not in actor_index:
-            actor_index[name] = []
-        actor_index[name].append(data)
-
-    for genre in data_reader.dataset_of_movies[i].genres:
-        # genre_name is expected to identify a genre
-        name = genre.genre_name.lower()
-        if name not in genre_index:
-            genre_index[name] = []
-        genre_index[name].append(data)
-
-
-title_trie = {"*": [{}, False]}
-for key in title_index:
-    node = title_trie["*"]
-    for i in range(len(key)):
-        if key[i] in node[0]:
-            node = node[0][key[i]]
-        else:
-            new_node = [{}, False]
-            node[0][key[i]] = new_node
-            node = new_node
-    node[1] = True
-
-year_trie = {"*": [{}, False]}
-for key in year_index:
-    node = year_trie["*"]
-    for i in range(len(key)):
-        if key[i] in node[0]:
-            node = node[0][key[i]]
-        else:
-            new_node = [{}, False]
-            node[0][key[i]] = new_node
-            node = new_node
-    node[1] = True
-
-actor_trie = {"*": [{}, False]}
-for key in actor_index:
-    node = actor_trie["*"]
-    for i in range(len(key)):
-        if key[i] in node[0]:
-            node = node[0][key[i]]
-        else:
-            new_node = [{}, False]
-            node[0][key[i]] = new_node
-            node = new_node
-    node[1] = True
-
-genre_trie = {"*": [{}, False]}
-for key in genre_index:
-    node = genre_trie["*"]
-    for i in range(len(key)):
-        if key[i] in node[0]:
-            node = node[0][key[i]]
-        else:
-            new_node = [{}, False]
-            node[0][key[i]] = new_node
-            node = new_node
-    node[1] = True
-
-
-def get_trie_strings(trienode, prefix, rv):
-    if trienode[1]:
-        rv.append(prefix)
-    for c in trienode[0]:
-        get_trie_strings(trienode[0][c], prefix + c, rv)
-
-
-def query_trie(trie, prefix):
-    node = trie["*"]
-    for i in range(len(prefix)):
-        if prefix[i] not in node[0]:
-            return []
-        node = node[0][prefix[i]]
-    rv = []
-    get_trie_strings(node, prefix, rv)
-    return rv
-
+snapshot_path = default_snapshot_path(data_path)
+if SNAPSHOT_PATH_ENV in os.environ:
+    snapshot_path = os.environ[SNAPSHOT_PATH_ENV]
+
+# memory maps the prebuilt snapshot, only parsing the csv file when the snapshot is missing or stale
+index_manager = IndexManager(data_path, snapshot_path)
+
+
+def publish_index(index):
+    """points the module level names at a newly built index
+    NOTE: requests read index_manager.index once instead, so a reload never changes an index under them"""
+    global movie_index, movies_index, title_index, year_index, actor_index, genre_index, sort_orders, all_movie_ids
+    movie_index = index
+    movies_index = index.rows
+    title_index = index.field_indexes["title"]
+    year_index = index.field_indexes["year"]
+    actor_index = index.field_indexes["actor"]
+    genre_index = index.field_indexes["genre"]
+    sort_orders = index.sort_orders
+    all_movie_ids = index.all_ids
+
+
+publish_index(index_manager.index)
+index_manager.subscribe(publish_index)
+# seconds between checks of the data file for changes, 0 turns watching off
+# NOTE: importing main never starts watching, the process running the app decides who watches
+watch_interval = float(os.environ.get(WATCH_INTERVAL_ENV, 5))
+
+sortby_vals = SORTBY_FIELDS
+searchby_vals = SEARCHBY_FIELDS + TEXT_SEARCH_FIELDS
+# fields a search without searchby looks in, descriptions are only searched when asked for
+default_searchby_vals = SEARCHBY_FIELDS
+text_vals = TEXT_SEARCH_FIELDS
+range_vals = RANGE_FIELDS
+fuzzy_vals = FUZZY_FIELDS
+substring_vals = SUBSTRING_FIELDS
+row_vals = ROW_FIELDS
+suggest_vals = list(SUGGEST_FIELDS)
+
+# ordered results of recent queries, so paging through them skips parsing, lookups and sorting
+# a size of 0 disables the cache, the ttl in seconds is unset by default
+query_cache = QueryCache(
+    max_entries=int(os.environ.get(QUERY_CACHE_SIZE_ENV, 1024)),
+    ttl=float(os.environ[QUERY_CACHE_TTL_ENV]) if QUERY_CACHE_TTL_ENV in os.environ else None,
+)
+
+
+# compiled templates are kept by the environment and their bytecode is cached on disk for other workers
+template_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR), bytecode_cache=FileSystemBytecodeCache(), auto_reload=debug
+)
+# compile every template up front instead of on the first request that needs it
+for template_name in ["results_section.jinja", "search_section.jinja", "results_page.jinja"]:
+    template_env.get_template(template_name)
+
+
+class StaticPage:
+    """file served from memory with ETag and Last-Modified validators"""
+
+    def __init__(self, path, auto_reload=False):
+        self._path = path
+        self.auto_reload = auto_reload
+        self._mtime = None
+        self._load()
+
+    def _load(self):
+        self._mtime = os.path.getmtime(self._path)
+        with open(self._path, "rb") as f:
+            self._content = f.read()
+        self._etag = hashlib.sha1(self._content).hexdigest()
+        self._last_modified = datetime.fromtimestamp(int(self._mtime), timezone.utc)
+
+    def response(self):
+        if self.auto_reload and os.path.getmtime(self._path) != self._mtime:
+            self._load()
+        response = app.response_class(response=self._content, status=200, mimetype="text/html")
+        response.set_etag(self._etag)
+        response.last_modified = self._last_modified
+        # answers 304 Not Modified when the client's copy is current
+        return response.make_conditional(request)
 
-sortby_vals = ["title", "year", "actors", "genres"]
-searchby_vals = ["title", "year", "actor", "genre"]
 
 parameter_defaults = {
     "q": "",
@@ -131,12 +136,14 @@ parameter_defaults = {
     "sortby": "title",
     "searchby": None,
     "reverse": False,
+    "fuzzy": False,
+    "substring": False,
+    "fields": None,
+    "ids": False,
 }
 
 
 class QueryFactory:
-    _section_template = Template(open("templates/results_section.jinja", "r").read())
-
     def __init__(
         self,
         path,
@@ -146,13 +153,26 @@ class QueryFactory:
         sortby=parameter_defaults["sortby"],
         searchby=parameter_defaults["searchby"],
         reverse=parameter_defaults["reverse"],
+        fuzzy=parameter_defaults["fuzzy"],
+        substring=parameter_defaults["substring"],
+        cursor=None,
+        index=None,
+        term_cache=None,
+        fields=parameter_defaults["fields"],
+        ids_only=parameter_defaults["ids"],
     ):
         """generates results_list used for template creation
-        NOTE: assumes some parameters are sanitised"""
+        NOTE: assumes some parameters are sanitised, a cursor token replaces page_num when given
+
+        index defaults to the index being served, factories sharing an index can also share a
+        term_cache dict so a term used by several of their queries is only looked up once"""
         if searchby not in searchby_vals and searchby is not None:
             raise ValueError("bad searchby param")
         if sortby not in sortby_vals:
             raise ValueError("bad sortby param")
+        # one index for the whole request, a reload publishing a new one meanwhile is not seen
+        self._index = index if index is not None else index_manager.index
+        self._term_cache = term_cache if term_cache is not None else {}
         # path important for anchor tags with different parameters
         self._path = path
         self._query_string = query_string.lower()
@@ -160,84 +180,125 @@ class QueryFactory:
         self._sortby = sortby
         self._searchby = searchby
         self._reverse = reverse
-
-        results = None
-        if searchby == "year":
-            results = self.get_year_results()
-        if searchby == "title":
-            results = self.get_title_results()
-        elif searchby == "actor":
-            results = self.get_actor_results()
-        elif searchby == "genre":
-            results = self.get_genre_results()
-        else:
-            results = self.get_all_results()
+        self._fuzzy = fuzzy
+        self._substring = substring
+        # what serialize returns per movie: the row keys in fields, only the id or the whole row
+        if fields is not None and any(x not in row_vals for x in fields):
+            raise ValueError("bad fields param")
+        self._fields = fields
+        self._ids_only = ids_only
+        # movie id -> rank score of the fuzzy and full text terms matched so far, lower is better
+        self._scores = {}
+        self._cursor = None if cursor is None else self._check_cursor(Cursor.decode(cursor))
+
+        results = self.get_ordered_results()
+        self._total = len(results)
         self._max_page = max(1, int(math.ceil(len(results) / results_per_page)))
-        self._page_num = page_num
-        if page_num > self._max_page:
-            self._page_num = self._max_page
-        self._results_list = self._filter(results)
-
-    def get_all_results(self):
-        title_keys = query_trie(title_trie, self.query_string)
-        query_results = {x: title_index[x] for x in title_keys}
-        year_keys = query_trie(year_trie, self.query_string)
-        query_results.update({x: year_index[x] for x in year_keys})
-        actor_keys = query_trie(actor_trie, self.query_string)
-        query_results.update({x: actor_index[x] for x in actor_keys})
-        genre_keys = query_trie(genre_trie, self.query_string)
-        query_results.update({x: genre_index[x] for x in genre_keys})
-        rv = {}
-        for key in query_results:
-            for entry in query_results[key]:
-                rv[entry["idx"]] = entry
-        return list(rv.values())
-
-    def get_title_results(self):
-        query_keys = query_trie(title_trie, self.query_string)
-        query_results = {x: title_index[x] for x in query_keys}
-        rv = {}
-        for key in query_results:
-            for entry in query_results[key]:
-                rv[entry["idx"]] = entry
-        return list(rv.values())
-
-    def get_year_results(self):
-        query_keys = query_trie(year_trie, self.query_string)
-        query_results = {x: year_index[x] for x in query_keys}
-        rv = {}
-        for key in query_results:
-            for entry in query_results[key]:
-                rv[entry["idx"]] = entry
-        return list(rv.values())
-
-    def get_actor_results(self):
-        query_keys = query_trie(actor_trie, self.query_string)
-        query_results = {x: actor_index[x] for x in query_keys}
-        rv = {}
-        for key in query_results:
-            for entry in query_results[key]:
-                rv[entry["idx"]] = entry
-        return list(rv.values())
-
-    def get_genre_results(self):
-        query_keys = query_trie(genre_trie, self.query_string)
-        query_results = {x: genre_index[x] for x in query_keys}
-        rv = {}
-        for key in query_results:
-            for entry in query_results[key]:
-                rv[entry["idx"]] = entry
-        return list(rv.values())
-
-    def _filter(self, results):
-        tp = results[:]
-        tp.sort(key=lambda x: x[self.sortby], reverse=self.reverse)
-        rv = []
-        for i in range((self.page_num - 1) * self.results_per_page, self.page_num * self.results_per_page):
-            if i >= len(tp):
-                break
-            rv.append(tp[i])
-        return rv
+        self._page_num = None
+        if self._cursor is None:
+            self._page_num = min(page_num, self._max_page)
+        page_ids = self._page_ids(results)
+        # one row past the page is selected to tell whether there is a next page
+        self._next_cursor = None
+        if len(page_ids) > results_per_page:
+            page_ids = page_ids[:results_per_page]
+            self._next_cursor = self._cursor_after(page_ids[-1])
+        self._page_ids = page_ids
+        self._rows = None
+
+    def _check_cursor(self, cursor):
+        if cursor.sortby != self.sortby or cursor.reverse != self.reverse:
+            raise ValueError("cursor belongs to a different sort order")
+        rank = self._index.sort_orders[self.sortby].direction(self.reverse)[1]
+        if cursor.movie_id >= len(rank) or rank[cursor.movie_id] != cursor.rank:
+            raise ValueError("cursor belongs to a different index")
+        return cursor
+
+    def _cursor_after(self, movie_id):
+        rank = self._index.sort_orders[self.sortby].direction(self.reverse)[1]
+        return Cursor(self.sortby, self.reverse, rank[movie_id], movie_id).encode()
+
+    def get_ordered_results(self):
+        """query results in sort order, served from query_cache when the same search was made before"""
+        key = (self.query_string, self.searchby, self.sortby, self.reverse, self.fuzzy, self.substring)
+        ordered = query_cache.get(key, self._index)
+        if ordered is None:
+            results = self.get_query_results()
+            # fuzzy and full text results are ranked by their scores, then by the sort order
+            scores = self._scores or None
+            ordered = self._index.sort_orders[self.sortby].ordered(results, reverse=self.reverse, scores=scores)
+            # the first pages are selected when they are asked for and kept with the cached results
+            query_cache.put(key, ordered, self._index, size=ordered.size)
+        return ordered
+
+    def get_query_results(self):
+        terms = parse_query(self.query_string, searchby_vals + range_vals)
+        return evaluate_query(terms, self._lookup_term, self._index.all_ids)
+
+    def _lookup_term(self, term):
+        field = term.field if term.field is not None else self.searchby
+        # the same term looked up under the same modes always gives the same postings and scores
+        key = (field, term.value, term.negated, self.fuzzy, self.substring)
+        found = self._term_cache.get(key)
+        if found is None:
+            found = self._evaluate_term(field, term)
+            self._term_cache[key] = found
+        postings, scores = found
+        # every scored term adds to the rank score, so a movie matching all terms closely ranks first
+        for movie_id, x in scores.items():
+            self._scores[movie_id] = self._scores.get(movie_id, 0) + x
+        return postings
+
+    def _evaluate_term(self, field, term):
+        """(postings, rank scores) of a term, the scores are empty for unranked terms"""
+        if field in range_vals and term.range is not None:
+            return self._index.range_postings(field, *term.range), {}
+        if field in range_vals and field not in searchby_vals:
+            # numeric fields have no text index, a single value has to match exactly
+            if term.number is None:
+                return PostingList(), {}
+            return self._index.range_postings(field, term.number, term.number), {}
+        if field in text_vals:
+            return self._ranked_postings(field, term)
+        if field is None:
+            if term.value == "":
+                return self._index.all_ids, {}
+            return self._text_postings(default_searchby_vals, term)
+        return self._text_postings([field], term)
+
+    def _ranked_postings(self, field, term):
+        ids, scores = self._index.text_scores(field, term.value)
+        postings = PostingList(memoryview(ids))
+        if term.negated:
+            return postings, {}
+        # higher BM25 scores are better matches, so they lower the rank score
+        return postings, {movie_id: -score for movie_id, score in zip(ids.tolist(), scores.tolist())}
+
+    def _exact_postings(self, field, value):
+        # fields without a substring index keep matching by prefix in substring mode
+        if self.substring and field in substring_vals:
+            return self._index.substring_postings(field, value)
+        return self._index.field_postings(field, value)
+
+    def _text_postings(self, fields, term):
+        if not self.fuzzy or term.negated:
+            return union(self._exact_postings(x, term.value) for x in fields), {}
+        edits = {}
+        for field in fields:
+            found = self._index.fuzzy_matches(field, term.value) if field in fuzzy_vals else {}
+            # exact matches have no edits, substring matches count as exact in substring mode
+            found.update(dict.fromkeys(self._exact_postings(field, term.value), 0))
+            for movie_id, x in found.items():
+                if x < edits.get(movie_id, x + 1):
+                    edits[movie_id] = x
+        return PostingList.from_unsorted(edits), edits
+
+    def _page_ids(self, results):
+        if self._cursor is not None:
+            # keyset paging, the cost does not depend on how deep into the results the cursor is
+            return results.page_after(self._cursor.movie_id, self.results_per_page + 1)
+        start = (self.page_num - 1) * self.results_per_page
+        return results.page(start, start + self.results_per_page + 1)
 
     @property
     def path(self):
@@ -267,21 +328,56 @@ class QueryFactory:
     def reverse(self):
         return self._reverse
 
+    @property
+    def fuzzy(self):
+        return self._fuzzy
+
+    @property
+    def substring(self):
+        return self._substring
+
     @property
     def max_page(self):
         return self._max_page
 
+    @property
+    def total(self):
+        """number of movies matching the query"""
+        return self._total
+
     @property
     def has_prev(self):
-        return self._page_num > 1
+        return self._cursor is not None or self._page_num > 1
+
+    @property
+    def next_cursor(self):
+        """token for the page following this one, None on the last page"""
+        return self._next_cursor
 
     @property
     def section_template(self):
-        return self._section_template
+        return template_env.get_template("results_section.jinja")
+
+    @property
+    def page_ids(self):
+        return self._page_ids
+
+    @property
+    def rows(self):
+        """full rows of the movies on the page, decoded on first use"""
+        if self._rows is None:
+            rows = self._index.rows
+            self._rows = [rows[i] for i in self._page_ids]
+        return self._rows
 
     @property
     def results_list(self):
-        return self._results_list
+        """the movies on the page as serialized, ids, projected rows or full rows"""
+        if self._ids_only:
+            return list(self._page_ids)
+        if self._fields is not None:
+            return [{x: row[x] for x in self._fields} for row in self.rows]
+        return self.rows
 
     def render_section(self):
         parameters = {}
@@ -295,13 +391,14 @@ class QueryFactory:
             parameters["num-results"] = self.results_per_page
         if self.reverse != parameter_defaults["reverse"]:
             parameters["reverse"] = self.reverse
-        page_hrefs = []
-        for i in range(1, self.max_page + 1):
-            parameters["page"] = i
-            page_hrefs.append(self.path + "?" + "&".join("{}={}".format(x, parameters[x]) for x in parameters))
+        if self.fuzzy != parameter_defaults["fuzzy"]:
+            parameters["fuzzy"] = self.fuzzy
+        if self.substring != parameter_defaults["substring"]:
+            parameters["substring"] = self.substring
+        page_hrefs = PageHrefs(self.path, parameters, self.max_page)
 
         return self.section_template.render(
-            results_list=self.results_list, max_page=self.max_page, page_hrefs=page_hrefs, page_num=self.page_num
+            results_list=self.rows, max_page=self.max_page, page_hrefs=page_hrefs, page_num=self.page_num
         )
 
     def serialize(self):
@@ -310,15 +407,62 @@ class QueryFactory:
             max_page=self.max_page,
             has_prev=self.has_prev,
             page_num=self.page_num,
+            next_cursor=self.next_cursor,
+            total=self.total,
+        )
+
+    def serialize_json(self) -> bytes:
+        """serialize() encoded as utf-8 json
+        NOTE: whole rows are joined from the json the index holds for every row, never encoded again"""
+        if self._ids_only or self._fields is not None:
+            results = encode_json(self.results_list)
+        else:
+            row_json = self._index.row_json
+            results = b"[" + b",".join(row_json[i] for i in self._page_ids) + b"]"
+        rest = encode_json(
+            dict(
+                max_page=self.max_page,
+                has_prev=self.has_prev,
+                page_num=self.page_num,
+                next_cursor=self.next_cursor,
+                total=self.total,
+            )
         )
+        return b'{"results_list":' + results + b"," + rest[1:]
+
+
+def encode_json(payload) -> bytes:
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+class PageHrefs:
+    """href of every result page, formatted only for the few pages the template links to"""
+
+    def __init__(self, path, parameters, max_page):
+        self._path = path
+        self._parameters = dict(parameters)
+        self._max_page = max_page
+
+    def __len__(self):
+        return self._max_page
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._max_page:
+            raise IndexError(i)
+        parameters = dict(self._parameters, page=i + 1)
+        return self._path + "?" + "&".join("{}={}".format(x, parameters[x]) for x in parameters)
 
 
-def get_query_factory_from_params():
-    factory_kwargs = {}
-    query_string = request.args.get("q")
+def query_factory_from_args(path, args, cursor=None, **context):
+    """QueryFactory for the query parameters in args, any mapping with a get method
+    NOTE: context (index, term_cache) is passed to QueryFactory as is"""
+    factory_kwargs = dict(context)
+    if cursor is not None:
+        factory_kwargs["cursor"] = cursor
+    query_string = args.get("q")
     if query_string is not None:
         factory_kwargs["query_string"] = query_string
-    page_num = request.args.get("page")
+    page_num = args.get("page")
     # sanitise page_num
     try:
         page_num = int(page_num)
@@ -326,7 +470,7 @@ def get_query_factory_from_params():
         factory_kwargs["page_num"] = page_num
     except (TypeError, ValueError):
         page_num = None
-    sortby = request.args.get("sortby")
+    sortby = args.get("sortby")
     # sanitise sortby
     try:
         if sortby.lower() not in sortby_vals:
@@ -335,7 +479,7 @@ def get_query_factory_from_params():
         factory_kwargs["sortby"] = sortby
     except (AttributeError, ValueError):
         sortby = None
-    reverse = request.args.get("reverse")
+    reverse = args.get("reverse")
     try:
         if reverse.lower() not in ["true", "false"]:
             raise ValueError()
@@ -343,7 +487,21 @@ def get_query_factory_from_params():
         factory_kwargs["reverse"] = reverse
     except (AttributeError, ValueError):
         reverse = None
-    results_per_page = request.args.get("num-results")
+    fields = args.get("fields")
+    # sanitise fields, unknown names are left out and the whole row is served if none is left
+    if fields is not None:
+        fields = list(dict.fromkeys(x for x in fields.lower().split(",") if x in row_vals))
+        if fields:
+            factory_kwargs["fields"] = fields
+    ids_only = args.get("ids")
+    if ids_only is not None and ids_only.lower() in ["true", "false"]:
+        factory_kwargs["ids_only"] = ids_only.lower() == "true"
+    # sanitise the search mode flags
+    for flag in ("fuzzy", "substring"):
+        value = args.get(flag)
+        if value is not None and value.lower() in ["true", "false"]:
+            factory_kwargs[flag] = value.lower() == "true"
+    results_per_page = args.get("num-results")
     # sanitise results_per_page
     try:
         results_per_page = int(results_per_page)
@@ -352,7 +510,7 @@ def get_query_factory_from_params():
         factory_kwargs["results_per_page"] = results_per_page
     except (TypeError, ValueError):
         results_per_page = None
-    searchby = request.args.get("searchby")
+    searchby = args.get("searchby")
     try:
         if searchby.lower() not in searchby_vals:
             raise ValueError()
@@ -360,45 +518,220 @@ def get_query_factory_from_params():
         factory_kwargs["searchby"] = searchby
     except (AttributeError, ValueError):
         searchby = None
-    return QueryFactory(request.path, **factory_kwargs)
+    return QueryFactory(path, **factory_kwargs)
+
+
+def query_json(path, args, **context):
+    """(utf-8 json body, status code) answering a /query request"""
+    try:
+        query_factory = query_factory_from_args(path, args, cursor=args.get("cursor"), **context)
+    except ValueError as e:
+        return encode_json({"error": str(e)}), 400
+    return query_factory.serialize_json(), 200
+
+
+def batch_json(path, body):
+    """(utf-8 json body, status code) answering a /query/batch request
+
+    body is the decoded json request, a list of query parameter objects or an object holding that
+    list under "queries". every query is evaluated against the same index and they share term
+    lookups, each result is the payload /query would answer with, including its error if any"""
+    queries = body.get("queries") if isinstance(body, dict) else body
+    if not isinstance(queries, list) or not all(isinstance(x, dict) for x in queries):
+        return encode_json({"error": "expected a list of query parameter objects"}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return encode_json({"error": f"at most {MAX_BATCH_QUERIES} queries per batch"}), 400
+    context = {"index": index_manager.index, "term_cache": {}}
+    results = []
+    for params in queries:
+        # parameters are sanitised like query string values, which are never lists or objects
+        nested = [name for name, value in params.items() if isinstance(value, (list, dict))]
+        if nested:
+            results.append(encode_json({"error": f"parameter {nested[0]} must be a string, number or boolean"}))
+            continue
+        args = {}
+        for name, value in params.items():
+            if value is not None:
+                args[name] = str(value).lower() if isinstance(value, bool) else str(value)
+        results.append(query_json(path, args, **context)[0])
+    return b'{"results":[' + b",".join(results) + b"]}", 200
+
+
+def suggest_json(args):
+    """(utf-8 json body, status code) answering a /suggest request
+
+    the best completions of q in the field given by field=, or in every suggested field when it is
+    missing, ranked by how many votes and how high a rating their movies have"""
+    prefix = args.get("q")
+    if prefix is None:
+        prefix = ""
+    # sanitise field and num
+    fields = suggest_vals
+    field = args.get("field")
+    if field is not None and field.lower() in suggest_vals:
+        fields = [field.lower()]
+    try:
+        count = min(max(1, int(args.get("num"))), SUGGEST_K)
+    except (TypeError, ValueError):
+        count = SUGGEST_K
+    index = index_manager.index
+    suggestions = []
+    for field in fields:
+        suggestions += [(score, text, field, movies) for text, movies, score in index.suggestions(field, prefix, count)]
+    # each field's list is already its best, merging keeps the best of all fields
+    suggestions.sort(key=lambda x: x[0], reverse=True)
+    payload = {
+        "q": prefix,
+        "suggestions": [dict(text=text, field=field, movies=movies) for _, text, field, movies in suggestions[:count]],
+    }
+    return encode_json(payload), 200
+
+
+def colleagues_json(name):
+    """(utf-8 json body, status code) listing everyone the actor called name shared a cast with,
+    most movies together first"""
+    graph = index_manager.index.costar_graph
+    actor_id = graph.actor_id(name)
+    if actor_id is None:
+        return encode_json({"error": "unknown actor"}), 404
+    ids, shared = graph.colleagues(actor_id)
+    colleagues = [(graph.names[i], n) for i, n in zip(ids.tolist(), shared.tolist())]
+    colleagues.sort(key=lambda x: (-x[1], x[0]))
+    payload = {"actor": graph.names[actor_id], "colleagues": [dict(name=x, movies=n) for x, n in colleagues]}
+    return encode_json(payload), 200
+
+
+def degrees_json(name, args):
+    """(utf-8 json body, status code) with the shortest chain of co-stars from the actor called name
+    to the one given by to=, degrees and path are null when there is none"""
+    graph = index_manager.index.costar_graph
+    other = args.get("to")
+    if other is None:
+        return encode_json({"error": "missing to param"}), 400
+    actor_id = graph.actor_id(name)
+    other_id = graph.actor_id(other)
+    if actor_id is None or other_id is None:
+        return encode_json({"error": "unknown actor"}), 404
+    path = graph.path(actor_id, other_id)
+    payload = {
+        "actor": graph.names[actor_id],
+        "to": graph.names[other_id],
+        "degrees": None if path is None else len(path) - 1,
+        "path": None if path is None else [graph.names[i] for i in path],
+    }
+    return encode_json(payload), 200
+
+
+def similar_json(movie_id, args):
+    """(utf-8 json body, status code) with the movies most like movie_id, most similar first
+    NOTE: the neighbours of a movie are kept in query_cache, so popular movies are answered from a table"""
+    index = index_manager.index
+    # ids of removed movies stay unused, see MovieIndex.edited
+    if movie_id not in index.all_ids:
+        return encode_json({"error": "unknown movie"}), 404
+    try:
+        count = min(max(1, int(args.get("num"))), MAX_SIMILAR)
+    except (TypeError, ValueError):
+        count = parameter_defaults["num-results"]
+    key = ("similar", movie_id)
+    neighbours = query_cache.get(key, index)
+    if neighbours is None:
+        neighbours = index.similar(movie_id, MAX_SIMILAR)
+        query_cache.put(key, neighbours, index, size=len(neighbours))
+    neighbours = neighbours[:count]
+    row_json = index.row_json
+    head = encode_json({"idx": movie_id, "scores": [round(x, 6) for _, x in neighbours]})
+    return head[:-1] + b',"results_list":[' + b",".join(row_json[i] for i, _ in neighbours) + b"]}", 200
+
+
+def render_search_page(path, args):
+    """html of the /search page"""
+    # sanitise parameters
+    query_string = args.get("q")
+    if query_string is None:
+        query_string = ""
+    focus_search = args.get("focus-search")
+    if focus_search != "true":
+        focus_search = False
+    search_template = template_env.get_template("search_section.jinja")
+    search_section = search_template.render(query_string=query_string, focus_search=focus_search)
+    query_factory = query_factory_from_args(path, args)
+    results_section = query_factory.render_section()
+    results_template = template_env.get_template("results_page.jinja")
+    return results_template.render(results_section=results_section, search_section=search_section)
 
 
 app = Flask("Movie_Model_Viewer")
+index_page = StaticPage(os.path.join(TEMPLATE_DIR, "index.html"), auto_reload=debug)
 
 
 @app.route("/")
 def root():
-    ret = open("templates/index.html").read()
-    return app.response_class(response=ret, status=200)
+    return index_page.response()
 
 
 @app.route("/query")
 def query():
-    query_factory = get_query_factory_from_params()
-    return jsonify(query_factory.serialize())
+    body, status = query_json(request.path, request.args)
+    return app.response_class(body, status=status, mimetype="application/json")
+
+
+@app.route("/query/batch", methods=["POST"])
+def query_batch():
+    body = request.get_json(silent=True)
+    if body is None:
+        return jsonify(error="expected a json body"), 400
+    body, status = batch_json(request.path, body)
+    return app.response_class(body, status=status, mimetype="application/json")
+
+
+@app.route("/query/cache")
+def query_cache_stats():
+    return jsonify(query_cache.stats)
+
+
+@app.route("/suggest")
+def suggest():
+    body, status = suggest_json(request.args)
+    response = app.response_class(body, status=status, mimetype="application/json")
+    response.cache_control.public = True
+    response.cache_control.max_age = SUGGEST_MAX_AGE
+    response.set_etag(hashlib.sha1(body).hexdigest())
+    return response.make_conditional(request)
+
+
+@app.route("/actor/<name>/colleagues")
+def actor_colleagues(name):
+    body, status = colleagues_json(name)
+    return app.response_class(body, status=status, mimetype="application/json")
+
+
+@app.route("/actor/<name>/degrees")
+def actor_degrees(name):
+    body, status = degrees_json(name, request.args)
+    return app.response_class(body, status=status, mimetype="application/json")
+
+
+@app.route("/movie/<int:movie_id>/similar")
+def movie_similar(movie_id):
+    body, status = similar_json(movie_id, request.args)
+    return app.response_class(body, status=status, mimetype="application/json")
 
 
 @app.route("/search")
 def search():
-    # sanitise parameters
-    query_string = request.args.get("q")
-    if query_string is None:
-        query_string = ""
-    focus_search = request.args.get("focus-search")
-    if focus_search != "true":
-        focus_search = False
-    search_template = Template(open("templates/search_section.jinja", "r").read())
-    search_section = search_template.render(query_string=query_string, focus_search=focus_search)
-    query_factory = get_query_factory_from_params()
-    results_section = query_factory.render_section()
-    results_template = Template(open("templates/results_page.jinja", "r").read())
-    return results_template.render(results_section=results_section, search_section=search_section)
+    return render_search_page(request.path, request.args)
 
 
 @app.route("/css/<path:path>")
 def send_css(path):
-    return send_from_directory("templates/css", path)
+    return send_from_directory(os.path.join(TEMPLATE_DIR, "css"), path)
 
 
 if __name__ == "__main__":
+    # the development server picks up edited templates without a restart
+    template_env.auto_reload = True
+    index_page.auto_reload = True
+    if watch_interval > 0:
+        index_manager.watch(watch_interval)
     app.run(debug=True)
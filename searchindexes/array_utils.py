@@ -0,0 +1,9 @@
+import numpy as np
+
+
+def ranges(starts, stops):
+    """the concatenation of range(start, stop) for every pair, as one int64 array"""
+    lengths = stops - starts
+    # position within its range, plus the range's start
+    within = np.arange(lengths.sum(), dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return within + np.repeat(starts, lengths)
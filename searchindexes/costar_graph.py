@@ -0,0 +1,131 @@
+import numpy as np
+
+from searchindexes.array_utils import ranges
+
+
+class CoStarGraph:
+    """actors linked to everyone they shared a cast with, in compressed sparse row form
+
+    the colleagues of actor i are neighbours[offsets[i]:offsets[i + 1]], sorted by id, and
+    shared[...] holds how many movies each pair made together. three flat arrays replace a
+    python set per actor, and a lookup is a slice plus a binary search"""
+
+    def __init__(self, names, offsets, neighbours, shared):
+        self._names = names
+        self._offsets = offsets
+        self._neighbours = neighbours
+        self._shared = shared
+        self._lookup = None
+
+    @classmethod
+    def from_casts(cls, offsets, codes, names):
+        """builds the graph from the casts of every movie, movie i's cast is codes[offsets[i]:offsets[i + 1]]
+        and codes are positions in names, e.g. the actors column of a MovieTable"""
+        offsets = np.asarray(offsets, dtype=np.int64)
+        codes = np.asarray(codes, dtype=np.int64)
+        counts = np.diff(offsets)
+        # every cast entry paired with every entry of the same cast
+        entry_counts = np.repeat(counts, counts)
+        first = np.repeat(np.repeat(offsets[:-1], counts), entry_counts)
+        sources = np.repeat(np.arange(len(codes), dtype=np.int64), entry_counts)
+        targets = first + ranges(np.zeros(len(codes), dtype=np.int64), entry_counts)
+        sources, targets = codes[sources], codes[targets]
+        keep = sources != targets
+        count = max(len(names), 1)
+        # a single sorted key per edge, unique pairs come out grouped by source then sorted by target
+        pairs, shared = np.unique(sources[keep] * count + targets[keep], return_counts=True)
+        actor_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // count, minlength=len(names)), out=actor_offsets[1:])
+        neighbours = (pairs % count).astype(np.uint32)
+        return cls(names, actor_offsets, neighbours, shared.astype(np.uint32))
+
+    @property
+    def names(self):
+        return self._names
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    @property
+    def neighbours(self):
+        return self._neighbours
+
+    @property
+    def shared(self):
+        return self._shared
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def actor_id(self, name):
+        """id of the actor called name, ignoring case, None for an unknown name"""
+        if self._lookup is None:
+            lookup = {}
+            for i in range(len(self._names)):
+                lookup.setdefault(self._names[i].lower(), i)
+            self._lookup = lookup
+        return self._lookup.get(name.lower())
+
+    def colleagues(self, actor_id):
+        """(colleague ids, movies made together) arrays, sorted by id"""
+        start, stop = self._offsets[actor_id], self._offsets[actor_id + 1]
+        return self._neighbours[start:stop], self._shared[start:stop]
+
+    def worked_with(self, actor_id, colleague_id):
+        ids = self.colleagues(actor_id)[0]
+        i = np.searchsorted(ids, colleague_id)
+        return bool(i < len(ids) and ids[i] == colleague_id)
+
+    def _expand(self, frontier, parents):
+        """visits the unvisited neighbours of frontier, recording the actor each was reached from"""
+        starts, stops = self._offsets[frontier], self._offsets[frontier + 1]
+        reached = self._neighbours[ranges(starts, stops)].astype(np.int64)
+        origins = np.repeat(frontier, stops - starts)
+        new = parents[reached] < 0
+        reached, first = np.unique(reached[new], return_index=True)
+        parents[reached] = origins[new][first]
+        return reached
+
+    def path(self, actor_id, other_id, max_degrees=None):
+        """ids of the actors on a shortest chain of co-stars from actor_id to other_id, both included,
+        None when there is none within max_degrees
+
+        searches breadth first from both ends at once, always growing the smaller frontier, so
+        each side only has to reach about half way"""
+        if actor_id == other_id:
+            return [actor_id]
+        forward = np.full(len(self), -1, dtype=np.int64)
+        backward = np.full(len(self), -1, dtype=np.int64)
+        forward[actor_id] = actor_id
+        backward[other_id] = other_id
+        forward_frontier = np.array([actor_id], dtype=np.int64)
+        backward_frontier = np.array([other_id], dtype=np.int64)
+        degrees = 0
+        while len(forward_frontier) and len(backward_frontier):
+            if max_degrees is not None and degrees >= max_degrees:
+                return None
+            degrees += 1
+            if len(forward_frontier) <= len(backward_frontier):
+                forward_frontier = self._expand(forward_frontier, forward)
+                met = forward_frontier[backward[forward_frontier] >= 0]
+            else:
+                backward_frontier = self._expand(backward_frontier, backward)
+                met = backward_frontier[forward[backward_frontier] >= 0]
+            if len(met):
+                return self._join(int(met[0]), forward, backward)
+        return None
+
+    @staticmethod
+    def _join(middle, forward, backward):
+        path = [middle]
+        while forward[path[0]] != path[0]:
+            path.insert(0, int(forward[path[0]]))
+        while backward[path[-1]] != path[-1]:
+            path.append(int(backward[path[-1]]))
+        return path
+
+    def degrees(self, actor_id, other_id, max_degrees=None):
+        """number of co-star links between two actors, None when they are not connected"""
+        path = self.path(actor_id, other_id, max_degrees)
+        return None if path is None else len(path) - 1
@@ -0,0 +1,64 @@
+import base64
+import binascii
+import struct
+
+# reverse flag, rank and row id of the last row returned, followed by the sortby field name
+_CURSOR = struct.Struct("<?II")
+
+
+class Cursor:
+    """keyset position in a sorted result set, handed to clients as an opaque token
+
+    the rank is the row's position in the SortOrder of sortby, in the cursor's direction, which
+    already breaks ties between equal sort keys by row id, so resuming after it never skips or
+    repeats a row"""
+
+    def __init__(self, sortby: str, reverse: bool, rank: int, movie_id: int):
+        self._sortby = sortby
+        self._reverse = reverse
+        self._rank = rank
+        self._movie_id = movie_id
+
+    @property
+    def sortby(self) -> str:
+        return self._sortby
+
+    @property
+    def reverse(self) -> bool:
+        return self._reverse
+
+    @property
+    def rank(self) -> int:
+        return self._rank
+
+    @property
+    def movie_id(self) -> int:
+        return self._movie_id
+
+    def encode(self) -> str:
+        data = _CURSOR.pack(self._reverse, self._rank, self._movie_id) + self._sortby.encode("utf-8")
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+    @classmethod
+    def decode(cls, token: str):
+        """the Cursor encoded in token, raises ValueError for a malformed token"""
+        try:
+            data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            reverse, rank, movie_id = _CURSOR.unpack_from(data)
+            sortby = data[_CURSOR.size :].decode("utf-8")
+        except (binascii.Error, struct.error, UnicodeError) as e:
+            raise ValueError("bad cursor") from e
+        return cls(sortby, reverse, rank, movie_id)
+
+    def __eq__(self, other):
+        if not isinstance(other, Cursor):
+            return False
+        return (self._sortby, self._reverse, self._rank, self._movie_id) == (
+            other._sortby,
+            other._reverse,
+            other._rank,
+            other._movie_id,
+        )
+
+    def __repr__(self):
+        return f"<Cursor {self._sortby} {'desc' if self._reverse else 'asc'} after {self._movie_id}>"
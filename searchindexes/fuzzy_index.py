@@ -0,0 +1,166 @@
+import re
+from array import array
+from bisect import bisect_left
+
+_WORD_RE = re.compile(r"\w+")
+# the most edits tolerated in a single query word
+MAX_EDITS = 2
+
+
+def words(text: str):
+    return _WORD_RE.findall(text.lower())
+
+
+def max_distance(word: str) -> int:
+    """edits tolerated in a query word, short words would otherwise match almost anything"""
+    if len(word) <= 2:
+        return 0
+    if len(word) <= 5:
+        return 1
+    return 2
+
+
+def deletions(word: str, distance: int):
+    """every string obtained by deleting up to distance characters from word, word included"""
+    rv = {word}
+    layer = rv
+    for _ in range(distance):
+        layer = {x[:i] + x[i + 1 :] for x in layer for i in range(len(x))}
+        rv |= layer
+    return rv
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """optimal string alignment distance (insertions, deletions, substitutions and adjacent
+    transpositions) between a and b, returns limit + 1 as soon as it must exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class FuzzyIndex:
+    """finds the keys of a PrefixIndex whose words are within a few edits of the query words
+
+    every distinct word is indexed under each string left after deleting up to MAX_EDITS of its
+    characters, two words within d edits of each other share such a string with at most d
+    deletions from either, so a lookup only probes the deletions of the query word and compares
+    the few words found there instead of scanning the vocabulary
+
+    the index is flat arrays so it can be stored in a snapshot: the keys holding word i are
+    key_positions[key_offsets[i]:key_offsets[i + 1]], and the words a deletion string was derived
+    from are deletion_words[deletion_offsets[j]:deletion_offsets[j + 1]], where j is its position in
+    the sorted deletion strings"""
+
+    def __init__(self, words, key_offsets, key_positions, deletions, deletion_offsets, deletion_words):
+        self._words = words
+        self._key_offsets = key_offsets
+        self._key_positions = key_positions
+        self._deletions = deletions
+        self._deletion_offsets = deletion_offsets
+        self._deletion_words = deletion_words
+
+    @classmethod
+    def from_keys(cls, keys):
+        """indexes the words of keys, e.g. PrefixIndex.keys
+        NOTE: a word of n letters is stored under about n * n / 2 deletion strings"""
+        vocabulary = {}
+        # word id -> positions in keys of the keys containing the word
+        key_positions = []
+        for position in range(len(keys)):
+            for word in set(words(keys[position])):
+                word_id = vocabulary.setdefault(word, len(vocabulary))
+                if word_id == len(key_positions):
+                    key_positions.append(array("I"))
+                key_positions[word_id].append(position)
+        # deletion string -> ids of the words it was derived from
+        by_deletion = {}
+        for word_id, word in enumerate(vocabulary):
+            for deletion in deletions(word, MAX_EDITS):
+                by_deletion.setdefault(deletion, array("I")).append(word_id)
+        sorted_deletions = sorted(by_deletion)
+        key_offsets, positions = _flatten(key_positions)
+        deletion_offsets, deletion_words = _flatten(by_deletion[x] for x in sorted_deletions)
+        return cls(list(vocabulary), key_offsets, positions, sorted_deletions, deletion_offsets, deletion_words)
+
+    @property
+    def words(self):
+        return self._words
+
+    @property
+    def key_offsets(self):
+        return self._key_offsets
+
+    @property
+    def key_positions(self):
+        return self._key_positions
+
+    @property
+    def deletions(self):
+        return self._deletions
+
+    @property
+    def deletion_offsets(self):
+        return self._deletion_offsets
+
+    @property
+    def deletion_words(self):
+        return self._deletion_words
+
+    def __len__(self):
+        return len(self._words)
+
+    def _words_under(self, deletion):
+        i = bisect_left(self._deletions, deletion)
+        if i == len(self._deletions) or self._deletions[i] != deletion:
+            return ()
+        return self._deletion_words[self._deletion_offsets[i] : self._deletion_offsets[i + 1]]
+
+    def word_matches(self, word):
+        """word id -> edit distance of every indexed word close enough to word"""
+        distance = max_distance(word)
+        rv = {}
+        for deletion in deletions(word, distance):
+            for word_id in self._words_under(deletion):
+                if word_id not in rv:
+                    rv[word_id] = edit_distance(word, self._words[word_id], distance)
+        return {x: found for x, found in rv.items() if found <= distance}
+
+    def matches(self, query: str):
+        """key position -> total edits for the keys containing a close match of every query word"""
+        rv = None
+        for word in words(query):
+            distances = {}
+            for word_id, found in self.word_matches(word).items():
+                start, stop = self._key_offsets[word_id], self._key_offsets[word_id + 1]
+                for position in self._key_positions[start:stop]:
+                    if found < distances.get(position, found + 1):
+                        distances[position] = found
+            if rv is None:
+                rv = distances
+            else:
+                rv = {x: rv[x] + distances[x] for x in rv if x in distances}
+            if not rv:
+                return {}
+        return rv or {}
+
+
+def _flatten(lists):
+    """(offsets, values) of id arrays stored back to back"""
+    offsets = array("Q", [0])
+    values = array("I")
+    for ids in lists:
+        values.extend(ids)
+        offsets.append(len(values))
+    return offsets, values
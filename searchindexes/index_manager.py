@@ -0,0 +1,252 @@
+import os
+import threading
+
+from datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+from searchindexes.movie_index import MovieIndex, INDEX_COLUMNS
+from searchindexes.snapshot import default_snapshot_path, load_snapshot, open_movie_index, source_stamp, write_snapshot
+
+
+def _file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _movie_key(title, year):
+    # Movie equality, a movie is identified by its title and year
+    return title, year
+
+
+def _check_movie(movie):
+    """raises ValueError for a movie the index cannot hold"""
+    if movie.title is None or movie.year is None:
+        raise ValueError(f"{movie!r} needs a title and a year")
+    names = [x.actor_full_name for x in movie.actors] + [x.genre_name for x in movie.genres]
+    for name in names:
+        # rows join the names of a movie with line breaks
+        if not isinstance(name, str) or not name or "\n" in name:
+            raise ValueError(f"{movie!r} has an actor or genre without a valid name: {name!r}")
+
+
+def merge_movies(previous_keys, movies):
+    """orders movies so those already served keep their relative order and new ones come last
+
+    previous_keys are the (title, year) of the served rows in id order, returns the ordered movies"""
+    by_key = {}
+    for movie in movies:
+        # a repeated movie replaces the earlier one like a later csv row would
+        by_key[_movie_key(movie.title, movie.year)] = movie
+    previous = set()
+    ordered = []
+    for key in previous_keys:
+        if key in by_key and key not in previous:
+            ordered.append(by_key[key])
+        previous.add(key)
+    return ordered + [movie for key, movie in by_key.items() if key not in previous]
+
+
+class IndexManager:
+    """owns the MovieIndex being served and replaces it whenever the movies change
+
+    a new index is always built off to the side and published with one reference assignment,
+    so a request that read index once keeps a consistent view for its whole duration and a
+    rebuild never blocks requests, only other writers
+    NOTE: add_movie, update_movie and remove_movie only update the edited movie's rows, posting
+    lists and sort ranks, see MovieIndex.edited. edits live in memory only, they are never written
+    to the data file or the snapshot, and are applied again to every index a reload or refresh
+    publishes, so an edit wins over the data file for its (title, year)"""
+
+    def __init__(self, source_path, snapshot_path=None, workers=1):
+        self._source_path = source_path
+        self._snapshot_path = snapshot_path if snapshot_path is not None else default_snapshot_path(source_path)
+        self._workers = workers
+        self._file_state = _file_state(source_path)
+        self._index = open_movie_index(source_path, self._snapshot_path, workers)
+        # the snapshot file last mapped or written, another process replacing it changes this
+        self._snapshot_state = _file_state(self._snapshot_path)
+        # (title, year) -> edited Movie, None for a removed one, in the order they were made
+        self._edits = {}
+        # (title, year) -> id of every movie of the served index, computed on the first edit
+        self._positions = None
+        self._version = 0
+        self._listeners = []
+        # serialises writers, readers never take it
+        self._lock = threading.Lock()
+        self._watch_stop = None
+
+    @property
+    def index(self) -> MovieIndex:
+        return self._index
+
+    @property
+    def version(self) -> int:
+        """number of times a new index was published"""
+        return self._version
+
+    @property
+    def source_path(self):
+        return self._source_path
+
+    def subscribe(self, listener):
+        """calls listener(index) after every newly published index"""
+        self._listeners.append(listener)
+
+    def _publish(self, index, positions=None):
+        self._positions = positions
+        self._index = index
+        self._version += 1
+        for listener in self._listeners:
+            listener(index)
+
+    def _served_keys(self, index):
+        """(title, year) of the movies of index in id order"""
+        rows = index.rows
+        return [_movie_key(rows[i]["title"], rows[i]["year"]) for i in index.all_ids]
+
+    def _read_movies(self):
+        reader = MovieFileCSVReader(self._source_path)
+        return list(reader.iter_movies(columns=INDEX_COLUMNS))
+
+    def _current_positions(self):
+        if self._positions is None:
+            index = self._index
+            self._positions = dict(zip(self._served_keys(index), index.all_ids))
+        return self._positions
+
+    def _with_edits(self, index):
+        """(index with the edits made in this process applied, positions of its movies)"""
+        positions = dict(zip(self._served_keys(index), index.all_ids))
+        if not self._edits:
+            return index, positions
+        movies = {}
+        removed = []
+        next_id = len(index)
+        for key, movie in self._edits.items():
+            position = positions.get(key)
+            if movie is None:
+                if position is not None:
+                    removed.append(position)
+                    del positions[key]
+                continue
+            if position is None:
+                position = positions[key] = next_id
+                next_id += 1
+            movies[position] = movie
+        return index.edited(movies, removed), positions
+
+    def _edit(self, key, position, movie):
+        """publishes the served index with the movie at position replaced, removed when movie is None"""
+        positions = dict(self._current_positions())
+        if movie is None:
+            index = self._index.edited(removed=[position])
+            del positions[key]
+        else:
+            index = self._index.edited({position: movie})
+            positions[key] = position
+        # a later edit of the same movie replaces this one and is applied after the earlier ones
+        self._edits.pop(key, None)
+        self._edits[key] = movie
+        self._publish(index, positions)
+
+    def _position(self, movie):
+        position = self._current_positions().get(_movie_key(movie.title, movie.year))
+        if position is None:
+            raise ValueError(f"{movie!r} is not indexed")
+        return position
+
+    def add_movie(self, movie):
+        """serves movie as well, it gets the next free id"""
+        _check_movie(movie)
+        with self._lock:
+            key = _movie_key(movie.title, movie.year)
+            if key in self._current_positions():
+                raise ValueError(f"{movie!r} is already indexed")
+            self._edit(key, len(self._index), movie)
+
+    def update_movie(self, movie):
+        """replaces the indexed movie with the same title and year, keeping its id"""
+        _check_movie(movie)
+        with self._lock:
+            self._edit(_movie_key(movie.title, movie.year), self._position(movie), movie)
+
+    def remove_movie(self, movie):
+        """stops serving the movie with the same title and year
+        NOTE: the id of the movie is not reused and the ids of other movies do not change"""
+        with self._lock:
+            self._edit(_movie_key(movie.title, movie.year), self._position(movie), None)
+
+    def reload(self, force=False):
+        """re-reads the data file if it changed since it was last read, returns the merge counts or None
+        NOTE: movies that are still in the file keep their order, so ids only shift past removed movies,
+        and the edits made in this process are applied again on top of the file's movies"""
+        with self._lock:
+            state = _file_state(self._source_path)
+            if state is None or (state == self._file_state and not force):
+                return None
+            # stamp before reading so a concurrent edit of the csv file makes the snapshot stale, not wrong
+            stamp = source_stamp(self._source_path)
+            served = self._served_keys(self._index)
+            index = MovieIndex.from_movies(merge_movies(served, self._read_movies()))
+            try:
+                write_snapshot(self._snapshot_path, index, stamp)
+            except OSError:
+                # the snapshot location is not writable, keep serving from memory
+                pass
+            else:
+                # the mapped snapshot is shared with other processes, the built index can be dropped
+                loaded = load_snapshot(self._snapshot_path, self._source_path)
+                if loaded is not None:
+                    index = loaded
+                self._snapshot_state = _file_state(self._snapshot_path)
+            self._file_state = state
+            index, positions = self._with_edits(index)
+            served = set(served)
+            changes = {"added": len(positions.keys() - served), "removed": len(served - positions.keys())}
+            self._publish(index, positions)
+            return changes
+
+    def refresh(self):
+        """maps the snapshot again when another process rewrote it, returns whether a new index was published
+        NOTE: like a reload this applies the edits made in this process again"""
+        with self._lock:
+            state = _file_state(self._snapshot_path)
+            if state is None or state == self._snapshot_state:
+                return False
+            index = load_snapshot(self._snapshot_path, self._source_path)
+            if index is None:
+                # older than the data file, the process rebuilding it replaces it again
+                return False
+            self._snapshot_state = state
+            self._file_state = _file_state(self._source_path)
+            self._publish(*self._with_edits(index))
+            return True
+
+    def watch(self, interval=5.0):
+        """polls the data file every interval seconds and reloads it when it changes
+        NOTE: one process should watch and rewrite the snapshot, other processes serving the same
+        snapshot follow() it instead of each parsing the data file again"""
+        self._poll(self.reload, interval, "movie-data-watcher")
+
+    def follow(self, interval=5.0):
+        """polls the snapshot every interval seconds and maps it again when another process rewrote it"""
+        self._poll(self.refresh, interval, "movie-snapshot-follower")
+
+    def _poll(self, check, interval, name):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.stop_watching()
+        stop = threading.Event()
+        self._watch_stop = stop
+
+        def poll():
+            while not stop.wait(interval):
+                check()
+
+        threading.Thread(target=poll, name=name, daemon=True).start()
+
+    def stop_watching(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
@@ -0,0 +1,519 @@
+import copy
+import json
+from array import array
+from bisect import bisect_left
+import numpy as np
+from searchindexes.costar_graph import CoStarGraph
+from searchindexes.fuzzy_index import FuzzyIndex
+from searchindexes.movie_table import MovieTableBuilder
+from searchindexes.posting_list import PostingList, union
+from searchindexes.prefix_index import PrefixIndex
+from searchindexes.similarity_index import SimilarityIndex
+from searchindexes.sort_order import SortOrder
+from searchindexes.substring_index import SubstringIndex
+from searchindexes.suggest_index import SuggestIndex
+from searchindexes.text_index import TextIndexBuilder
+
+# keys of the row dicts served for every movie, in order
+ROW_FIELDS = ["idx", "title", "year", "actors", "genres", "runtime", "rating", "votes", "revenue", "metascore"]
+# fields sorted by their row values
+TEXT_SORTBY_FIELDS = ["title", "year", "actors", "genres"]
+# fields sorted with the numeric columns of the movie table
+NUMERIC_SORTBY_FIELDS = ["runtime", "rating", "votes", "revenue", "metascore"]
+SORTBY_FIELDS = TEXT_SORTBY_FIELDS + NUMERIC_SORTBY_FIELDS
+SEARCHBY_FIELDS = ["title", "year", "actor", "genre"]
+# free text fields searched by keyword and ranked with BM25
+TEXT_SEARCH_FIELDS = ["description"]
+# fields whose words can be matched with typos, years are only ever matched exactly
+FUZZY_FIELDS = ["title", "actor", "genre"]
+# fields that can be matched anywhere inside a key, years only match from the start
+SUBSTRING_FIELDS = ["title", "actor", "genre"]
+# fields whose keys are offered as completions, with the movie table column holding their spelling
+SUGGEST_FIELDS = {"title": "title", "actor": "actors", "genre": "genres"}
+# fields that can be filtered with a low..high range
+RANGE_FIELDS = ["year"] + NUMERIC_SORTBY_FIELDS
+# csv columns read when building the index, the others are never materialised
+INDEX_COLUMNS = (
+    "Title",
+    "Year",
+    "Actors",
+    "Genre",
+    "Description",
+    "Director",
+    "Runtime (Minutes)",
+    "Rating",
+    "Votes",
+    "Revenue (Millions)",
+    "Metascore",
+)
+
+
+class MovieIndex:
+    """the rows served by the viewer together with every index built over them"""
+
+    def __init__(
+        self,
+        rows,
+        field_indexes,
+        sort_orders,
+        table,
+        all_ids=None,
+        buffer=None,
+        text_indexes=None,
+        row_json=None,
+        costar_graph=None,
+        fuzzy_indexes=None,
+        suggest_indexes=None,
+        substring_indexes=None,
+        similarity_index=None,
+    ):
+        self._rows = rows
+        # utf-8 json encoding of every row, responses join these instead of encoding the rows again
+        if row_json is None:
+            row_json = [encode_row(rows[i]) for i in range(len(rows))]
+        self._row_json = row_json
+        self._field_indexes = field_indexes
+        self._text_indexes = text_indexes if text_indexes is not None else {}
+        self._sort_orders = sort_orders
+        self._table = table
+        # actors linked to their co-stars, actor ids are the codes of the actors column
+        if costar_graph is None:
+            actors = table["actors"]
+            costar_graph = CoStarGraph.from_casts(actors.offsets, actors.codes, actors.values)
+        self._costar_graph = costar_graph
+        if all_ids is None:
+            all_ids = PostingList(range(len(rows)))
+        self._all_ids = all_ids
+        # keeps a memory mapped snapshot open for as long as the index uses it
+        self._buffer = buffer
+        # typo tolerant lookups of the words of every fuzzy field, built with the index and kept in
+        # the snapshot, a field holds about n * n / 2 deletion strings per distinct word of n letters
+        if fuzzy_indexes is None:
+            fuzzy_indexes = {x: FuzzyIndex.from_keys(field_indexes[x].keys) for x in FUZZY_FIELDS}
+        self._fuzzy_indexes = fuzzy_indexes
+        # suffix arrays of the keys of every substring field, built with the index and kept in the
+        # snapshot, a field holds 4 bytes per byte of its distinct keys
+        if substring_indexes is None:
+            substring_indexes = {x: SubstringIndex.from_keys(field_indexes[x].keys) for x in SUBSTRING_FIELDS}
+        self._substring_indexes = substring_indexes
+        # top completions of every prefix of the suggested fields with the original spelling of their
+        # keys, built with the index so no request pays for it
+        if suggest_indexes is None:
+            suggest_indexes = {x: self._build_suggest_index(x) for x in SUGGEST_FIELDS}
+        self._suggest_indexes = suggest_indexes
+        # feature vectors of every movie for similar movie requests, built with the index and kept in
+        # the snapshot
+        if similarity_index is None:
+            similarity_index = SimilarityIndex.from_table(table, self._text_indexes.get("description"))
+        self._similarity_index = similarity_index
+        # field -> _FieldEdits of the keys edits touched or added, see edited
+        self._field_edits = {}
+
+    @classmethod
+    def from_movies(cls, movies):
+        """builds the index from any iterable of movies, e.g. MovieFileCSVReader.iter_movies()"""
+        rows = []
+        field_indexes = {x: PrefixIndex() for x in SEARCHBY_FIELDS}
+        table_builder = MovieTableBuilder()
+        text_builders = {"description": TextIndexBuilder()}
+        for i, movie in enumerate(movies):
+            rows.append(_movie_row(movie, i))
+            table_builder.append(movie)
+            for field, keys in _movie_keys(movie).items():
+                for key in keys:
+                    field_indexes[field].add(key, i)
+            text_builders["description"].add(i, movie.description)
+        # sort orders are computed once here so requests never sort the full result list
+        sort_orders = {key: SortOrder(rows, key) for key in TEXT_SORTBY_FIELDS}
+        table = table_builder.build()
+        for key in NUMERIC_SORTBY_FIELDS:
+            arrays = [array("I", x.tobytes()) for reverse in (False, True) for x in table.sort_order(key, reverse)]
+            sort_orders[key] = SortOrder.from_arrays(key, *arrays)
+        text_indexes = {x: text_builders[x].build(len(rows)) for x in TEXT_SEARCH_FIELDS}
+        return cls(rows, field_indexes, sort_orders, table, text_indexes=text_indexes)
+
+    def edited(self, movies=None, removed=()):
+        """a new index where movie id i holds movies[i] for every id in movies and the ids in removed
+        hold no movie, ids from len(self) on add movies and have to follow on from it
+
+        ids never change, a removed movie only leaves its id unused. the rows, posting lists, sort
+        ranks, table rows and texts of the edited ids are updated and the rest is shared or copied,
+        so an edit costs a few copies of the id arrays instead of a rebuild. every field keeps its
+        keys where they are, so its fuzzy, substring and suggest indexes stay valid and only the keys
+        edits add to a field are indexed again, on the side
+        NOTE: the result only lives in memory, a snapshot is always written from an index built from
+        movies. the similarity index is built again on the first similar movies request"""
+        movies = dict(movies or {})
+        removed = sorted(set(removed))
+        count = max([len(self)] + [x + 1 for x in movies])
+        edited_ids = sorted(set(movies) | set(removed))
+        index = copy.copy(self)
+        index._rows = _Edited(self._rows, {x: _movie_row(movie, x) for x, movie in movies.items()}, count)
+        index._row_json = _Edited(self._row_json, {x: encode_row(index._rows[x]) for x in movies}, count)
+        index._table = self._table.edited({**dict.fromkeys(removed), **movies}, count)
+        added_ids = PostingList(sorted(x for x in movies if x >= len(self)))
+        index._all_ids = self._all_ids.difference(PostingList(removed)).union(added_ids)
+        texts = {**dict.fromkeys(removed), **{x: movie.description for x, movie in movies.items()}}
+        index._text_indexes = {
+            x: text_index.edited(texts, count, len(index._all_ids)) for x, text_index in self._text_indexes.items()
+        }
+        index._sort_orders = {}
+        for key in TEXT_SORTBY_FIELDS:
+            value = lambda x, key=key: index._rows[x][key]
+            index._sort_orders[key] = self._sort_orders[key].edited(movies, removed, value, count)
+        for key in NUMERIC_SORTBY_FIELDS:
+            value = index._table.sort_keys(key).__getitem__
+            index._sort_orders[key] = self._sort_orders[key].edited(movies, removed, value, count)
+        actors = index._table["actors"]
+        index._costar_graph = CoStarGraph.from_casts(actors.offsets, actors.codes, actors.values)
+        index._similarity_index = None
+
+        # every key an edited movie held before the edit or holds after it, and the new holders of each
+        affected = {x: set() for x in SEARCHBY_FIELDS}
+        holders = {x: {} for x in SEARCHBY_FIELDS}
+        spellings = {x: {} for x in SEARCHBY_FIELDS}
+        for movie_id in edited_ids:
+            if movie_id < len(self):
+                for field, keys in _row_keys(self._rows[movie_id]).items():
+                    affected[field].update(keys)
+        for movie_id, movie in movies.items():
+            for field, names in _movie_names(movie).items():
+                for name in names:
+                    affected[field].add(name.lower())
+                    holders[field].setdefault(name.lower(), []).append(movie_id)
+                    spellings[field].setdefault(name.lower(), name)
+        edited_postings = PostingList(edited_ids)
+        popularity = index.popularity()
+        index._field_indexes = {}
+        index._suggest_indexes = dict(self._suggest_indexes)
+        index._field_edits = {}
+        for field in SEARCHBY_FIELDS:
+            field_index = self._field_indexes[field]
+            previous = self._field_edits.get(field)
+            changed = {}
+            added = {}
+            if previous is not None:
+                added = {previous.index.keys[i]: previous.index.postings[i] for i in range(len(previous.index.keys))}
+                spellings[field] = {**previous.spellings, **spellings[field]}
+            for key in affected[field]:
+                position = field_index.position(key)
+                current = field_index.postings[position] if position is not None else added.get(key, PostingList())
+                postings = current.difference(edited_postings).union(
+                    PostingList(sorted(set(holders[field].get(key, []))))
+                )
+                if position is not None:
+                    changed[position] = postings
+                elif len(postings):
+                    added[key] = postings
+                else:
+                    added.pop(key, None)
+            if changed:
+                field_index = PrefixIndex.from_sorted(
+                    field_index.keys, _Edited(field_index.postings, changed, len(field_index.keys))
+                )
+            index._field_indexes[field] = field_index
+            if field in SUGGEST_FIELDS and changed:
+                suggest_index, scores, key_spellings = self._suggest_indexes[field]
+                scores = _Edited(
+                    scores, {x: _score(popularity, x_postings) for x, x_postings in changed.items()}, len(scores)
+                )
+                index._suggest_indexes[field] = (suggest_index, scores, key_spellings)
+            touched = sorted(set(previous.touched if previous is not None else []) | set(changed))
+            if added or touched:
+                index._field_edits[field] = _FieldEdits(field, added, spellings[field], touched, popularity)
+        return index
+
+    @property
+    def rows(self):
+        return self._rows
+
+    @property
+    def row_json(self):
+        return self._row_json
+
+    @property
+    def field_indexes(self):
+        return self._field_indexes
+
+    @property
+    def text_indexes(self):
+        return self._text_indexes
+
+    @property
+    def sort_orders(self):
+        return self._sort_orders
+
+    @property
+    def table(self):
+        return self._table
+
+    @property
+    def costar_graph(self):
+        return self._costar_graph
+
+    @property
+    def all_ids(self):
+        return self._all_ids
+
+    def __len__(self):
+        """the next free movie id, ids of removed movies stay unused so all_ids can hold fewer"""
+        return len(self._rows)
+
+    def field_postings(self, field, prefix):
+        postings = self._field_indexes[field].prefix_postings(prefix)
+        edits = self._field_edits.get(field)
+        if edits is not None:
+            postings = postings.union(edits.index.prefix_postings(prefix))
+        return postings
+
+    def text_scores(self, field, query):
+        """(ids, BM25 scores) numpy arrays of movies whose field contains any word of query"""
+        return self._text_indexes[field].scores(query)
+
+    @property
+    def fuzzy_indexes(self):
+        return self._fuzzy_indexes
+
+    def fuzzy_index(self, field):
+        return self._fuzzy_indexes[field]
+
+    def fuzzy_matches(self, field, value):
+        """movie id -> edits for movies whose field has a close match of every word of value
+        NOTE: exact prefix matches are always included with 0 edits"""
+        rv = dict.fromkeys(self.field_postings(field, value), 0)
+        indexes = [(self.fuzzy_index(field), self._field_indexes[field])]
+        if field in self._field_edits:
+            indexes.append((self._field_edits[field].fuzzy, self._field_edits[field].index))
+        for fuzzy_index, field_index in indexes:
+            for position, edits in fuzzy_index.matches(value).items():
+                for movie_id in field_index.postings[position]:
+                    if edits < rv.get(movie_id, edits + 1):
+                        rv[movie_id] = edits
+        return rv
+
+    @property
+    def substring_indexes(self):
+        return self._substring_indexes
+
+    def substring_index(self, field):
+        return self._substring_indexes[field]
+
+    def _substring_sources(self, field):
+        rv = [(self.substring_index(field), self._field_indexes[field])]
+        if field in self._field_edits:
+            rv.append((self._field_edits[field].substring, self._field_edits[field].index))
+        return rv
+
+    def substring_count(self, field, value):
+        """number of times value occurs in the distinct keys of field
+        NOTE: after an edit this still counts keys no movie holds any more"""
+        return sum(index.count(value) for index, _ in self._substring_sources(field))
+
+    def substring_postings(self, field, value):
+        """ids of movies whose field contains value anywhere"""
+        return union(
+            field_index.postings[i]
+            for index, field_index in self._substring_sources(field)
+            for i in index.search(value).tolist()
+        )
+
+    def popularity(self):
+        """votes times rating of every movie, 0 when either is missing"""
+        votes = self._table["votes"]
+        rating = self._table["rating"]
+        return np.where(votes > 0, votes, 0) * np.nan_to_num(rating).astype(np.float64)
+
+    def _build_suggest_index(self, field):
+        field_index = self._field_indexes[field]
+        popularity = self.popularity()
+        scores = np.zeros(len(field_index.keys), dtype=np.float64)
+        for position, postings in enumerate(field_index.postings):
+            scores[position] = popularity[np.frombuffer(postings.ids, dtype=np.uint32)].sum()
+        column = self._table[SUGGEST_FIELDS[field]]
+        spelling = {}
+        for i in range(len(column.values)):
+            spelling.setdefault(column.values[i].lower(), column.values[i])
+        spellings = [spelling.get(key, key) for key in field_index.keys]
+        ranking = [(scores[i], len(field_index.postings[i])) for i in range(len(scores))]
+        return SuggestIndex.from_scores(field_index.keys, ranking), scores, spellings
+
+    @property
+    def suggest_indexes(self):
+        return self._suggest_indexes
+
+    def suggest_index(self, field):
+        """(SuggestIndex, scores, spellings) of a field, keys are ranked by the summed popularity of
+        their movies (scores), then by their number of movies, and shown with their original spelling"""
+        return self._suggest_indexes[field]
+
+    def suggestions(self, field, prefix, count=None):
+        """(spelling, number of movies, score) of the best keys of field starting with prefix
+        NOTE: score is (summed popularity, number of movies), the order keys are suggested in. after an
+        edit the stored completions are ranked again along with the keys edits touched or added, so a key
+        ranked just below them is missed when an edit made one of them fall"""
+        index, scores, spellings = self.suggest_index(field)
+        count = index.k if count is None else min(count, index.k)
+        prefix = prefix.lower()
+        field_index = self._field_indexes[field]
+        positions = index.suggest(prefix, count)
+        sources = [(field_index, positions, scores, spellings)]
+        edits = self._field_edits.get(field)
+        if edits is not None:
+            start, stop = field_index.prefix_range(prefix)
+            touched = edits.touched[bisect_left(edits.touched, start) : bisect_left(edits.touched, stop)]
+            sources[0] = (field_index, sorted(set(positions) | set(touched)), scores, spellings)
+            added, added_scores, added_spellings = edits.suggest
+            sources.append((edits.index, added.suggest(prefix, count), added_scores, added_spellings))
+        candidates = []
+        for source_index, source_positions, source_scores, source_spellings in sources:
+            for position in source_positions:
+                movies = len(source_index.postings[position])
+                if movies:
+                    score = (float(source_scores[position]), movies)
+                    candidates.append((score, source_index.keys[position], source_spellings[position]))
+        # best score first, ties in key order
+        candidates.sort(key=lambda x: (-x[0][0], -x[0][1], x[1]))
+        return [(spelling, score[1], score) for score, _, spelling in candidates[:count]]
+
+    @property
+    def similarity_index(self):
+        if self._similarity_index is None:
+            # an edited index builds it on first use, see edited
+            self._similarity_index = SimilarityIndex.from_table(
+                self._table, self._text_indexes.get("description"), len(self._all_ids)
+            )
+        return self._similarity_index
+
+    def similar(self, movie_id, k=10):
+        """the k (movie id, similarity) pairs most like movie_id by genres, cast, director and description"""
+        return self.similarity_index.similar(movie_id, k)
+
+    def range_postings(self, field, low, high):
+        """ids of movies whose field is between low and high inclusive, either bound may be None"""
+        return self._table.range_postings(field, low, high)
+
+
+def encode_row(row) -> bytes:
+    return json.dumps(row, separators=(",", ":")).encode("utf-8")
+
+
+def _movie_row(movie, movie_id):
+    """the row dict served for movie"""
+    return {
+        "idx": movie_id,
+        "title": movie.title,
+        "year": movie.year,
+        "actors": "\n".join(x.actor_full_name for x in movie.actors),
+        "genres": "\n".join(x.genre_name for x in movie.genres),
+        "runtime": movie.runtime_minutes,
+        "rating": movie.rating,
+        "votes": movie.votes,
+        "revenue": movie.revenue_millions,
+        "metascore": movie.metascore,
+    }
+
+
+def _movie_names(movie):
+    """field -> the names movie is found by in the field, as spelled in movie"""
+    return {
+        "title": [movie.title],
+        "year": [str(movie.year)],
+        # actor_full_name is expected to identify an actor
+        "actor": [x.actor_full_name for x in movie.actors],
+        # genre_name is expected to identify a genre
+        "genre": [x.genre_name for x in movie.genres],
+    }
+
+
+def _movie_keys(movie):
+    """field -> the keys movie is indexed under in the field"""
+    return {field: [x.lower() for x in names] for field, names in _movie_names(movie).items()}
+
+
+def _row_keys(row):
+    """field -> the keys the movie of a served row is indexed under in the field"""
+    return {
+        "title": [row["title"].lower()],
+        "year": [str(row["year"])],
+        "actor": [x.lower() for x in row["actors"].split("\n")] if row["actors"] else [],
+        "genre": [x.lower() for x in row["genres"].split("\n")] if row["genres"] else [],
+    }
+
+
+def _score(popularity, postings):
+    return popularity[np.frombuffer(postings.ids, dtype=np.uint32)].sum()
+
+
+class _Edited:
+    """read-only sequence of the items of base with some of them replaced, positions past the end
+    of base are added"""
+
+    def __init__(self, base, changes, length):
+        if isinstance(base, _Edited):
+            # edits of an edited sequence are kept in one dict over the original base
+            changes = {**base._changes, **changes}
+            base = base._base
+        self._base = base
+        self._changes = changes
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError("edited sequence index out of range")
+        if i in self._changes:
+            return self._changes[i]
+        return self._base[i]
+
+    def __iter__(self):
+        return (self[i] for i in range(self._length))
+
+
+class _FieldEdits:
+    """what edits changed in one field of an edited MovieIndex
+
+    the base keys whose posting lists or movies an edit changed (touched), as positions in the
+    field's keys, and the keys no base movie held (added) with their own prefix, fuzzy, substring
+    and suggest indexes, rebuilt on every edit as they are few"""
+
+    def __init__(self, field, added, spellings, touched, popularity):
+        keys = sorted(added)
+        postings = [added[x] for x in keys]
+        self._touched = touched
+        self._spellings = spellings
+        self._index = PrefixIndex.from_sorted(keys, postings)
+        self._fuzzy = FuzzyIndex.from_keys(keys) if field in FUZZY_FIELDS else None
+        self._substring = SubstringIndex.from_keys(keys) if field in SUBSTRING_FIELDS else None
+        self._suggest = None
+        if field in SUGGEST_FIELDS:
+            scores = [_score(popularity, x) for x in postings]
+            ranking = [(scores[i], len(postings[i])) for i in range(len(keys))]
+            self._suggest = SuggestIndex.from_scores(keys, ranking), scores, [spellings.get(x, x) for x in keys]
+
+    @property
+    def touched(self):
+        return self._touched
+
+    @property
+    def spellings(self):
+        return self._spellings
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def fuzzy(self):
+        return self._fuzzy
+
+    @property
+    def substring(self):
+        return self._substring
+
+    @property
+    def suggest(self):
+        return self._suggest
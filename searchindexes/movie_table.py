@@ -0,0 +1,290 @@
+import numpy as np
+from searchindexes.posting_list import PostingList
+
+# integer columns mark missing values with this, float columns use NaN
+MISSING_INT = -1
+# column name -> (dtype, function reading the value from a Movie)
+NUMERIC_COLUMNS = {
+    "year": (np.int16, lambda movie: movie.year),
+    "runtime": (np.int16, lambda movie: movie.runtime_minutes),
+    "rating": (np.float32, lambda movie: movie.rating),
+    "votes": (np.int64, lambda movie: movie.votes),
+    "revenue": (np.float64, lambda movie: movie.revenue_millions),
+    "metascore": (np.int16, lambda movie: movie.metascore),
+}
+DICTIONARY_COLUMNS = {
+    "title": lambda movie: movie.title,
+    "director": lambda movie: movie.director.director_full_name if movie.director is not None else None,
+}
+MULTI_DICTIONARY_COLUMNS = {
+    "actors": lambda movie: [x.actor_full_name for x in movie.actors],
+    "genres": lambda movie: [x.genre_name for x in movie.genres],
+}
+
+
+class DictionaryColumn:
+    """strings stored as int32 codes into the list of distinct values, -1 codes a missing value"""
+
+    def __init__(self, codes, values):
+        self._codes = codes
+        self._values = values
+        self._lookup = None
+
+    @property
+    def codes(self):
+        return self._codes
+
+    @property
+    def values(self):
+        return self._values
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __getitem__(self, row_id):
+        code = self._codes[row_id]
+        return None if code < 0 else self._values[code]
+
+    def code(self, value):
+        """the code of value, None if no row holds it"""
+        if self._lookup is None:
+            self._lookup = {self._values[i]: i for i in range(len(self._values))}
+        return self._lookup.get(value)
+
+    def mask(self, value):
+        code = self.code(value)
+        if code is None:
+            return np.zeros(len(self._codes), dtype=bool)
+        return self._codes == code
+
+
+class MultiDictionaryColumn(DictionaryColumn):
+    """rows holding several strings, row i holds the values coded by codes[offsets[i]:offsets[i + 1]]"""
+
+    def __init__(self, offsets, codes, values):
+        super().__init__(codes, values)
+        self._offsets = offsets
+        self._entry_rows = None
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row_id):
+        return [self._values[x] for x in self._codes[self._offsets[row_id] : self._offsets[row_id + 1]]]
+
+    def counts(self):
+        """number of values in each row"""
+        return np.diff(self._offsets)
+
+    def mask(self, value):
+        rv = np.zeros(len(self), dtype=bool)
+        code = self.code(value)
+        if code is None:
+            return rv
+        if self._entry_rows is None:
+            # the row id of every entry in codes
+            self._entry_rows = np.repeat(np.arange(len(self), dtype=np.uint32), self.counts())
+        rv[self._entry_rows[self._codes == code]] = True
+        return rv
+
+
+class MovieTableBuilder:
+    """collects movies one at a time and converts them to columns in build()"""
+
+    def __init__(self):
+        self._numeric = {name: [] for name in NUMERIC_COLUMNS}
+        self._dictionary = {name: ([], {}) for name in DICTIONARY_COLUMNS}
+        self._multi = {name: ([0], [], {}) for name in MULTI_DICTIONARY_COLUMNS}
+
+    def append(self, movie):
+        for name, (dtype, get) in NUMERIC_COLUMNS.items():
+            value = get(movie)
+            if value is None:
+                value = np.nan if np.issubdtype(dtype, np.floating) else MISSING_INT
+            self._numeric[name].append(value)
+        for name, get in DICTIONARY_COLUMNS.items():
+            codes, lookup = self._dictionary[name]
+            value = get(movie)
+            codes.append(MISSING_INT if value is None else lookup.setdefault(value, len(lookup)))
+        for name, get in MULTI_DICTIONARY_COLUMNS.items():
+            offsets, codes, lookup = self._multi[name]
+            codes.extend(lookup.setdefault(x, len(lookup)) for x in get(movie))
+            offsets.append(len(codes))
+
+    def build(self):
+        columns = {}
+        for name, (dtype, _) in NUMERIC_COLUMNS.items():
+            columns[name] = np.array(self._numeric[name], dtype=dtype)
+        for name, (codes, lookup) in self._dictionary.items():
+            columns[name] = DictionaryColumn(np.array(codes, dtype=np.int32), list(lookup))
+        for name, (offsets, codes, lookup) in self._multi.items():
+            columns[name] = MultiDictionaryColumn(
+                np.array(offsets, dtype=np.int64), np.array(codes, dtype=np.int32), list(lookup)
+            )
+        return MovieTable(columns)
+
+
+class MovieTable:
+    """struct of arrays over the catalogue, one array per field indexed by movie id
+
+    numeric fields are typed numpy arrays, names are dictionary encoded, so filters,
+    sorts and aggregations run vectorised instead of looping over row dicts"""
+
+    def __init__(self, columns):
+        self._columns = columns
+
+    @classmethod
+    def from_movies(cls, movies):
+        builder = MovieTableBuilder()
+        for movie in movies:
+            builder.append(movie)
+        return builder.build()
+
+    @property
+    def columns(self):
+        return self._columns
+
+    def __len__(self):
+        return len(self._columns["year"])
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    def valid_mask(self, name):
+        """rows where the numeric column name has a value"""
+        column = self._columns[name]
+        if np.issubdtype(column.dtype, np.floating):
+            return ~np.isnan(column)
+        return column != MISSING_INT
+
+    def edited(self, movies, count):
+        """a copy with count rows where row i holds movies[i] for every row id in movies, None blanks the
+        row of a removed movie so it holds no value, rows past the current ones are added
+        NOTE: only the edited rows are converted, every column is copied once"""
+        ids = np.fromiter(movies, dtype=np.int64, count=len(movies))
+        edited = list(movies.values())
+        columns = {}
+        for name, (dtype, get) in NUMERIC_COLUMNS.items():
+            missing = np.nan if np.issubdtype(dtype, np.floating) else MISSING_INT
+            column = _resized(self._columns[name], count, missing)
+            values = [None if x is None else get(x) for x in edited]
+            column[ids] = np.array([missing if x is None else x for x in values], dtype=dtype)
+            columns[name] = column
+        for name, get in DICTIONARY_COLUMNS.items():
+            column = self._columns[name]
+            values, code = _extended_values(column)
+            codes = _resized(column.codes, count, MISSING_INT)
+            for row_id, movie in zip(ids.tolist(), edited):
+                value = None if movie is None else get(movie)
+                codes[row_id] = MISSING_INT if value is None else code(value)
+            columns[name] = DictionaryColumn(codes, values)
+        for name, get in MULTI_DICTIONARY_COLUMNS.items():
+            column = self._columns[name]
+            values, code = _extended_values(column)
+            counts = np.diff(np.asarray(column.offsets, dtype=np.int64))
+            entry_rows = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+            kept = ~np.isin(entry_rows, ids)
+            added = [
+                (row_id, code(x))
+                for row_id, movie in zip(ids.tolist(), edited)
+                if movie is not None
+                for x in get(movie)
+            ]
+            rows = np.concatenate((entry_rows[kept], np.array([x for x, _ in added], dtype=np.int64)))
+            codes = np.concatenate((np.asarray(column.codes)[kept], np.array([x for _, x in added], dtype=np.int32)))
+            # a stable sort keeps the values of every row in their order
+            order = np.argsort(rows, kind="stable")
+            offsets = np.zeros(count + 1, dtype=np.int64)
+            np.cumsum(np.bincount(rows, minlength=count), out=offsets[1:])
+            columns[name] = MultiDictionaryColumn(offsets, codes[order].astype(np.int32), values)
+        return MovieTable(columns)
+
+    def range_mask(self, name, low=None, high=None):
+        """rows where low <= value <= high, either bound may be None, missing values never match"""
+        column = self._columns[name]
+        mask = self.valid_mask(name)
+        if np.issubdtype(column.dtype, np.floating):
+            # compare at the column's precision so e.g. rating 8.1 matches a float32 8.1
+            low = None if low is None else column.dtype.type(low)
+            high = None if high is None else column.dtype.type(high)
+        if low is not None:
+            mask &= column >= low
+        if high is not None:
+            mask &= column <= high
+        return mask
+
+    @staticmethod
+    def ids(mask):
+        """posting list of the rows set in a boolean mask"""
+        return PostingList(memoryview(np.flatnonzero(mask).astype(np.uint32)))
+
+    def range_postings(self, name, low=None, high=None):
+        return self.ids(self.range_mask(name, low, high))
+
+    def sort_keys(self, name):
+        """the values of a numeric column with missing values below every other value"""
+        column = self._columns[name]
+        missing = -np.inf if np.issubdtype(column.dtype, np.floating) else MISSING_INT
+        return np.where(self.valid_mask(name), column, missing)
+
+    def sort_order(self, name, reverse=False):
+        """(order, rank) uint32 arrays for a numeric column, missing values sort first, or last when
+        reverse is set, equal values are in ascending row order either way"""
+        keys = self.sort_keys(name)
+        if reverse:
+            # a stable sort of the reversed keys, reversed again, is descending with ties by ascending row
+            order = (len(keys) - 1 - np.argsort(keys[::-1], kind="stable"))[::-1].astype(np.uint32)
+        else:
+            order = np.argsort(keys, kind="stable").astype(np.uint32)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order), dtype=np.uint32)
+        return order, rank
+
+    def summary(self, name, ids=None):
+        """count, min, max and mean of a numeric column over ids (default every row), ignoring missing values"""
+        column = self._columns[name]
+        valid = self.valid_mask(name)
+        if ids is not None:
+            if isinstance(ids, PostingList):
+                ids = ids.ids
+            selected = np.asarray(ids, dtype=np.int64)
+            column = column[selected]
+            valid = valid[selected]
+        values = column[valid].astype(np.float64)
+        if not len(values):
+            return {"count": 0, "min": None, "max": None, "mean": None}
+        return {
+            "count": int(len(values)),
+            "min": values.min().item(),
+            "max": values.max().item(),
+            "mean": values.mean().item(),
+        }
+
+
+def _resized(column, count, missing):
+    """a writable copy of column with count items, added items hold missing"""
+    rv = np.full(count, missing, dtype=np.asarray(column).dtype)
+    shared = min(count, len(column))
+    rv[:shared] = column[:shared]
+    return rv
+
+
+def _extended_values(column):
+    """(values, code) where code(value) is the code of value in values, appending it when no row holds it yet"""
+    values = list(column.values)
+    lookup = {}
+
+    def code(value):
+        rv = column.code(value)
+        if rv is None:
+            rv = lookup.get(value)
+            if rv is None:
+                rv = lookup[value] = len(values)
+                values.append(value)
+        return rv
+
+    return values, code
@@ -0,0 +1,137 @@
+import heapq
+from array import array
+from bisect import bisect_left
+
+# a pair of lists whose lengths differ by more than this factor is intersected
+# by binary searching the longer list instead of walking both
+GALLOP_RATIO = 8
+
+
+class PostingList:
+    """sorted array of unique movie ids
+
+    ids are stored as unsigned ints in an array('I') so a posting list costs
+    4 bytes per entry instead of a reference to a whole row dict"""
+
+    def __init__(self, ids=()):
+        if isinstance(ids, array) and ids.typecode == "I":
+            self._ids = ids
+        elif isinstance(ids, memoryview) and ids.format == "I":
+            # read-only view into a memory mapped snapshot, copied on the first append
+            self._ids = ids
+        else:
+            self._ids = array("I", ids)
+
+    @classmethod
+    def from_unsorted(cls, ids):
+        return cls(sorted(set(ids)))
+
+    @property
+    def ids(self):
+        return self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __getitem__(self, item):
+        return self._ids[item]
+
+    def __contains__(self, movie_id):
+        i = bisect_left(self._ids, movie_id)
+        return i < len(self._ids) and self._ids[i] == movie_id
+
+    def __eq__(self, other):
+        if not isinstance(other, PostingList):
+            return False
+        return self._ids == other._ids
+
+    def __repr__(self):
+        return f"<PostingList {self._ids.tolist()}>"
+
+    def append(self, movie_id):
+        """adds movie_id to the end of the list, ids must be appended in increasing order
+        NOTE: appending the current last id again is a no-op"""
+        if not isinstance(self._ids, array):
+            self._ids = array("I", self._ids)
+        if self._ids and self._ids[-1] >= movie_id:
+            if self._ids[-1] == movie_id:
+                return
+            raise ValueError("posting list ids must be appended in increasing order")
+        self._ids.append(movie_id)
+
+    def union(self, *others):
+        return union([self, *others])
+
+    def intersection(self, *others):
+        return intersection([self, *others])
+
+    def difference(self, other):
+        return difference(self, other)
+
+
+def union(posting_lists):
+    posting_lists = [x for x in posting_lists if len(x)]
+    if not posting_lists:
+        return PostingList()
+    if len(posting_lists) == 1:
+        return posting_lists[0]
+    rv = array("I")
+    last = -1
+    for movie_id in heapq.merge(*posting_lists):
+        if movie_id != last:
+            rv.append(movie_id)
+            last = movie_id
+    return PostingList(rv)
+
+
+def _intersect_pair(small, large):
+    rv = array("I")
+    if len(large) > GALLOP_RATIO * len(small):
+        lo = 0
+        for movie_id in small:
+            lo = bisect_left(large, movie_id, lo)
+            if lo == len(large):
+                break
+            if large[lo] == movie_id:
+                rv.append(movie_id)
+        return rv
+    i = j = 0
+    while i < len(small) and j < len(large):
+        if small[i] < large[j]:
+            i += 1
+        elif small[i] > large[j]:
+            j += 1
+        else:
+            rv.append(small[i])
+            i += 1
+            j += 1
+    return rv
+
+
+def intersection(posting_lists):
+    """intersects posting lists starting from the shortest so the work is bounded by the most selective list"""
+    posting_lists = sorted(posting_lists, key=len)
+    if not posting_lists:
+        return PostingList()
+    rv = posting_lists[0].ids
+    for other in posting_lists[1:]:
+        if not rv:
+            break
+        rv = _intersect_pair(rv, other.ids)
+    return PostingList(rv)
+
+
+def difference(posting_list, other):
+    """ids in posting_list that are not in other"""
+    if not len(other) or not len(posting_list):
+        return posting_list
+    rv = array("I")
+    lo = 0
+    for movie_id in posting_list:
+        lo = bisect_left(other.ids, movie_id, lo)
+        if lo == len(other) or other.ids[lo] != movie_id:
+            rv.append(movie_id)
+    return PostingList(rv)
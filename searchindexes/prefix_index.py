@@ -0,0 +1,114 @@
+from bisect import bisect_left
+from searchindexes.posting_list import PostingList, union
+
+# sorts after every character a key can contain, so prefix + _KEY_END bounds all keys starting with prefix
+_KEY_END = "\U0010ffff"
+# unions for prefixes up to this length are kept, these are the broadest and most expensive to merge
+CACHED_PREFIX_LENGTH = 2
+
+
+class PrefixIndex:
+    """maps string keys to posting lists and answers prefix queries
+
+    keys are kept in a sorted array, so all keys under a prefix form one contiguous
+    slice found with two binary searches: O(len(prefix) * log(keys) + output)
+    with no recursion or per-character string building"""
+
+    def __init__(self):
+        # keys added since the sorted arrays were last built
+        self._pending = {}
+        self._keys = []
+        self._postings = []
+        self._prefix_cache = {}
+
+    @classmethod
+    def from_sorted(cls, keys, postings):
+        """wraps already sorted keys and their aligned posting lists, both only need indexing and len"""
+        index = cls()
+        index._pending = None
+        index._keys = keys
+        index._postings = postings
+        return index
+
+    def add(self, key: str, movie_id: int):
+        """adds movie_id under key, ids for a key must be added in increasing order"""
+        if self._pending is None:
+            self._pending = {self._keys[i]: self._postings[i] for i in range(len(self._keys))}
+        postings = self._pending.get(key)
+        if postings is None:
+            postings = PostingList()
+            self._pending[key] = postings
+        postings.append(movie_id)
+        self._prefix_cache.clear()
+
+    def _freeze(self):
+        if self._pending is not None:
+            self._keys = sorted(self._pending)
+            self._postings = [self._pending[x] for x in self._keys]
+            self._pending = None
+
+    @property
+    def keys(self):
+        """all keys in sorted order"""
+        self._freeze()
+        return self._keys
+
+    @property
+    def postings(self):
+        """posting lists aligned with keys"""
+        self._freeze()
+        return self._postings
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        keys = self.keys
+        return (keys[i] for i in range(len(keys)))
+
+    def position(self, key):
+        """position of key in keys, None when it is not indexed"""
+        keys = self.keys
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return i
+        return None
+
+    def __contains__(self, key):
+        return self.position(key) is not None
+
+    def __getitem__(self, key) -> PostingList:
+        i = self.position(key)
+        if i is None:
+            raise KeyError(key)
+        return self._postings[i]
+
+    def get(self, key, default=None):
+        i = self.position(key)
+        return default if i is None else self._postings[i]
+
+    def prefix_range(self, prefix: str):
+        """(start, stop) positions in keys of the keys starting with prefix"""
+        keys = self.keys
+        start = bisect_left(keys, prefix)
+        stop = bisect_left(keys, prefix + _KEY_END, start)
+        return start, stop
+
+    def prefix_keys(self, prefix: str):
+        start, stop = self.prefix_range(prefix)
+        return self.keys[start:stop]
+
+    def prefix_postings(self, prefix: str) -> PostingList:
+        """union of the posting lists of every key starting with prefix"""
+        if len(prefix) <= CACHED_PREFIX_LENGTH:
+            postings = self._prefix_cache.get(prefix)
+            if postings is None:
+                postings = self._union_range(prefix)
+                self._prefix_cache[prefix] = postings
+            return postings
+        return self._union_range(prefix)
+
+    def _union_range(self, prefix):
+        start, stop = self.prefix_range(prefix)
+        postings = self.postings
+        return union(postings[i] for i in range(start, stop))
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """least recently used cache of query results with an optional time to live
+
+    entries are bounded both in number and in the total size reported for them, and the whole
+    cache is dropped when the index it was filled from is replaced
+    NOTE: safe to share between request threads, every operation holds one lock"""
+
+    def __init__(self, max_entries=1024, max_size=4_000_000, ttl=None):
+        if max_entries < 0 or max_size < 0:
+            raise ValueError("cache bounds must not be negative")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self._max_entries = max_entries
+        self._max_size = max_size
+        self._ttl = ttl
+        # key -> (value, size, expiry time or None), least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+        self._source = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_source(self, source):
+        if source is not self._source:
+            self._entries.clear()
+            self._size = 0
+            self._source = source
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def get(self, key, source=None):
+        """the value stored for key from the same source, None on a miss"""
+        with self._lock:
+            self._check_source(source)
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key, value, source=None, size=0):
+        """stores value for key, evicting the least recently used entries to stay within bounds"""
+        if not self.enabled or size > self._max_size:
+            return
+        expiry = None if self._ttl is None else time.monotonic() + self._ttl
+        with self._lock:
+            self._check_source(source)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expiry)
+            self._size += size
+            while len(self._entries) > self._max_entries or self._size > self._max_size:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "size": self._size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
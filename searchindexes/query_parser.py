@@ -0,0 +1,114 @@
+import re
+from searchindexes.posting_list import intersection, union, difference
+
+# optional negation, optional field name, then a quoted phrase or a bare word
+_TOKEN_RE = re.compile(r'(-)?(?:([a-z]+):)?(?:"([^"]*)"?|(\S+))')
+_NUMBER = r"\d+(?:\.\d+)?"
+_NUMBER_RE = re.compile(rf"^{_NUMBER}$")
+_RANGE_RE = re.compile(rf"^({_NUMBER})?\.\.({_NUMBER})?$")
+
+
+class QueryTerm:
+    def __init__(self, value: str, field=None, negated=False, phrase=False):
+        self._value = value
+        self._field = field
+        self._negated = negated
+        # quoted terms are never merged with neighbouring words
+        self._phrase = phrase
+
+    @property
+    def value(self) -> str:
+        return self._value
+
+    @property
+    def field(self):
+        return self._field
+
+    @property
+    def negated(self) -> bool:
+        return self._negated
+
+    @property
+    def phrase(self) -> bool:
+        return self._phrase
+
+    @property
+    def range(self):
+        """(low, high) for terms written as low..high, either bound may be None; None for other terms"""
+        match = _RANGE_RE.match(self._value)
+        if match is None or self._value == "..":
+            return None
+        low, high = match.groups()
+        return _parse_number(low), _parse_number(high)
+
+    @property
+    def number(self):
+        """the value as an int or float, None if it is not a number"""
+        if _NUMBER_RE.match(self._value) is None:
+            return None
+        return _parse_number(self._value)
+
+    def __repr__(self):
+        return f"<QueryTerm {'-' if self._negated else ''}{self._field}:{self._value!r}>"
+
+    def __eq__(self, other):
+        if not isinstance(other, QueryTerm):
+            return False
+        return (self._value, self._field, self._negated) == (other._value, other._field, other._negated)
+
+
+def _parse_number(value):
+    if value is None:
+        return None
+    return float(value) if "." in value else int(value)
+
+
+def parse_query(query_string: str, fields):
+    """splits a query such as 'actor:"chris pratt" genre:sci-fi year:2010..2016 -genre:horror' into terms
+    NOTE: a query with no field, negation or quote syntax is kept as a single term so plain searches
+    behave exactly like a prefix search on the whole string"""
+    matches = [m for m in _TOKEN_RE.finditer(query_string) if m.group(0)]
+    has_syntax = any(m.group(1) or m.group(3) is not None or m.group(2) in fields for m in matches)
+    if not has_syntax:
+        return [QueryTerm(query_string)]
+    terms = []
+    for match in matches:
+        negated, field, quoted, bare = match.groups()
+        if field is not None and field not in fields:
+            # unknown fields are treated as part of the text, e.g. "re:zero"
+            bare = field + ":" + (bare if quoted is None else quoted)
+            field = None
+            quoted = None
+        term = QueryTerm(quoted if quoted is not None else bare, field, bool(negated), quoted is not None)
+        previous = terms[-1] if terms else None
+        if (
+            previous is not None
+            and term.field is None
+            and previous.field is None
+            and not (term.negated or previous.negated or term.phrase or previous.phrase)
+        ):
+            # adjacent bare words form one phrase so "chris pratt genre:action" still finds chris pratt
+            terms[-1] = QueryTerm(previous.value + " " + term.value)
+        else:
+            terms.append(term)
+    return terms
+
+
+def evaluate_query(terms, lookup, all_ids):
+    """intersects the postings of every positive term, most selective first, then removes negated terms
+
+    lookup maps a QueryTerm to a PostingList, all_ids is used when the query only excludes"""
+    positive = []
+    for term in terms:
+        if term.negated:
+            continue
+        postings = lookup(term)
+        if not len(postings):
+            # nothing can survive the intersection, skip the remaining lookups
+            return postings
+        positive.append(postings)
+    results = intersection(positive) if positive else all_ids
+    negative = [lookup(term) for term in terms if term.negated]
+    if negative and len(results):
+        results = difference(results, union(negative))
+    return results
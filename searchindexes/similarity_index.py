@@ -0,0 +1,170 @@
+import numpy as np
+
+from searchindexes.array_utils import ranges
+
+# weight of each kind of feature before a movie's vector is normalised
+GENRE_WEIGHT = 1.0
+ACTOR_WEIGHT = 1.0
+DIRECTOR_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.5
+# description words in more than this fraction of movies are left out, they say little about a
+# movie and their postings would be the longest ones read by every request
+MAX_TERM_FRACTION = 0.05
+# features held by more movies than this, e.g. genres in a large catalogue, are not read to find
+# neighbours, they only add to the similarity of movies found through the query's other features
+MAX_SCANNED_POSTINGS = 10_000
+
+
+def _idf(document_frequencies, count):
+    return np.log(1 + count / np.maximum(document_frequencies, 1))
+
+
+def _column_features(column):
+    """(movie ids, codes) of every value of a dictionary column, missing values left out"""
+    if hasattr(column, "offsets"):
+        movies = np.repeat(np.arange(len(column), dtype=np.int64), column.counts())
+        return movies, np.asarray(column.codes, dtype=np.int64)
+    codes = np.asarray(column.codes, dtype=np.int64)
+    movies = np.flatnonzero(codes >= 0)
+    return movies, codes[movies]
+
+
+class SimilarityIndex:
+    """movies as L2 normalised sparse feature vectors, so the cosine similarity of two movies is
+    the dot product of their vectors
+
+    the vectors are stored by movie, the features of movie i are features[movie_offsets[i]:
+    movie_offsets[i + 1]], and by feature, the movies holding feature j are movies[feature_offsets[j]:
+    feature_offsets[j + 1]]. the neighbours of a movie are scored by reading only the postings of
+    its own features, one vectorised accumulation per request whatever the catalogue size"""
+
+    def __init__(self, movie_offsets, features, values, feature_offsets, movies, movie_values):
+        self._movie_offsets = movie_offsets
+        self._features = features
+        self._values = values
+        self._feature_offsets = feature_offsets
+        self._movies = movies
+        self._movie_values = movie_values
+
+    @classmethod
+    def from_features(cls, count, movies, features, values, feature_count):
+        """builds the index from (movie id, feature id, weight) triplets, at most one per pair"""
+        movies = np.asarray(movies, dtype=np.int64)
+        features = np.asarray(features, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float32)
+        norms = np.sqrt(np.bincount(movies, weights=values.astype(np.float64) ** 2, minlength=count))
+        values = (values / norms[movies]).astype(np.float32)
+        by_movie = np.lexsort((features, movies))
+        by_feature = np.lexsort((movies, features))
+        movie_offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(movies, minlength=count), out=movie_offsets[1:])
+        feature_offsets = np.zeros(feature_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(features, minlength=feature_count), out=feature_offsets[1:])
+        return cls(
+            movie_offsets,
+            features[by_movie].astype(np.uint32),
+            values[by_movie],
+            feature_offsets,
+            movies[by_feature].astype(np.uint32),
+            values[by_feature],
+        )
+
+    @classmethod
+    def from_table(cls, table, text_index=None, documents=None):
+        """vectors of genre, actor and director one-hots weighted by their idf, plus the tf-idf of the
+        description words when text_index (a TextIndex over descriptions) is given, documents is the
+        number of rows holding a movie, all of them by default"""
+        count = len(table)
+        documents = count if documents is None else documents
+        blocks = []
+        offset = 0
+        for name, weight in (("genres", GENRE_WEIGHT), ("actors", ACTOR_WEIGHT), ("director", DIRECTOR_WEIGHT)):
+            movies, codes = _column_features(table[name])
+            size = len(table[name].values)
+            idf = _idf(np.bincount(codes, minlength=size), documents)
+            blocks.append((movies, codes + offset, weight * idf[codes]))
+            offset += size
+        if text_index is not None:
+            term_offsets = np.asarray(text_index.offsets, dtype=np.int64)
+            frequencies = np.diff(term_offsets)
+            kept = np.flatnonzero(frequencies <= max(1, MAX_TERM_FRACTION * documents))
+            entries = ranges(term_offsets[kept], term_offsets[kept + 1])
+            terms = np.repeat(kept, frequencies[kept])
+            movies = np.asarray(text_index.ids, dtype=np.int64)[entries]
+            tf = np.asarray(text_index.frequencies, dtype=np.float64)[entries]
+            weights = DESCRIPTION_WEIGHT * (1 + np.log(tf)) * _idf(frequencies, documents)[terms]
+            blocks.append((movies, terms + offset, weights))
+            offset += len(frequencies)
+        movies, features, values = (np.concatenate(x) for x in zip(*blocks))
+        return cls.from_features(count, movies, features, values, offset)
+
+    @property
+    def movie_offsets(self):
+        return self._movie_offsets
+
+    @property
+    def features(self):
+        return self._features
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def feature_offsets(self):
+        return self._feature_offsets
+
+    @property
+    def movies(self):
+        return self._movies
+
+    @property
+    def movie_values(self):
+        return self._movie_values
+
+    def __len__(self):
+        return len(self._movie_offsets) - 1
+
+    def vector(self, movie_id):
+        """(feature ids, weights) of a movie, sorted by feature id"""
+        start, stop = self._movie_offsets[movie_id], self._movie_offsets[movie_id + 1]
+        return self._features[start:stop], self._values[start:stop]
+
+    def scores(self, movie_id):
+        """(ids, similarities) of every other movie sharing a feature with movie_id, ids ascending
+        NOTE: when movie_id also has features other than broad ones (see MAX_SCANNED_POSTINGS), movies sharing
+        only broad features with it are left out"""
+        features, weights = self.vector(movie_id)
+        features = features.astype(np.int64)
+        starts, stops = self._feature_offsets[features], self._feature_offsets[features + 1]
+        broad = stops - starts > MAX_SCANNED_POSTINGS
+        if broad.all():
+            broad[:] = False
+        narrow = ~broad
+        entries = ranges(starts[narrow], stops[narrow])
+        products = self._movie_values[entries] * np.repeat(weights[narrow], (stops - starts)[narrow])
+        # accumulate over the touched movies only, so a request costs the postings it reads and not
+        # the catalogue size
+        ids, touched = np.unique(self._movies[entries], return_inverse=True)
+        accumulator = np.bincount(touched, weights=products, minlength=len(ids))
+        kept = (accumulator > 0) & (ids != movie_id)
+        ids, accumulator = ids[kept].astype(np.int64), accumulator[kept]
+        if broad.any():
+            # the broad features of the candidates, read from their own vectors
+            row_starts, row_stops = self._movie_offsets[ids], self._movie_offsets[ids + 1]
+            rows = ranges(row_starts, row_stops)
+            owners = np.repeat(np.arange(len(ids)), row_stops - row_starts)
+            broad_features, broad_weights = features[broad], weights[broad]
+            positions = np.minimum(np.searchsorted(broad_features, self._features[rows]), len(broad_features) - 1)
+            shared = broad_features[positions] == self._features[rows]
+            np.add.at(accumulator, owners[shared], self._values[rows][shared] * broad_weights[positions[shared]])
+        return ids, accumulator
+
+    def similar(self, movie_id, k=10):
+        """the k most similar (movie id, similarity) pairs, best first, ties by id"""
+        ids, scores = self.scores(movie_id)
+        if len(ids) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[best], scores[best]
+        order = np.lexsort((ids, -scores))
+        return [(int(ids[i]), float(scores[i])) for i in order]
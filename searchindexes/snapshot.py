@@ -0,0 +1,470 @@
+"""versioned binary snapshot of a MovieIndex
+
+the snapshot is memory mapped at startup and every array is used in place, so a worker
+starts without parsing the csv file and workers share the pages through the OS page cache
+
+layout: preamble (magic, version, header length), a json header describing the source
+csv file and the offset of every section, then the 8 byte aligned sections"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import numpy as np
+
+from datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+from searchindexes.costar_graph import CoStarGraph
+from searchindexes.fuzzy_index import FuzzyIndex
+from searchindexes.movie_index import (
+    MovieIndex,
+    SORTBY_FIELDS,
+    SEARCHBY_FIELDS,
+    TEXT_SEARCH_FIELDS,
+    FUZZY_FIELDS,
+    SUBSTRING_FIELDS,
+    SUGGEST_FIELDS,
+    INDEX_COLUMNS,
+)
+from searchindexes.movie_table import (
+    MovieTable,
+    DictionaryColumn,
+    MultiDictionaryColumn,
+    NUMERIC_COLUMNS,
+    DICTIONARY_COLUMNS,
+    MULTI_DICTIONARY_COLUMNS,
+)
+from searchindexes.posting_list import PostingList
+from searchindexes.prefix_index import PrefixIndex
+from searchindexes.similarity_index import SimilarityIndex
+from searchindexes.sort_order import SortOrder
+from searchindexes.substring_index import SubstringIndex
+from searchindexes.suggest_index import SuggestIndex
+from searchindexes.text_index import TextIndex
+
+SNAPSHOT_MAGIC = b"MMVSNAP\x00"
+SNAPSHOT_VERSION = 9
+SNAPSHOT_SUFFIX = ".snapshot"
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGNMENT = 8
+
+
+def default_snapshot_path(source_path):
+    return source_path + SNAPSHOT_SUFFIX
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_stamp(source_path):
+    stat = os.stat(source_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(source_path)}
+
+
+def is_fresh(stamp, source_path):
+    """checks a snapshot's source stamp against the csv file
+    NOTE: the file is only hashed when its mtime changed, so touching it does not force a rebuild"""
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        return False
+    if stat.st_size != stamp["size"]:
+        return False
+    if stat.st_mtime_ns == stamp["mtime_ns"]:
+        return True
+    return file_sha256(source_path) == stamp["sha256"]
+
+
+class _PackedBytes:
+    """read-only sequence of byte strings stored back to back, item i is data[offsets[i]:offsets[i + 1]]"""
+
+    def __init__(self, offsets, data):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _item(self, i):
+        return bytes(self._data[self._offsets[i] : self._offsets[i + 1]])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[x] for x in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("packed string index out of range")
+        return self._item(i)
+
+
+class _PackedStrings(_PackedBytes):
+    """read-only sequence of utf-8 strings stored back to back, optionally decoded further by decode"""
+
+    def __init__(self, offsets, data, decode=None):
+        super().__init__(offsets, data)
+        self._decode = decode
+
+    def _item(self, i):
+        value = str(self._data[self._offsets[i] : self._offsets[i + 1]], "utf-8")
+        return value if self._decode is None else self._decode(value)
+
+
+class _PackedPostings:
+    """read-only sequence of posting lists stored back to back in one id array"""
+
+    def __init__(self, offsets, ids):
+        self._offsets = offsets
+        self._ids = ids
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("packed postings index out of range")
+        return PostingList(self._ids[self._offsets[i] : self._offsets[i + 1]])
+
+
+def _pack_strings(strings):
+    return _pack_bytes(value.encode("utf-8") for value in strings)
+
+
+def _pack_bytes(values):
+    offsets = array("Q", [0])
+    data = bytearray()
+    for value in values:
+        data += value
+        offsets.append(len(data))
+    return offsets, data
+
+
+def _pack_postings(postings):
+    offsets = array("Q", [0])
+    ids = array("I")
+    for posting_list in postings:
+        ids.extend(posting_list.ids)
+        offsets.append(len(ids))
+    return offsets, ids
+
+
+def write_snapshot(snapshot_path, movie_index, stamp):
+    """writes movie_index to snapshot_path, stamp is the source_stamp of the csv file it was built from
+    NOTE: the file is written under a temporary name and renamed so readers never see a partial snapshot"""
+    sections = []
+    row_json = movie_index.row_json
+    offsets, data = _pack_bytes(row_json[i] for i in range(len(row_json)))
+    sections += [("rows.offsets", offsets), ("rows.data", data), ("all_ids", movie_index.all_ids.ids)]
+    for field in SEARCHBY_FIELDS:
+        index = movie_index.field_indexes[field]
+        key_offsets, key_data = _pack_strings(index.keys)
+        postings_offsets, postings_ids = _pack_postings(index.postings)
+        sections += [
+            (f"index.{field}.keys.offsets", key_offsets),
+            (f"index.{field}.keys.data", key_data),
+            (f"index.{field}.postings.offsets", postings_offsets),
+            (f"index.{field}.postings.ids", postings_ids),
+        ]
+    for field in TEXT_SEARCH_FIELDS:
+        index = movie_index.text_indexes[field]
+        term_offsets, term_data = _pack_strings(index.terms)
+        sections += [
+            (f"text.{field}.terms.offsets", term_offsets),
+            (f"text.{field}.terms.data", term_data),
+            (f"text.{field}.offsets", index.offsets),
+            (f"text.{field}.ids", index.ids),
+            (f"text.{field}.frequencies", index.frequencies),
+            (f"text.{field}.lengths", index.lengths),
+        ]
+    for field in FUZZY_FIELDS:
+        index = movie_index.fuzzy_indexes[field]
+        word_offsets, word_data = _pack_strings(index.words)
+        deletion_offsets, deletion_data = _pack_strings(index.deletions)
+        sections += [
+            (f"fuzzy.{field}.words.offsets", word_offsets),
+            (f"fuzzy.{field}.words.data", word_data),
+            (f"fuzzy.{field}.key_offsets", index.key_offsets),
+            (f"fuzzy.{field}.key_positions", index.key_positions),
+            (f"fuzzy.{field}.deletions.offsets", deletion_offsets),
+            (f"fuzzy.{field}.deletions.data", deletion_data),
+            (f"fuzzy.{field}.deletion_offsets", index.deletion_offsets),
+            (f"fuzzy.{field}.deletion_words", index.deletion_words),
+        ]
+    for field in SUBSTRING_FIELDS:
+        index = movie_index.substring_indexes[field]
+        sections += [
+            (f"substring.{field}.text", index.text),
+            (f"substring.{field}.starts", index.starts),
+            (f"substring.{field}.suffixes", index.suffixes),
+        ]
+    for field in SUGGEST_FIELDS:
+        index, scores, spellings = movie_index.suggest_indexes[field]
+        prefix_offsets, prefix_data = _pack_strings(index.prefixes)
+        spelling_offsets, spelling_data = _pack_strings(spellings)
+        sections += [
+            (f"suggest.{field}.rank", index.rank),
+            (f"suggest.{field}.prefixes.offsets", prefix_offsets),
+            (f"suggest.{field}.prefixes.data", prefix_data),
+            (f"suggest.{field}.completions", index.completions),
+            (f"suggest.{field}.scores", scores),
+            (f"suggest.{field}.spellings.offsets", spelling_offsets),
+            (f"suggest.{field}.spellings.data", spelling_data),
+        ]
+    graph = movie_index.costar_graph
+    sections += [
+        ("costar.offsets", graph.offsets),
+        ("costar.neighbours", graph.neighbours),
+        ("costar.shared", graph.shared),
+    ]
+    similarity = movie_index.similarity_index
+    sections += [
+        ("similarity.movie_offsets", similarity.movie_offsets),
+        ("similarity.features", similarity.features),
+        ("similarity.values", similarity.values),
+        ("similarity.feature_offsets", similarity.feature_offsets),
+        ("similarity.movies", similarity.movies),
+        ("similarity.movie_values", similarity.movie_values),
+    ]
+    for key in SORTBY_FIELDS:
+        sort_order = movie_index.sort_orders[key]
+        sections += [
+            (f"sort.{key}.order", sort_order.order),
+            (f"sort.{key}.rank", sort_order.rank),
+            (f"sort.{key}.reverse_order", sort_order.reverse_order),
+            (f"sort.{key}.reverse_rank", sort_order.reverse_rank),
+        ]
+    for name, column in movie_index.table.columns.items():
+        if isinstance(column, DictionaryColumn):
+            value_offsets, value_data = _pack_strings(column.values)
+            sections += [
+                (f"table.{name}.codes", column.codes),
+                (f"table.{name}.values.offsets", value_offsets),
+                (f"table.{name}.values.data", value_data),
+            ]
+            if isinstance(column, MultiDictionaryColumn):
+                sections.append((f"table.{name}.offsets", column.offsets))
+        else:
+            sections.append((f"table.{name}", column))
+
+    layout = {}
+    offset = 0
+    for name, blob in sections:
+        blob = memoryview(blob)
+        # offsets are relative to the first aligned byte after the header
+        layout[name] = [offset, blob.nbytes, blob.format]
+        offset = _align(offset + blob.nbytes)
+    header = {
+        "source": stamp,
+        "byteorder": sys.byteorder,
+        "itemsizes": {"H": array("H").itemsize, "I": array("I").itemsize, "Q": array("Q").itemsize},
+        "sections": layout,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(_PREAMBLE.size + len(header_bytes))
+
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for name, blob in sections:
+                f.seek(data_start + layout[name][0])
+                f.write(blob)
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, snapshot_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_snapshot(snapshot_path, source_path=None):
+    """memory maps a snapshot, returns None when it is missing, unreadable or older than source_path"""
+    try:
+        with open(snapshot_path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, version, header_length = _PREAMBLE.unpack_from(buffer, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            return None
+        header = json.loads(buffer[_PREAMBLE.size : _PREAMBLE.size + header_length])
+    except (struct.error, ValueError):
+        return None
+    if header["byteorder"] != sys.byteorder:
+        return None
+    if header["itemsizes"] != {"H": array("H").itemsize, "I": array("I").itemsize, "Q": array("Q").itemsize}:
+        return None
+    if source_path is not None and not is_fresh(header["source"], source_path):
+        return None
+
+    view = memoryview(buffer)
+    data_start = _align(_PREAMBLE.size + header_length)
+
+    def section(name):
+        offset, nbytes, item_format = header["sections"][name]
+        return view[data_start + offset : data_start + offset + nbytes].cast(item_format)
+
+    rows = _PackedStrings(section("rows.offsets"), section("rows.data"), json.loads)
+    row_json = _PackedBytes(section("rows.offsets"), section("rows.data"))
+    field_indexes = {}
+    for field in SEARCHBY_FIELDS:
+        keys = _PackedStrings(section(f"index.{field}.keys.offsets"), section(f"index.{field}.keys.data"))
+        postings = _PackedPostings(section(f"index.{field}.postings.offsets"), section(f"index.{field}.postings.ids"))
+        field_indexes[field] = PrefixIndex.from_sorted(keys, postings)
+    text_indexes = {}
+    for field in TEXT_SEARCH_FIELDS:
+        terms = _PackedStrings(section(f"text.{field}.terms.offsets"), section(f"text.{field}.terms.data"))
+        text_indexes[field] = TextIndex(
+            terms,
+            section(f"text.{field}.offsets"),
+            section(f"text.{field}.ids"),
+            section(f"text.{field}.frequencies"),
+            section(f"text.{field}.lengths"),
+        )
+    fuzzy_indexes = {}
+    for field in FUZZY_FIELDS:
+        fuzzy_indexes[field] = FuzzyIndex(
+            _PackedStrings(section(f"fuzzy.{field}.words.offsets"), section(f"fuzzy.{field}.words.data")),
+            section(f"fuzzy.{field}.key_offsets"),
+            section(f"fuzzy.{field}.key_positions"),
+            _PackedStrings(section(f"fuzzy.{field}.deletions.offsets"), section(f"fuzzy.{field}.deletions.data")),
+            section(f"fuzzy.{field}.deletion_offsets"),
+            section(f"fuzzy.{field}.deletion_words"),
+        )
+    sort_orders = {
+        key: SortOrder.from_arrays(
+            key,
+            section(f"sort.{key}.order"),
+            section(f"sort.{key}.rank"),
+            section(f"sort.{key}.reverse_order"),
+            section(f"sort.{key}.reverse_rank"),
+        )
+        for key in SORTBY_FIELDS
+    }
+
+    def numpy_section(name):
+        offset, nbytes, item_format = header["sections"][name]
+        dtype = np.dtype(item_format)
+        return np.frombuffer(buffer, dtype=dtype, count=nbytes // dtype.itemsize, offset=data_start + offset)
+
+    columns = {name: numpy_section(f"table.{name}") for name in NUMERIC_COLUMNS}
+    for name in list(DICTIONARY_COLUMNS) + list(MULTI_DICTIONARY_COLUMNS):
+        codes = numpy_section(f"table.{name}.codes")
+        values = _PackedStrings(section(f"table.{name}.values.offsets"), section(f"table.{name}.values.data"))
+        if name in MULTI_DICTIONARY_COLUMNS:
+            columns[name] = MultiDictionaryColumn(numpy_section(f"table.{name}.offsets"), codes, values)
+        else:
+            columns[name] = DictionaryColumn(codes, values)
+    table = MovieTable(columns)
+    # graph ids are codes of the actors column, so the graph shares its names
+    costar_graph = CoStarGraph(
+        columns["actors"].values,
+        numpy_section("costar.offsets"),
+        numpy_section("costar.neighbours"),
+        numpy_section("costar.shared"),
+    )
+    substring_indexes = {
+        field: SubstringIndex(
+            section(f"substring.{field}.text"),
+            numpy_section(f"substring.{field}.starts"),
+            numpy_section(f"substring.{field}.suffixes"),
+        )
+        for field in SUBSTRING_FIELDS
+    }
+    suggest_indexes = {}
+    for field in SUGGEST_FIELDS:
+        index = SuggestIndex(
+            field_indexes[field].keys,
+            numpy_section(f"suggest.{field}.rank"),
+            _PackedStrings(section(f"suggest.{field}.prefixes.offsets"), section(f"suggest.{field}.prefixes.data")),
+            section(f"suggest.{field}.completions"),
+        )
+        spellings = _PackedStrings(
+            section(f"suggest.{field}.spellings.offsets"), section(f"suggest.{field}.spellings.data")
+        )
+        suggest_indexes[field] = (index, numpy_section(f"suggest.{field}.scores"), spellings)
+    similarity_index = SimilarityIndex(
+        numpy_section("similarity.movie_offsets"),
+        numpy_section("similarity.features"),
+        numpy_section("similarity.values"),
+        numpy_section("similarity.feature_offsets"),
+        numpy_section("similarity.movies"),
+        numpy_section("similarity.movie_values"),
+    )
+    all_ids = PostingList(section("all_ids"))
+    return MovieIndex(
+        rows,
+        field_indexes,
+        sort_orders,
+        table,
+        all_ids,
+        buffer,
+        text_indexes,
+        row_json,
+        costar_graph,
+        fuzzy_indexes,
+        suggest_indexes,
+        substring_indexes,
+        similarity_index,
+    )
+
+
+def build_movie_index(source_path, workers=1):
+    """parses source_path and indexes it, workers > 1 (or None for one per cpu) parses chunks in parallel"""
+    reader = MovieFileCSVReader(source_path)
+    if workers == 1:
+        return MovieIndex.from_movies(reader.iter_movies(columns=INDEX_COLUMNS))
+    return MovieIndex.from_movies(movie for movies in reader.iter_chunks(workers, INDEX_COLUMNS) for movie in movies)
+
+
+def build_snapshot(source_path, snapshot_path=None, workers=1):
+    """parses source_path and writes its snapshot unconditionally"""
+    if snapshot_path is None:
+        snapshot_path = default_snapshot_path(source_path)
+    # stamp before reading so a concurrent edit of the csv file makes the snapshot stale, not wrong
+    stamp = source_stamp(source_path)
+    movie_index = build_movie_index(source_path, workers)
+    write_snapshot(snapshot_path, movie_index, stamp)
+    return movie_index
+
+
+def open_movie_index(source_path, snapshot_path=None, workers=1):
+    """loads the snapshot of source_path, rebuilding it first when it is missing or stale"""
+    if snapshot_path is None:
+        snapshot_path = default_snapshot_path(source_path)
+    movie_index = load_snapshot(snapshot_path, source_path)
+    if movie_index is not None:
+        return movie_index
+    try:
+        movie_index = build_snapshot(source_path, snapshot_path, workers)
+    except OSError:
+        # the snapshot location is not writable, serve the index built in memory
+        return build_movie_index(source_path, workers)
+    loaded = load_snapshot(snapshot_path, source_path)
+    return loaded if loaded is not None else movie_index
+
+
+def _align(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+if __name__ == "__main__":
+    # build step: python -m searchindexes.snapshot <csv file> [snapshot file] [--workers N]
+    parser = argparse.ArgumentParser(description="build the index snapshot of a movie csv file")
+    parser.add_argument("source_path")
+    parser.add_argument("snapshot_path", nargs="?")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes, defaults to one per cpu")
+    args = parser.parse_args()
+    built = build_snapshot(args.source_path, args.snapshot_path, args.workers)
+    print(f"wrote snapshot of {len(built)} movies to {args.snapshot_path or default_snapshot_path(args.source_path)}")
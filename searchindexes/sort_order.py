@@ -0,0 +1,240 @@
+import heapq
+from array import array
+
+import numpy as np
+
+from searchindexes.posting_list import PostingList
+
+
+class SortOrder:
+    """precomputed ordering of every row by a single field
+
+    order[r] is the row id at position r of the sorted catalogue and
+    rank[i] is the position of row id i, so paging a result set only needs
+    the rank array instead of comparing the field values again. the descending
+    ordering is kept the same way in reverse_order and reverse_rank, rows with
+    equal values are in ascending id order in both, like a stable sort"""
+
+    def __init__(self, rows, key):
+        self._key = key
+        # sorted is stable with reverse=True too, ties keep their ascending ids
+        self._order, self._rank = _order_and_rank(sorted(range(len(rows)), key=lambda i: rows[i][key]))
+        self._reverse_order, self._reverse_rank = _order_and_rank(
+            sorted(range(len(rows)), key=lambda i: rows[i][key], reverse=True)
+        )
+
+    @classmethod
+    def from_arrays(cls, key, order, rank, reverse_order, reverse_rank):
+        """wraps precomputed orders and ranks, e.g. read back from a snapshot"""
+        sort_order = cls.__new__(cls)
+        sort_order._key = key
+        sort_order._order = order
+        sort_order._rank = rank
+        sort_order._reverse_order = reverse_order
+        sort_order._reverse_rank = reverse_rank
+        return sort_order
+
+    def edited(self, changed, removed, value, count):
+        """the SortOrder of count rows after the rows in changed were edited or added and those in
+        removed were dropped, value(row id) is the sort value of a row after the edit
+        NOTE: the edited rows are placed with a binary search each, the others keep their order"""
+        changed = sorted(set(changed))
+        dropped = np.array(sorted(set(changed) | set(removed)), dtype=np.uint32)
+        arrays = []
+        for order, reverse in ((self._order, False), (self._reverse_order, True)):
+            order = np.asarray(order, dtype=np.uint32)
+            kept = order[~np.isin(order, dropped)]
+            placed = sorted(changed, key=lambda x: (value(x), x))
+            if reverse:
+                # descending values, equal values still in ascending row order
+                placed = sorted(placed, key=value, reverse=True)
+            at = [_insertion_point(kept, value, x, reverse) for x in placed]
+            order = np.insert(kept, at, np.array(placed, dtype=np.uint32))
+            rank = np.zeros(count, dtype=np.uint32)
+            rank[order] = np.arange(len(order), dtype=np.uint32)
+            arrays += [array("I", order.tobytes()), array("I", rank.tobytes())]
+        return SortOrder.from_arrays(self._key, *arrays)
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def order(self):
+        return self._order
+
+    @property
+    def rank(self):
+        return self._rank
+
+    @property
+    def reverse_order(self):
+        return self._reverse_order
+
+    @property
+    def reverse_rank(self):
+        return self._reverse_rank
+
+    def direction(self, reverse=False):
+        """(order, rank) of the descending ordering when reverse is set, else of the ascending one"""
+        if reverse:
+            return self._reverse_order, self._reverse_rank
+        return self._order, self._rank
+
+    def __len__(self):
+        return len(self._order)
+
+    def page(self, ids, start, stop, reverse=False):
+        """returns the row ids that would be at ids[start:stop] if ids were sorted by this order
+        NOTE: assumes ids contains no duplicates"""
+        if start >= stop or start >= len(ids):
+            return []
+        order, rank = self.direction(reverse)
+        if len(ids) == len(order):
+            # every row matched, the page is a slice of the precomputed order
+            return order[start:stop].tolist()
+        # only the first stop rows are needed, so select them with a bounded heap
+        return heapq.nsmallest(stop, ids, key=rank.__getitem__)[start:]
+
+    def page_after(self, ids, rank, count, reverse=False):
+        """returns the first count row ids of ids that sort after the row at position rank
+        of the ordering in that direction, see direction
+        NOTE: the cost depends on count and not on how far into the results rank is"""
+        if count <= 0:
+            return []
+        order, ranks = self.direction(reverse)
+        if len(ids) == len(order):
+            return order[rank + 1 : rank + 1 + count].tolist()
+        return heapq.nsmallest(count, (x for x in ids if ranks[x] > rank), key=ranks.__getitem__)
+
+    def ordered(self, ids, reverse=False, scores=None):
+        """ids wrapped as OrderedResults so successive pages can be taken from them"""
+        return OrderedResults(self, ids, reverse, scores)
+
+
+class OrderedResults:
+    """a result set in the order of a SortOrder, optionally ranked by a score first
+
+    a page is taken from the first rows of the ordering, which are selected with a partial sort
+    of the results and kept, so further pages within them are slices and a deeper page only
+    extends the selection. materialise() stores the full ordering"""
+
+    def __init__(self, sort_order, ids, reverse=False, scores=None):
+        self._sort_order = sort_order
+        self._ids = ids
+        self._reverse = reverse
+        # row id -> score, lower scores come first and reverse only applies within a score
+        self._scores = scores
+        # the first rows of the ordering selected so far, the full ordering once it covers every row
+        self._head = None
+        self._ordered = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def reverse(self):
+        return self._reverse
+
+    @property
+    def size(self):
+        """number of ids and scores stored for this result set alone, once its ordering is complete"""
+        ordered = 0 if self._is_precomputed() else len(self._ids)
+        return ordered + (0 if self._scores is None else len(self._scores))
+
+    def _is_precomputed(self):
+        # when every row matched without scores the precomputed order already is the full ordering
+        return self._scores is None and len(self._ids) == len(self._sort_order)
+
+    def _sort_key(self):
+        """function of a row id that increases along the ordered results"""
+        rank = self._sort_order.direction(self._reverse)[1]
+        scores = self._scores
+        if scores is None:
+            return rank.__getitem__
+        return lambda x: (scores[x], rank[x])
+
+    def _select(self, count):
+        """the first count row ids of the ordering, only the rows that can be among them are sorted"""
+        ids = np.asarray(self._ids.ids if isinstance(self._ids, PostingList) else self._ids, dtype=np.int64)
+        ranks = np.frombuffer(self._sort_order.direction(self._reverse)[1], dtype=np.uint32)[ids]
+        keys = ranks
+        if self._scores is not None:
+            scores = self._scores
+            keys = np.fromiter((scores[x] for x in ids.tolist()), dtype=np.float64, count=len(ids))
+        if count < len(ids):
+            # every row ahead of the count-th has a key no greater than it, ties are settled by rank below
+            kth = np.partition(keys, count - 1)[count - 1]
+            candidates = np.flatnonzero(keys <= kth)
+            ids, ranks, keys = ids[candidates], ranks[candidates], keys[candidates]
+        order = np.lexsort((ranks, keys))[:count]
+        return array("I", ids[order].astype(np.uint32).tobytes())
+
+    def materialise(self):
+        if self._ordered is None and not self._is_precomputed():
+            self._ordered = self._select(len(self._ids))
+        return self
+
+    def page(self, start, stop):
+        """row ids at positions start to stop of the ordered results"""
+        if self._ordered is not None:
+            return self._ordered[start:stop].tolist()
+        if start >= stop or start >= len(self._ids):
+            return []
+        if self._is_precomputed():
+            return self._sort_order.page(self._ids, start, stop, reverse=self._reverse)
+        stop = min(stop, len(self._ids))
+        head = self._head
+        if head is None or len(head) < stop:
+            head = self._select(stop)
+            if len(head) == len(self._ids):
+                self._ordered = head
+            self._head = head
+        return head[start:stop].tolist()
+
+    def page_after(self, movie_id, count):
+        """up to count row ids following the row movie_id in the ordered results"""
+        if self._scores is not None and movie_id not in self._scores:
+            raise ValueError("row is not part of the results")
+        if self._ordered is None and self._scores is None:
+            rank = self._sort_order.direction(self._reverse)[1][movie_id]
+            return self._sort_order.page_after(self._ids, rank, count, reverse=self._reverse)
+        key = self._sort_key()
+        after = key(movie_id)
+        if self._ordered is None:
+            return heapq.nsmallest(count, (x for x in self._ids if key(x) > after), key=key)
+        # binary search for the first stored row past movie_id, the keys increase along the ordering
+        low, high = 0, len(self._ordered)
+        while low < high:
+            mid = (low + high) // 2
+            if key(self._ordered[mid]) > after:
+                high = mid
+            else:
+                low = mid + 1
+        return self._ordered[low : low + count].tolist()
+
+
+def _order_and_rank(order):
+    rank = array("I", [0]) * len(order)
+    for position, row_id in enumerate(order):
+        rank[row_id] = position
+    return array("I", order), rank
+
+
+def _insertion_point(order, value, row_id, reverse):
+    """position in order, a sorted array of row ids, where row_id goes"""
+    target = value(row_id)
+    low, high = 0, len(order)
+    while low < high:
+        mid = (low + high) // 2
+        other_id = int(order[mid])
+        other = value(other_id)
+        if other == target:
+            before = other_id < row_id
+        else:
+            before = other > target if reverse else other < target
+        if before:
+            low = mid + 1
+        else:
+            high = mid
+    return low
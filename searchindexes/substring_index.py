@@ -0,0 +1,105 @@
+import numpy as np
+
+# joins the keys so no match can span two of them
+_SEPARATOR = b"\x00"
+
+
+def suffix_array(text: bytes):
+    """start offsets of the suffixes of text in sorted order, built by prefix doubling
+    NOTE: O(n log^2 n) vectorised steps, no suffix is ever copied"""
+    n = len(text)
+    if n == 0:
+        return np.zeros(0, dtype=np.uint32)
+    rank = np.frombuffer(text, dtype=np.uint8).astype(np.int64)
+    k = 1
+    while True:
+        # sort on (rank of the first k bytes, rank of the next k bytes), -1 past the end
+        second = np.full(n, -1, dtype=np.int64)
+        if k < n:
+            second[: n - k] = rank[k:]
+        order = np.lexsort((second, rank))
+        changed = (rank[order][1:] != rank[order][:-1]) | (second[order][1:] != second[order][:-1])
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.concatenate(([0], np.cumsum(changed)))
+        if rank[order[-1]] == n - 1 or k >= n:
+            return order.astype(np.uint32)
+        k *= 2
+
+
+class SubstringIndex:
+    """finds the keys containing a pattern anywhere, not only at their start
+
+    the utf-8 encoded keys are joined with a separator and every suffix of the result is kept
+    sorted in a suffix array, so the suffixes starting with a pattern are one range found with
+    two binary searches: O(len(pattern) * log n) comparisons however many keys match
+
+    the text, key starts and suffix array are flat so they can be stored in a snapshot"""
+
+    def __init__(self, text, starts, suffixes):
+        """text holds the joined keys, starts the offset of every key in it and suffixes its suffix array"""
+        self._text = text
+        self._starts = starts
+        self._suffixes = suffixes
+
+    @classmethod
+    def from_keys(cls, keys):
+        """indexes keys, e.g. PrefixIndex.keys"""
+        encoded = [keys[i].encode("utf-8") for i in range(len(keys))]
+        starts = np.zeros(len(encoded), dtype=np.int64)
+        if encoded:
+            starts[1:] = np.cumsum([len(x) + 1 for x in encoded[:-1]])
+        text = _SEPARATOR.join(encoded) + _SEPARATOR
+        return cls(text, starts, suffix_array(text))
+
+    @property
+    def text(self):
+        return self._text
+
+    @property
+    def starts(self):
+        return self._starts
+
+    @property
+    def suffixes(self):
+        return self._suffixes
+
+    def __len__(self):
+        return len(self._suffixes)
+
+    def _bound(self, pattern, upper):
+        # first suffix whose first len(pattern) bytes are >= pattern, or > pattern when upper
+        text = self._text
+        suffixes = self._suffixes
+        m = len(pattern)
+        low, high = 0, len(suffixes)
+        while low < high:
+            mid = (low + high) // 2
+            start = suffixes[mid]
+            # NOTE: a mapped snapshot's text is a memoryview, which only compares for equality
+            prefix = bytes(text[start : start + m])
+            if prefix < pattern or (upper and prefix == pattern):
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def occurrences(self, pattern: str):
+        """(start, stop) range of the suffix array whose suffixes start with pattern"""
+        encoded = pattern.encode("utf-8")
+        if not encoded or _SEPARATOR in encoded:
+            return 0, 0
+        start = self._bound(encoded, False)
+        return start, self._bound(encoded, True)
+
+    def count(self, pattern: str) -> int:
+        """number of places pattern occurs in the keys"""
+        start, stop = self.occurrences(pattern)
+        return stop - start
+
+    def search(self, pattern: str):
+        """positions in keys of the keys containing pattern, ascending, every key for an empty pattern"""
+        if pattern == "":
+            return np.arange(len(self._starts), dtype=np.int64)
+        start, stop = self.occurrences(pattern)
+        offsets = self._suffixes[start:stop]
+        return np.unique(np.searchsorted(self._starts, offsets, side="right") - 1)
@@ -0,0 +1,93 @@
+from bisect import bisect_left
+from array import array
+import os
+
+import numpy as np
+
+# completions kept for every prefix, the most a suggestion request can ask for
+SUGGEST_K = 10
+# sorts after every character a key can contain, see prefix_index
+_KEY_END = "\U0010ffff"
+
+
+class SuggestIndex:
+    """the top k completions of every prefix of a sorted list of keys, best score first
+
+    this is the top k list a trie would hold at each node, kept flat so it can be stored in a
+    snapshot: the completions of prefixes[i] are completions[i * k:(i + 1) * k] and a lookup is one
+    binary search of the sorted prefixes however many keys are under them. prefixes with fewer than
+    k keys are not stored, their keys are a short slice of the sorted keys ranked on request"""
+
+    def __init__(self, keys, rank, prefixes, completions, k=SUGGEST_K):
+        """keys is sorted, rank holds the place of every key in score order (0 is the best score)"""
+        self._keys = keys
+        self._rank = rank
+        self._prefixes = prefixes
+        self._completions = completions
+        self._k = k
+
+    @classmethod
+    def from_scores(cls, keys, scores, k=SUGGEST_K):
+        """keys is sorted, scores holds a comparable score for each key, higher scores are suggested first"""
+        # ties keep the sorted key order
+        ranked = sorted(range(len(keys)), key=scores.__getitem__, reverse=True)
+        rank = np.empty(len(keys), dtype=np.uint32)
+        rank[ranked] = np.arange(len(keys))
+        top = {}
+        previous = None
+        for start in range(len(keys)):
+            key = keys[start]
+            # the keys under a prefix are one slice of the sorted keys, a prefix shared with the
+            # previous key was visited with it, so every new prefix of key starts its slice here
+            shared = -1 if previous is None else len(os.path.commonprefix([previous, key]))
+            previous = key
+            for end in range(shared + 1, len(key) + 1):
+                prefix = key[:end]
+                stop = bisect_left(keys, prefix + _KEY_END, start)
+                if stop - start < k:
+                    # longer prefixes of key only have fewer keys
+                    break
+                candidates = rank[start:stop]
+                best = np.argpartition(candidates, k - 1)[:k] if len(candidates) > k else np.arange(k)
+                top[prefix] = best[np.argsort(candidates[best])] + start
+        prefixes = sorted(top)
+        completions = array("I")
+        for prefix in prefixes:
+            completions.extend(top[prefix].tolist())
+        return cls(keys, rank, prefixes, completions, k)
+
+    @property
+    def keys(self):
+        return self._keys
+
+    @property
+    def rank(self):
+        return self._rank
+
+    @property
+    def prefixes(self):
+        return self._prefixes
+
+    @property
+    def completions(self):
+        return self._completions
+
+    @property
+    def k(self):
+        return self._k
+
+    def __len__(self):
+        return len(self._prefixes)
+
+    def suggest(self, prefix: str, count=None):
+        """positions in keys of the best count (at most k) keys starting with prefix, best first"""
+        count = self._k if count is None else min(count, self._k)
+        prefixes = self._prefixes
+        i = bisect_left(prefixes, prefix)
+        if i < len(prefixes) and prefixes[i] == prefix:
+            return list(self._completions[i * self._k : i * self._k + count])
+        # fewer than k keys start with prefix
+        keys = self._keys
+        start = bisect_left(keys, prefix)
+        stop = bisect_left(keys, prefix + _KEY_END, start)
+        return sorted(range(start, stop), key=self._rank.__getitem__)[:count]
@@ -0,0 +1,199 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+
+from searchindexes.fuzzy_index import words
+
+# BM25 term frequency saturation and document length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+# term frequencies are stored as uint16, a word repeated more often in one text is counted this many times
+MAX_FREQUENCY = 0xFFFF
+
+
+class TextIndexBuilder:
+    """collects texts in movie id order and converts them to a TextIndex in build()"""
+
+    def __init__(self):
+        # term -> (movie ids, frequencies)
+        self._postings = {}
+        self._lengths = array("I")
+
+    def add(self, movie_id: int, text):
+        """indexes text (None for no text) as movie_id, ids must be added in increasing order"""
+        if movie_id < len(self._lengths):
+            raise ValueError("movie ids must be added in increasing order")
+        self._lengths.extend([0] * (movie_id - len(self._lengths)))
+        tokens = words(text) if text else []
+        self._lengths.append(len(tokens))
+        for term, frequency in Counter(tokens).items():
+            ids, frequencies = self._postings.setdefault(term, (array("I"), array("H")))
+            ids.append(movie_id)
+            frequencies.append(min(frequency, MAX_FREQUENCY))
+
+    def build(self, count=None):
+        """count pads the document lengths for movies after the last one added"""
+        if count is not None and count > len(self._lengths):
+            self._lengths.extend([0] * (count - len(self._lengths)))
+        terms = sorted(self._postings)
+        offsets = array("Q", [0])
+        ids = array("I")
+        frequencies = array("H")
+        for term in terms:
+            term_ids, term_frequencies = self._postings[term]
+            ids.extend(term_ids)
+            frequencies.extend(term_frequencies)
+            offsets.append(len(ids))
+        return TextIndex(terms, offsets, ids, frequencies, self._lengths)
+
+
+class TextIndex:
+    """inverted index over free text ranked with BM25
+
+    the postings of term i are ids[offsets[i]:offsets[i + 1]] with the term's frequency in each
+    text in the aligned frequencies, and lengths holds the number of words of every text, so all
+    arrays can be stored flat in a snapshot and used in place"""
+
+    def __init__(self, terms, offsets, ids, frequencies, lengths, documents=None):
+        self._terms = terms
+        self._offsets = offsets
+        self._ids = ids
+        self._frequencies = frequencies
+        self._lengths = lengths
+        # number of texts BM25 counts, ids no movie holds any more have no text and are not counted
+        self._documents = len(lengths) if documents is None else documents
+        self._length_norm = None
+
+    @property
+    def terms(self):
+        return self._terms
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    @property
+    def ids(self):
+        return self._ids
+
+    @property
+    def frequencies(self):
+        return self._frequencies
+
+    @property
+    def lengths(self):
+        return self._lengths
+
+    @property
+    def documents(self):
+        return self._documents
+
+    def __len__(self):
+        return len(self._terms)
+
+    def edited(self, texts, count, documents):
+        """a copy over count texts where text i is texts[i] for every movie id in texts, None for no text,
+        documents is the number of ids that hold a movie after the edit
+        NOTE: only the edited texts are tokenised, the postings of the others are copied"""
+        edited_ids = np.fromiter(texts, dtype=np.int64, count=len(texts))
+        offsets = np.asarray(self._offsets, dtype=np.int64)
+        entry_terms = np.repeat(np.arange(len(self._terms), dtype=np.int64), np.diff(offsets))
+        entry_ids = np.asarray(self._ids, dtype=np.int64)
+        kept = ~np.isin(entry_ids, edited_ids)
+        entry_terms, entry_ids = entry_terms[kept], entry_ids[kept]
+        frequencies = np.asarray(self._frequencies, dtype=np.uint16)[kept]
+        lengths = np.zeros(count, dtype=np.uint32)
+        shared = min(count, len(self._lengths))
+        lengths[:shared] = np.asarray(self._lengths, dtype=np.uint32)[:shared]
+        # term -> [(movie id, frequency)] of the edited texts
+        added = {}
+        for movie_id, text in texts.items():
+            tokens = words(text) if text else []
+            lengths[movie_id] = len(tokens)
+            for term, frequency in Counter(tokens).items():
+                added.setdefault(term, []).append((movie_id, min(frequency, MAX_FREQUENCY)))
+        terms = self._terms
+        new_terms = sorted(x for x in added if not _contains(terms, x))
+        if new_terms:
+            # every old term moves up past the new terms sorting before it
+            inserted = np.array([bisect_left(terms, x) for x in new_terms], dtype=np.int64)
+            entry_terms += np.searchsorted(inserted, entry_terms, side="right")
+            terms = sorted(list(terms) + new_terms)
+        added_terms, added_ids, added_frequencies = [], [], []
+        for term in sorted(added):
+            position = bisect_left(terms, term)
+            for movie_id, frequency in sorted(added[term]):
+                added_terms.append(position)
+                added_ids.append(movie_id)
+                added_frequencies.append(frequency)
+        # postings are sorted by term then id, the edited ones go where that order puts them
+        stride = max(count, 1)
+        at = np.searchsorted(
+            entry_terms * stride + entry_ids, np.array(added_terms, dtype=np.int64) * stride + added_ids
+        )
+        entry_terms = np.insert(entry_terms, at, added_terms)
+        entry_ids = np.insert(entry_ids, at, added_ids)
+        frequencies = np.insert(frequencies, at, np.array(added_frequencies, dtype=np.uint16))
+        offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        np.cumsum(np.bincount(entry_terms, minlength=len(terms)), out=offsets[1:])
+        return TextIndex(terms, offsets, entry_ids.astype(np.uint32), frequencies, lengths, documents)
+
+    def _range(self, term):
+        i = bisect_left(self._terms, term)
+        if i < len(self._terms) and self._terms[i] == term:
+            return self._offsets[i], self._offsets[i + 1]
+        return 0, 0
+
+    def document_frequency(self, term: str) -> int:
+        start, stop = self._range(term)
+        return stop - start
+
+    def _norm(self):
+        # the length dependent part of the BM25 denominator, computed once per index
+        if self._length_norm is None:
+            lengths = np.asarray(self._lengths, dtype=np.float32)
+            average = lengths.sum() / self._documents if self._documents and lengths.sum() > 0 else 1.0
+            self._length_norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average)
+        return self._length_norm
+
+    def scores(self, query: str):
+        """(ids, scores) of the texts containing any word of query, ids ascending
+        NOTE: only the postings of the query words are read, the cost does not depend on the number of texts"""
+        norm = self._norm()
+        count = self._documents
+        matched = []
+        contributions = []
+        for term in set(words(query)):
+            start, stop = self._range(term)
+            if start == stop:
+                continue
+            ids = np.asarray(self._ids[start:stop], dtype=np.uint32)
+            frequencies = np.asarray(self._frequencies[start:stop], dtype=np.float32)
+            idf = np.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+            matched.append(ids)
+            contributions.append(idf * frequencies * (BM25_K1 + 1) / (frequencies + norm[ids]))
+        if not matched:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.float32)
+        if len(matched) == 1:
+            return matched[0], contributions[0].astype(np.float32)
+        # the scores of a text are summed over the query words it contains
+        ids, positions = np.unique(np.concatenate(matched), return_inverse=True)
+        scores = np.bincount(positions, weights=np.concatenate(contributions), minlength=len(ids))
+        return ids, scores.astype(np.float32)
+
+    def search(self, query: str, k=10):
+        """the k best (movie id, score) pairs for query, best first"""
+        ids, scores = self.scores(query)
+        if len(ids) > k:
+            # partial selection of the k best instead of sorting every matching text
+            best = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[best], scores[best]
+        order = np.lexsort((ids, -scores))
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+def _contains(terms, term):
+    i = bisect_left(terms, term)
+    return i < len(terms) and terms[i] == term
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""production launcher for the ASGI app in asgi.py
+
+builds the index snapshot once, then starts uvicorn worker processes that each memory map it:
+    python serve.py [--host HOST] [--port PORT] [--workers N] [--threads N] [--watch SECONDS]
+
+this process watches the data file and rewrites the snapshot when it changes, the workers map
+the new snapshot instead of each parsing the data file"""
+import argparse
+import os
+import sys
+
+from searchindexes.index_manager import IndexManager
+from searchindexes.snapshot import default_snapshot_path
+
+# the same environment variables main.py reads
+DATA_PATH_ENV = "MOVIE_MODEL_VIEWER_DATA_PATH"
+SNAPSHOT_PATH_ENV = "MOVIE_MODEL_VIEWER_SNAPSHOT_PATH"
+THREADS_ENV = "MOVIE_MODEL_VIEWER_THREADS"
+WATCH_INTERVAL_ENV = "MOVIE_MODEL_VIEWER_WATCH_INTERVAL"
+# read by asgi.py
+FOLLOW_INTERVAL_ENV = "MOVIE_MODEL_VIEWER_FOLLOW_INTERVAL"
+DEFAULT_DATA_PATH = "./datafiles/Data1000Movies.csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="serve the movie viewer with uvicorn")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes, defaults to one per cpu")
+    parser.add_argument("--threads", type=int, default=4, help="threads per process running request handlers")
+    parser.add_argument(
+        "--watch",
+        type=float,
+        default=float(os.environ.get(WATCH_INTERVAL_ENV, 5)),
+        help="seconds between checks of the data file for changes, 0 turns watching off",
+    )
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("serve.py needs uvicorn, install the dependencies with pip install -r requirements.txt")
+
+    data_path = os.environ.get(DATA_PATH_ENV, DEFAULT_DATA_PATH)
+    snapshot_path = os.environ.get(SNAPSHOT_PATH_ENV, default_snapshot_path(data_path))
+    # every worker maps this snapshot instead of parsing the data file itself
+    index_manager = IndexManager(data_path, snapshot_path, workers=None)
+    # read by asgi.py in each worker process
+    os.environ[THREADS_ENV] = str(args.threads)
+    if args.watch > 0:
+        # only this process rebuilds the snapshot, the workers check it twice as often as the file is
+        index_manager.watch(args.watch)
+        os.environ[FOLLOW_INTERVAL_ENV] = str(args.watch / 2)
+    uvicorn.run("asgi:app", host=args.host, port=args.port, workers=args.workers, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import pickle
 import unittest
 import pytest
 from domainmodel.movie import Movie
@@ -5,6 +6,11 @@ from domainmodel.actor import Actor
 from domainmodel.genre import Genre
 from datafilereaders.movie_file_csv_reader import MovieFileCSVReader
 from domainmodel.review import Review
+from domainmodel.director import Director
+from domainmodel.entity_registry import EntityRegistry
+from domainmodel.user import User
+from domainmodel.watchlist import WatchList
+from searchindexes.costar_graph import CoStarGraph
 
 
 class MyTestCase(unittest.TestCase):
@@ -98,5 +104,178 @@ class MyTestCase(unittest.TestCase):
         self.assertFalse(movie1.check_if_this_movie_worked_with(movie3))
     """
 
+
+class SlotsTestCase(unittest.TestCase):
+    def test_no_instance_dict(self):
+        movie, review = Movie("Saw", 2004), Review("moana", "epic", 10)
+        for obj in [movie, Actor("bob"), Genre("Horror"), Director("James Wan"), review]:
+            self.assertFalse(hasattr(obj, "__dict__"))
+
+    def test_lazy_colleagues(self):
+        actor1 = Actor("Angelina Jolie")
+        actor2 = Actor("Brad Pitt")
+        self.assertFalse(actor1.check_if_this_actor_worked_with(actor2))
+        self.assertIsNone(actor1._colleague_set)
+        actor1.add_actor_colleague(actor2)
+        self.assertTrue(actor1.check_if_this_actor_worked_with(actor2))
+        self.assertEqual(actor1.colleague_set, {actor2})
+
+    def test_movies_do_not_share_lists(self):
+        movie1 = Movie("Saw", 2004)
+        movie1.add_actor(Actor("Cary Elwes"))
+        self.assertEqual(Movie("Saw 2", 2005).actors, [])
+        self.assertIsNone(Movie("Saw 3", 2006).description)
+
+
+class EntityRegistryTestCase(unittest.TestCase):
+    def test_shared_instances(self):
+        registry = EntityRegistry()
+        actor = registry.actor("Chris Pratt")
+        self.assertIs(registry.actor(" Chris Pratt"), actor)
+        self.assertIs(registry.intern(Actor("Chris Pratt")), actor)
+        self.assertIs(registry.genre("Sci-Fi"), registry.genre("Sci-Fi"))
+        self.assertIsNot(registry.director("James Gunn"), registry.director("Ridley Scott"))
+        self.assertEqual(len(registry.actors), 1)
+
+    def test_reverse_indexes(self):
+        registry = EntityRegistry()
+        movie1 = Movie("Guardians of the Galaxy", 2014)
+        movie1.actors = [registry.actor("Chris Pratt"), registry.actor("Zoe Saldana")]
+        movie1.director = registry.director("James Gunn")
+        movie2 = Movie("Passengers", 2016)
+        movie2.actors = [registry.actor("Chris Pratt")]
+        registry.add_movie(movie1)
+        registry.add_movie(movie2)
+        self.assertEqual(registry.movies_of_actor(Actor("Chris Pratt")), [movie1, movie2])
+        self.assertEqual(registry.movies_of_actor("Zoe Saldana"), [movie1])
+        self.assertEqual(registry.movies_of_director(Director("James Gunn")), [movie1])
+        self.assertEqual(registry.movies_of_director("Ridley Scott"), [])
+
+    def test_costar_graph(self):
+        registry = EntityRegistry()
+        movie1 = Movie("Guardians of the Galaxy", 2014)
+        movie1.actors = [registry.actor("Chris Pratt"), registry.actor("Zoe Saldana")]
+        movie2 = Movie("Passengers", 2016)
+        movie2.actors = [registry.actor("Chris Pratt"), registry.actor("Jennifer Lawrence")]
+        registry.add_movie(movie1)
+        registry.add_movie(movie2)
+        pratt = registry.actor("Chris Pratt")
+        # an interned actor answers from the movies of its registry
+        self.assertTrue(pratt.check_if_this_actor_worked_with(Actor("Jennifer Lawrence")))
+        self.assertFalse(registry.actor("Zoe Saldana").check_if_this_actor_worked_with(Actor("Jennifer Lawrence")))
+        self.assertFalse(pratt.check_if_this_actor_worked_with(pratt))
+        # one no registry interned only knows the colleagues added by hand
+        self.assertFalse(Actor("Chris Pratt").check_if_this_actor_worked_with(Actor("Jennifer Lawrence")))
+        self.assertFalse(EntityRegistry().actor("Chris Pratt").check_if_this_actor_worked_with(Actor("Zoe Saldana")))
+        self.assertTrue(registry.worked_with(pratt, "Jennifer Lawrence"))
+        graph = CoStarGraph.from_casts(*registry.casts)
+        self.assertTrue(pratt.check_if_this_actor_worked_with(Actor("Jennifer Lawrence"), graph))
+        self.assertFalse(pratt.check_if_this_actor_worked_with(Actor("Tom Cruise"), graph))
+        zoe, jennifer = graph.actor_id("Zoe Saldana"), graph.actor_id("Jennifer Lawrence")
+        self.assertEqual(
+            [graph.names[i] for i in graph.path(zoe, jennifer)], ["Zoe Saldana", "Chris Pratt", "Jennifer Lawrence"]
+        )
+        # movies added later are known on the next lookup
+        movie3 = Movie("Hunger Games", 2012)
+        movie3.actors = [registry.actor("Jennifer Lawrence"), registry.actor("Zoe Saldana")]
+        registry.add_movie(movie3)
+        self.assertTrue(registry.worked_with("Zoe Saldana", Actor("Jennifer Lawrence")))
+        self.assertTrue(registry.actor("Zoe Saldana").check_if_this_actor_worked_with(Actor("Jennifer Lawrence")))
+        # the registry is not pickled along with its actors
+        self.assertLess(len(pickle.dumps(pratt)), 200)
+
+
+class WatchListTestCase(unittest.TestCase):
+    def setUp(self):
+        self.registry = EntityRegistry()
+        self.movies = [Movie(f"Movie {i}", 2000 + i % 20) for i in range(40)]
+        for movie in self.movies:
+            movie.runtime_minutes = 100
+            self.registry.add_movie(movie)
+
+    def test_order_and_membership(self):
+        watchlist = WatchList(self.registry)
+        for movie in self.movies[:3] + self.movies[:2]:
+            watchlist.add_movie(movie)
+        self.assertEqual(list(watchlist), self.movies[:3])
+        self.assertEqual(watchlist.size(), 3)
+        self.assertIn(self.movies[1], watchlist)
+        self.assertNotIn(self.movies[5], watchlist)
+        self.assertNotIn(Movie("Not Added", 2001), watchlist)
+        watchlist.remove_movie(self.movies[1])
+        watchlist.remove_movie(self.movies[30])
+        self.assertEqual(list(watchlist), [self.movies[0], self.movies[2]])
+        self.assertEqual(watchlist.first_movie_in_watchlist(), self.movies[0])
+        self.assertEqual(watchlist.select_movie_to_watch(1), self.movies[2])
+        self.assertIsNone(watchlist.select_movie_to_watch(2))
+        with self.assertRaises(ValueError):
+            watchlist.add_movie(Movie("Not Added", 2001))
+
+    def test_large(self):
+        # past SMALL_WATCHLIST movies are found through the hash table
+        watchlist = WatchList()
+        for movie_id in range(1000):
+            watchlist.add_movie(movie_id * 7)
+        for movie_id in range(0, 1000, 2):
+            watchlist.remove_movie(movie_id * 7)
+        watchlist.add_movie(0)
+        self.assertEqual(list(watchlist.movie_ids()), [x * 7 for x in range(1, 1000, 2)] + [0])
+        self.assertIn(7, watchlist)
+        self.assertNotIn(14, watchlist)
+        self.assertEqual(watchlist.select_movie_to_watch(500), 0)
+        self.assertEqual(len(watchlist), 501)
+
+    def test_without_catalogue(self):
+        # Movies are numbered by the list itself
+        watchlist = WatchList()
+        for movie in self.movies[:20] + self.movies[:5]:
+            watchlist.add_movie(movie)
+        self.assertEqual(list(watchlist), self.movies[:20])
+        self.assertNotIn(self.movies[30], watchlist)
+        watchlist.remove_movie(self.movies[30])
+        watchlist.remove_movie(self.movies[3])
+        self.assertEqual(watchlist.select_movie_to_watch(3), self.movies[4])
+        ids = WatchList()
+        ids.add_movie(3)
+        with self.assertRaises(ValueError):
+            ids.add_movie(self.movies[0])
+
+
+class UserTestCase(unittest.TestCase):
+    def test_user(self):
+        registry = EntityRegistry()
+        movie1 = Movie("Moana", 2016)
+        movie1.runtime_minutes = 107
+        movie2 = Movie("Shrek", 2001)
+        movie2.runtime_minutes = 90
+        registry.add_movie(movie1)
+        registry.add_movie(movie2)
+        user = User("  Dave ", "pw1234", registry)
+        self.assertEqual(repr(user), "<User dave>")
+        self.assertEqual(user, User("dave", "other"))
+        user.watch_movie(movie1)
+        user.watch_movie(1)
+        user.watch_movie(movie1)
+        self.assertEqual(user.watched_movies, [movie1, movie2])
+        self.assertTrue(user.has_watched(movie2))
+        self.assertEqual(user.time_spent_watching_movies_minutes, 107 * 2 + 90)
+        review = Review(movie1, "great songs", 9)
+        user.add_review(review)
+        user.add_review("not a review")
+        self.assertEqual(user.reviews, [review])
+        self.assertEqual(User("", "pw").user_name, None)
+
+    def test_without_catalogue(self):
+        movie = Movie("Moana", 2016)
+        movie.runtime_minutes = 107
+        user = User("dave", "pw1234")
+        self.assertFalse(user.has_watched(movie))
+        self.assertEqual(user.watched_movies, [])
+        user.watch_movie(movie)
+        self.assertEqual(user.watched_movies, [movie])
+        self.assertEqual(user.time_spent_watching_movies_minutes, 107)
+        self.assertEqual(len(user.watchlist), 0)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+# keeps the snapshot built for the tests out of the datafiles directory
+_snapshot_dir = tempfile.TemporaryDirectory()
+os.environ["MOVIE_MODEL_VIEWER_SNAPSHOT_PATH"] = os.path.join(_snapshot_dir.name, "movies.snapshot")
+os.environ["MOVIE_MODEL_VIEWER_WATCH_INTERVAL"] = "0"
+
+import main  # noqa: E402
+import asgi  # noqa: E402
+
+
+class RoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = main.app.test_client()
+
+    def test_root_conditional(self):
+        response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"searchbox", response.data)
+        etag = response.headers["ETag"]
+        self.assertEqual(self.client.get("/", headers={"If-None-Match": etag}).status_code, 304)
+        last_modified = response.headers["Last-Modified"]
+        self.assertEqual(self.client.get("/", headers={"If-Modified-Since": last_modified}).status_code, 304)
+
+    def test_search(self):
+        response = self.client.get("/search?q=guardians")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Guardians of the Galaxy", response.data)
+        self.assertIn(b'id="search_section"', response.data)
+
+    def test_query(self):
+        payload = self.client.get('/query?q=actor:"chris pratt" genre:sci-fi&sortby=year').get_json()
+        self.assertEqual([x["title"] for x in payload["results_list"]], ["Guardians of the Galaxy", "Jurassic World"])
+        self.assertEqual(payload["max_page"], 1)
+
+    def test_query_cache(self):
+        main.query_cache.clear()
+        first = self.client.get("/query?q=the&sortby=rating&reverse=true&num-results=5").get_json()
+        hits = self.client.get("/query/cache").get_json()["hits"]
+        second = self.client.get("/query?q=the&sortby=rating&reverse=true&num-results=5&page=2").get_json()
+        self.assertEqual(self.client.get("/query/cache").get_json()["hits"], hits + 1)
+        self.assertEqual(first["max_page"], second["max_page"])
+        self.assertTrue(
+            set(x["title"] for x in first["results_list"]).isdisjoint(x["title"] for x in second["results_list"])
+        )
+        ratings = [x["rating"] for x in first["results_list"] + second["results_list"]]
+        self.assertEqual(ratings, sorted(ratings, reverse=True))
+
+    def test_query_fuzzy(self):
+        self.assertEqual(self.client.get("/query?q=chirs pratt").get_json()["results_list"], [])
+        payload = self.client.get("/query?q=chirs pratt&fuzzy=true&num-results=20").get_json()
+        self.assertEqual(len(payload["results_list"]), 7)
+        payload = self.client.get("/query?q=gardians galaxy&fuzzy=true&sortby=year").get_json()
+        self.assertEqual(payload["results_list"][0]["title"], "Guardians of the Galaxy")
+        # closer matches rank before the sort order is applied
+        payload = self.client.get("/query?q=title:night&fuzzy=true&sortby=year&reverse=true").get_json()
+        years = [x["year"] for x in payload["results_list"]]
+        self.assertEqual(payload["results_list"][5]["title"], "The Light Between Oceans")
+        self.assertEqual(years[:7], [2016, 2016, 2016, 2014, 2014, 2016, 2015])
+
+    def test_query_description(self):
+        payload = self.client.get("/query?q=dinosaur theme park&searchby=description").get_json()
+        self.assertEqual(payload["results_list"][0]["title"], "Jurassic World")
+        payload = self.client.get('/query?q=description:dinosaur actor:"chris pratt"').get_json()
+        self.assertEqual([x["title"] for x in payload["results_list"]], ["Jurassic World"])
+        # plain searches do not look at descriptions
+        self.assertEqual(self.client.get("/query?q=dinosaur").get_json()["results_list"], [])
+
+    def test_query_substring(self):
+        self.assertEqual(self.client.get("/query?q=title:galaxy").get_json()["results_list"], [])
+        payload = self.client.get("/query?q=title:galaxy&substring=true").get_json()
+        self.assertEqual([x["title"] for x in payload["results_list"]], ["Guardians of the Galaxy"])
+        payload = self.client.get("/query?q=pratt&searchby=actor&substring=true&num-results=20").get_json()
+        self.assertEqual(len(payload["results_list"]), 7)
+        self.assertEqual(self.client.get("/query?q=pratt&searchby=actor&substring=true").get_json()["total"], 7)
+        self.assertEqual(main.index_manager.index.substring_count("actor", "pratt"), 1)
+        # years keep matching from the start
+        payload = self.client.get("/query?q=016&searchby=year&substring=true").get_json()
+        self.assertEqual(payload["results_list"], [])
+
+    def test_query_cursor(self):
+        for cache_size in (1024, 0):
+            with mock.patch.object(main, "query_cache", main.QueryCache(max_entries=cache_size)):
+                for q in ("", "genre:horror"):
+                    url = "/query?q=" + q + "&sortby=year&reverse=true&num-results=20"
+                    payload = self.client.get(url).get_json()
+                    scrolled = payload["results_list"]
+                    while payload["next_cursor"] is not None:
+                        payload = self.client.get(url + "&cursor=" + payload["next_cursor"]).get_json()
+                        self.assertIsNone(payload["page_num"])
+                        scrolled += payload["results_list"]
+                    paged = []
+                    for page in range(1, payload["max_page"] + 1):
+                        paged += self.client.get(url + "&page=" + str(page)).get_json()["results_list"]
+                    self.assertEqual([x["idx"] for x in scrolled], [x["idx"] for x in paged])
+        self.assertEqual(self.client.get("/query?cursor=nonsense").status_code, 400)
+        cursor = self.client.get("/query?sortby=year").get_json()["next_cursor"]
+        self.assertEqual(self.client.get("/query?sortby=rating&cursor=" + cursor).status_code, 400)
+
+    def test_query_projection(self):
+        url = "/query?q=genre:sci-fi&sortby=year&num-results=5"
+        full = self.client.get(url).get_json()
+        ids = self.client.get(url + "&ids=true").get_json()
+        self.assertEqual(ids["results_list"], [x["idx"] for x in full["results_list"]])
+        self.assertEqual(ids["max_page"], full["max_page"])
+        projected = self.client.get(url + "&fields=title,year,title,plot").get_json()
+        self.assertEqual(
+            projected["results_list"], [{"title": x["title"], "year": x["year"]} for x in full["results_list"]]
+        )
+        # no known field left serves whole rows
+        self.assertEqual(self.client.get(url + "&fields=plot").get_json(), full)
+
+    def test_suggest(self):
+        response = self.client.get("/suggest?q=chr&field=actor&num=3")
+        self.assertEqual(response.headers["Cache-Control"], "public, max-age=300")
+        payload = response.get_json()
+        self.assertEqual(
+            [x["text"] for x in payload["suggestions"]], ["Christian Bale", "Chris Evans", "Chris Hemsworth"]
+        )
+        self.assertEqual(payload["suggestions"][0], {"text": "Christian Bale", "field": "actor", "movies": 13})
+        revalidated = self.client.get(
+            "/suggest?q=chr&field=actor&num=3", headers={"If-None-Match": response.headers["ETag"]}
+        )
+        self.assertEqual(revalidated.status_code, 304)
+        # without a field every field is suggested from, a short subtree is ranked on request
+        payload = self.client.get("/suggest?q=Guardians").get_json()
+        self.assertEqual(payload["suggestions"], [{"text": "Guardians of the Galaxy", "field": "title", "movies": 1}])
+        self.assertEqual(len(self.client.get("/suggest?q=&num=500").get_json()["suggestions"]), 10)
+
+    def test_actor_graph(self):
+        payload = self.client.get("/actor/christian bale/colleagues").get_json()
+        self.assertEqual(payload["actor"], "Christian Bale")
+        # most movies together first, then by name
+        self.assertEqual(
+            payload["colleagues"][:2], [{"name": "Amy Adams", "movies": 2}, {"name": "Michael Caine", "movies": 2}]
+        )
+        self.assertIn(
+            {"name": "Jennifer Lawrence", "movies": 1},
+            self.client.get("/actor/Chris Pratt/colleagues").get_json()["colleagues"],
+        )
+        self.assertEqual(self.client.get("/actor/nobody at all/colleagues").status_code, 404)
+        payload = self.client.get("/actor/Chris Pratt/degrees?to=kevin bacon").get_json()
+        self.assertEqual(payload["degrees"], 2)
+        self.assertEqual(payload["path"][0], "Chris Pratt")
+        self.assertEqual(payload["path"][-1], "Kevin Bacon")
+        self.assertEqual(self.client.get("/actor/Chris Pratt/degrees").status_code, 400)
+
+    def test_similar(self):
+        payload = self.client.get("/movie/54/similar?num=2").get_json()
+        self.assertEqual([x["title"] for x in payload["results_list"]], ["The Prestige", "The Dark Knight Rises"])
+        self.assertEqual(len(payload["scores"]), 2)
+        self.assertGreaterEqual(payload["scores"][0], payload["scores"][1])
+        # the neighbours are kept, a different num is sliced from them
+        hits = self.client.get("/query/cache").get_json()["hits"]
+        self.assertEqual(len(self.client.get("/movie/54/similar").get_json()["results_list"]), 10)
+        self.assertEqual(self.client.get("/query/cache").get_json()["hits"], hits + 1)
+        self.assertEqual(self.client.get("/movie/1000/similar").status_code, 404)
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = main.app.test_client()
+
+    def test_batch(self):
+        queries = [
+            {"q": "genre:sci-fi", "sortby": "year", "num-results": 5},
+            {"q": 'actor:"chris pratt" genre:sci-fi', "sortby": "year"},
+            {"q": "gardians", "fuzzy": True},
+            {"q": "x", "cursor": "nonsense"},
+            {"q": ["genre:sci-fi"]},
+            {"q": "x", "sortby": {"field": "year"}},
+        ]
+        response = self.client.post("/query/batch", json={"queries": queries})
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()["results"]
+        self.assertEqual(len(results), 6)
+        expected = self.client.get("/query?q=genre:sci-fi&sortby=year&num-results=5").get_json()
+        self.assertEqual(results[0], expected)
+        self.assertEqual(
+            [x["title"] for x in results[1]["results_list"]], ["Guardians of the Galaxy", "Jurassic World"]
+        )
+        self.assertEqual(results[2]["results_list"][0]["title"], "Guardians of the Galaxy")
+        self.assertIn("error", results[3])
+        self.assertEqual(results[4], {"error": "parameter q must be a string, number or boolean"})
+        self.assertEqual(results[5], {"error": "parameter sortby must be a string, number or boolean"})
+        self.assertEqual(self.client.post("/query/batch", json={"queries": "q"}).status_code, 400)
+        self.assertEqual(self.client.post("/query/batch", data="not json").status_code, 400)
+        self.assertEqual(self.client.post("/query/batch", json=[{}] * 101).status_code, 400)
+
+    def test_shared_term_lookups(self):
+        term_cache = {}
+        main.QueryFactory("/query", "genre:sci-fi year:2016", index=main.index_manager.index, term_cache=term_cache)
+        self.assertEqual(len(term_cache), 2)
+        cached = next(iter(term_cache.values()))
+        main.QueryFactory("/query", "genre:sci-fi -year:2016", index=main.index_manager.index, term_cache=term_cache)
+        self.assertEqual(len(term_cache), 3)
+        self.assertIs(next(iter(term_cache.values())), cached)
+
+
+class AsgiTestCase(unittest.TestCase):
+    def request(self, path, query_string=b"", method="GET", headers=()):
+        scope = {"type": "http", "method": method, "path": path, "query_string": query_string, "headers": headers}
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(asgi.app(scope, receive, send))
+        return messages[0]["status"], dict(messages[0]["headers"]), messages[1]["body"]
+
+    def test_query(self):
+        status, headers, body = self.request("/query", b"q=actor%3A%22chris+pratt%22+genre%3Asci-fi&sortby=year")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b"content-type"], b"application/json")
+        expected = main.app.test_client().get('/query?q=actor:"chris pratt" genre:sci-fi&sortby=year').get_json()
+        self.assertEqual(json.loads(body), expected)
+        self.assertEqual(self.request("/query", b"cursor=nonsense")[0], 400)
+
+    def test_pages(self):
+        status, headers, body = self.request("/")
+        self.assertIn(b"searchbox", body)
+        self.assertEqual(self.request("/", headers=[(b"if-none-match", headers[b"etag"])])[0], 304)
+        self.assertIn(b"Guardians of the Galaxy", self.request("/search", b"q=guardians")[2])
+        self.assertEqual(self.request("/css/home.css")[1][b"content-type"], b"text/css; charset=utf-8")
+        self.assertEqual(self.request("/css/../../main.py")[0], 404)
+        status, headers, body = self.request("/suggest", b"q=dra&field=genre")
+        self.assertEqual(json.loads(body)["suggestions"][0]["text"], "Drama")
+        self.assertEqual(
+            self.request("/suggest", b"q=dra&field=genre", headers=[(b"if-none-match", headers[b"etag"])])[0], 304
+        )
+        self.assertEqual(json.loads(self.request("/actor/Chris Pratt/degrees", b"to=Zoe Saldana")[2])["degrees"], 1)
+        self.assertEqual(json.loads(self.request("/movie/54/similar")[2])["results_list"][0]["title"], "The Prestige")
+        self.assertEqual(self.request("/missing")[0], 404)
+        self.assertEqual(self.request("/query", method="POST")[0], 405)
+        self.assertEqual(self.request("/", method="HEAD")[2], b"")
+
+    def test_batch(self):
+        headers = [(b"content-type", b"application/json")]
+        scope = {"type": "http", "method": "POST", "path": "/query/batch", "query_string": b"", "headers": headers}
+        chunks = [b'[{"q": "genre:sci', b'-fi"}]']
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": chunks.pop(0), "more_body": bool(chunks)}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(asgi.app(scope, receive, send))
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertEqual(len(json.loads(messages[1]["body"])["results"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
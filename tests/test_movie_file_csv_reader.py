@@ -0,0 +1,95 @@
+import csv
+import os
+import tempfile
+import unittest
+from unittest import mock
+from datafilereaders import movie_file_csv_reader
+from datafilereaders.movie_file_csv_reader import MovieFileCSVReader, find_record_boundaries
+from domainmodel.director import Director
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "datafiles", "Data1000Movies.csv")
+
+
+class MovieFileCSVReaderTestCase(unittest.TestCase):
+    def test_read_csv_file(self):
+        reader = MovieFileCSVReader(DATA_PATH)
+        reader.read_csv_file()
+        self.assertEqual(len(reader.dataset_of_movies), 1000)
+        self.assertEqual(len(reader.dataset_of_actors), 1985)
+        self.assertEqual(len(reader.dataset_of_directors), 644)
+        self.assertEqual(len(reader.dataset_of_genres), 20)
+        # datasets belong to the reader, reading again does not add duplicates
+        reader.read_csv_file()
+        self.assertEqual(len(reader.dataset_of_movies), 1000)
+        self.assertEqual(MovieFileCSVReader(DATA_PATH).dataset_of_movies, [])
+
+    def test_registry(self):
+        reader = MovieFileCSVReader(DATA_PATH)
+        reader.read_csv_file()
+        actors = {id(x) for movie in reader.dataset_of_movies for x in movie.actors}
+        self.assertEqual(len(actors), len(reader.dataset_of_actors))
+        self.assertEqual(len(reader.registry.movies_of_actor("Chris Pratt")), 7)
+
+    def test_iter_movies(self):
+        movies = MovieFileCSVReader(DATA_PATH).iter_movies()
+        movie = next(movies)
+        movies.close()
+        self.assertEqual(repr(movie), "<Movie Guardians of the Galaxy, 2014>")
+        self.assertEqual(movie.director, Director("James Gunn"))
+        self.assertEqual(movie.runtime_minutes, 121)
+
+    def test_iter_movies_columns(self):
+        movie = next(MovieFileCSVReader(DATA_PATH).iter_movies(columns=["Genre"]))
+        self.assertEqual(repr(movie.genres), "[<Genre Action>, <Genre Adventure>, <Genre Sci-Fi>]")
+        self.assertIsNone(movie.description)
+        self.assertIsNone(movie.director)
+        with self.assertRaises(ValueError):
+            next(MovieFileCSVReader(DATA_PATH).iter_movies(columns=["Plot"]))
+
+
+class ParallelReaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "movies.csv")
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Title", "Genre", "Description", "Director", "Actors", "Year", "Runtime (Minutes)"])
+            for i in range(300):
+                # quoted fields with newlines and escaped quotes must never be split
+                description = 'a "quoted"\nplot,\n' * (i % 3)
+                writer.writerow(
+                    [f"Movie {i}", "Drama,Comedy", description, f"Director {i % 7}", "A, B", 2000 + i % 20, 90]
+                )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_record_boundaries(self):
+        boundaries = find_record_boundaries(self.path, 5)
+        self.assertEqual(len(boundaries), 6)
+        self.assertEqual(boundaries[-1], os.path.getsize(self.path))
+        with open(self.path, "rb") as f:
+            data = f.read()
+        rows = []
+        for start, stop in zip(boundaries, boundaries[1:]):
+            rows += list(csv.reader(data[start:stop].decode("utf-8").splitlines(keepends=True)))
+        self.assertEqual([x[0] for x in rows], [f"Movie {i}" for i in range(300)])
+
+    def test_parallel_matches_serial(self):
+        serial = MovieFileCSVReader(self.path)
+        serial.read_csv_file()
+        parallel = MovieFileCSVReader(self.path)
+        with mock.patch.object(movie_file_csv_reader, "MIN_CHUNK_BYTES", 1024):
+            parallel.read_csv_file(workers=3)
+        self.assertEqual(parallel.dataset_of_movies, serial.dataset_of_movies)
+        self.assertEqual(
+            [x.description for x in parallel.dataset_of_movies], [x.description for x in serial.dataset_of_movies]
+        )
+        self.assertEqual(parallel.dataset_of_directors, serial.dataset_of_directors)
+        self.assertEqual(parallel.dataset_of_genres, serial.dataset_of_genres)
+        # chunks parsed by different workers share one instance per name
+        self.assertIs(parallel.dataset_of_movies[0].genres[0], parallel.dataset_of_movies[-1].genres[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,676 @@
+import csv
+import os
+import json
+import tempfile
+import time
+import unittest
+from unittest import mock
+import numpy as np
+from domainmodel.movie import Movie
+from domainmodel.actor import Actor
+from domainmodel.genre import Genre
+from searchindexes.index_manager import IndexManager
+from searchindexes.movie_index import MovieIndex, encode_row
+from searchindexes.movie_table import MovieTable
+from searchindexes.snapshot import write_snapshot, load_snapshot, source_stamp
+from searchindexes import similarity_index
+from searchindexes.similarity_index import SimilarityIndex
+from searchindexes.sort_order import SortOrder
+from searchindexes.posting_list import PostingList, union, intersection, difference
+from searchindexes.array_utils import ranges
+from searchindexes.costar_graph import CoStarGraph
+from searchindexes.fuzzy_index import FuzzyIndex, edit_distance
+from searchindexes.prefix_index import PrefixIndex
+from searchindexes.query_cache import QueryCache
+from searchindexes.substring_index import SubstringIndex, suffix_array
+from searchindexes.suggest_index import SuggestIndex
+from searchindexes.text_index import TextIndexBuilder
+from searchindexes.query_parser import QueryTerm, parse_query, evaluate_query
+
+FIELDS = ["title", "year", "actor", "genre"]
+
+
+class SortOrderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rows = [
+            {"idx": 0, "title": "saw", "year": 2004},
+            {"idx": 1, "title": "moana", "year": 2016},
+            {"idx": 2, "title": "shrek", "year": 2001},
+            {"idx": 3, "title": "arrival", "year": 2016},
+        ]
+
+    def test_order_and_rank(self):
+        order = SortOrder(self.rows, "title")
+        self.assertEqual(order.order.tolist(), [3, 1, 0, 2])
+        self.assertEqual(order.rank.tolist(), [2, 1, 3, 0])
+
+    def test_page_full_catalogue(self):
+        order = SortOrder(self.rows, "year")
+        self.assertEqual(order.page([0, 1, 2, 3], 0, 2), [2, 0])
+        self.assertEqual(order.page([0, 1, 2, 3], 2, 10), [1, 3])
+        # equal years stay in ascending id order when reversed, like a stable sort
+        self.assertEqual(order.page([0, 1, 2, 3], 0, 3, reverse=True), [1, 3, 0])
+        self.assertEqual(order.page([0, 1, 3], 0, 2, reverse=True), [1, 3])
+        self.assertEqual(order.ordered([3, 1, 2], reverse=True).materialise().page(0, 3), [1, 3, 2])
+        self.assertEqual(order.page_after([0, 1, 2, 3], order.reverse_rank[1], 2, reverse=True), [3, 0])
+
+    def test_page_subset(self):
+        order = SortOrder(self.rows, "title")
+        self.assertEqual(order.page([2, 0, 1], 0, 2), [1, 0])
+        self.assertEqual(order.page([2, 0, 1], 1, 5, reverse=True), [0, 1])
+        self.assertEqual(order.page([2, 0, 1], 5, 10), [])
+
+    def test_ordered(self):
+        order = SortOrder(self.rows, "title")
+        ordered = order.ordered([2, 0, 1], reverse=True)
+        self.assertEqual(ordered.page(0, 2), [2, 0])
+        self.assertEqual(ordered.materialise().size, 3)
+        self.assertEqual(ordered.page(1, 5), [0, 1])
+        # every row matched, the shared order is used instead of a copy
+        self.assertEqual(order.ordered([0, 1, 2, 3]).materialise().size, 0)
+
+    def test_page_after(self):
+        order = SortOrder(self.rows, "title")
+        for ids in ([2, 0, 1], [0, 1, 2, 3]):
+            for reverse in (False, True):
+                ordered = order.ordered(ids, reverse=reverse)
+                expected = order.page(ids, 1, 3, reverse=reverse)
+                after = order.page(ids, 0, 1, reverse=reverse)[0]
+                self.assertEqual(ordered.page_after(after, 2), expected)
+                self.assertEqual(ordered.materialise().page_after(after, 2), expected)
+
+    def test_selected_pages_are_kept(self):
+        order = SortOrder(self.rows, "title")
+        ordered = order.ordered([0, 1, 2], scores={0: 1, 1: 0, 2: 1})
+        self.assertEqual(ordered.page(0, 2), [1, 0])
+        self.assertEqual(ordered.page(1, 2), [0])
+        self.assertEqual(ordered.page(0, 5), [1, 0, 2])
+        # the selection covered every row, so it is the full ordering
+        self.assertEqual(ordered.page_after(0, 5), [2])
+
+    def test_ordered_scores(self):
+        order = SortOrder(self.rows, "title")
+        scores = {0: 1, 1: 0, 2: 1, 3: 1}
+        for reverse, expected in ((False, [1, 3, 0, 2]), (True, [1, 2, 0, 3])):
+            ordered = order.ordered([0, 1, 2, 3], reverse=reverse, scores=scores)
+            self.assertEqual(ordered.page(0, 4), expected)
+            self.assertEqual(ordered.page_after(expected[1], 5), expected[2:])
+            self.assertEqual(ordered.materialise().page(1, 3), expected[1:3])
+            self.assertEqual(ordered.page_after(expected[0], 1), expected[1:2])
+
+
+class QueryCacheTestCase(unittest.TestCase):
+    def test_lru(self):
+        cache = QueryCache(max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats["evictions"], 1)
+        self.assertEqual((cache.stats["hits"], cache.stats["misses"]), (2, 1))
+
+    def test_size_ttl_and_source(self):
+        cache = QueryCache(max_size=10)
+        cache.put("a", 1, size=6)
+        cache.put("b", 2, size=6)
+        self.assertEqual(len(cache), 1)
+        cache.put("c", 3, size=11)
+        self.assertIsNone(cache.get("c"))
+        # results from a replaced index are never returned
+        self.assertIsNone(cache.get("b", source=object()))
+        self.assertEqual(len(cache), 0)
+        with mock.patch("time.monotonic", return_value=100.0):
+            cache = QueryCache(ttl=5)
+            cache.put("a", 1)
+        with mock.patch("time.monotonic", return_value=106.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertFalse(QueryCache(max_entries=0).enabled)
+        with self.assertRaises(ValueError):
+            QueryCache(ttl=0)
+
+
+class PostingListTestCase(unittest.TestCase):
+    def test_append(self):
+        postings = PostingList()
+        postings.append(1)
+        postings.append(1)
+        postings.append(4)
+        self.assertEqual(postings.ids.tolist(), [1, 4])
+        self.assertIn(4, postings)
+        self.assertNotIn(2, postings)
+        with self.assertRaises(ValueError):
+            postings.append(2)
+
+    def test_union(self):
+        rv = union([PostingList([1, 3, 5]), PostingList([2, 3]), PostingList()])
+        self.assertEqual(rv, PostingList([1, 2, 3, 5]))
+        self.assertEqual(union([]), PostingList())
+
+    def test_intersection(self):
+        rv = intersection([PostingList([1, 3, 5, 7]), PostingList([3, 4, 5])])
+        self.assertEqual(rv, PostingList([3, 5]))
+        large = PostingList(range(0, 1000, 2))
+        self.assertEqual(large.intersection(PostingList([3, 4, 998])), PostingList([4, 998]))
+        self.assertEqual(intersection([large, PostingList()]), PostingList())
+
+    def test_difference(self):
+        rv = difference(PostingList([1, 2, 3, 4]), PostingList([2, 4, 6]))
+        self.assertEqual(rv, PostingList([1, 3]))
+
+
+class PrefixIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.index = PrefixIndex()
+        for i, key in enumerate(["chris pratt", "chris evans", "christian bale", "bradley cooper", "chris pratt"]):
+            self.index.add(key, i)
+
+    def test_prefix_keys(self):
+        self.assertEqual(self.index.prefix_keys("chris"), ["chris evans", "chris pratt", "christian bale"])
+        self.assertEqual(self.index.prefix_keys("chris "), ["chris evans", "chris pratt"])
+        self.assertEqual(self.index.prefix_keys("z"), [])
+        self.assertEqual(len(self.index.prefix_keys("")), 4)
+
+    def test_prefix_postings(self):
+        self.assertEqual(self.index["chris pratt"], PostingList([0, 4]))
+        self.assertEqual(self.index.prefix_postings("chris p"), PostingList([0, 4]))
+        self.assertEqual(self.index.prefix_postings("c"), PostingList([0, 1, 2, 4]))
+        self.index.add("carey mulligan", 5)
+        self.assertEqual(self.index.prefix_postings("c"), PostingList([0, 1, 2, 4, 5]))
+
+    def test_deep_key(self):
+        index = PrefixIndex()
+        index.add("a" * 10000, 0)
+        self.assertEqual(index.prefix_postings("a" * 5000), PostingList([0]))
+
+
+class FuzzyIndexTestCase(unittest.TestCase):
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance("chirs", "chris", 2), 1)
+        self.assertEqual(edit_distance("gardians", "guardians", 2), 1)
+        self.assertEqual(edit_distance("kitten", "sitting", 5), 3)
+        self.assertEqual(edit_distance("kitten", "sitting", 1), 2)
+
+    def test_matches(self):
+        keys = ["chris evans", "chris pratt", "guardians of the galaxy", "pratt"]
+        index = FuzzyIndex.from_keys(keys)
+        self.assertEqual(index.matches("chirs prat"), {1: 2})
+        self.assertEqual(index.matches("pratt"), {1: 0, 3: 0})
+        self.assertEqual(index.matches("guardians galaxy"), {2: 0})
+        # short words must match exactly
+        self.assertEqual(index.matches("of"), {2: 0})
+        self.assertEqual(index.matches("ox"), {})
+
+
+class SuggestIndexTestCase(unittest.TestCase):
+    def test_suggest(self):
+        keys = ["chris evans", "chris pine", "chris pratt", "christian bale", "zoe saldana"]
+        index = SuggestIndex.from_scores(keys, [3, 1, 2, 5, 4], k=2)
+        self.assertEqual(index.suggest("chris"), [3, 0])
+        self.assertEqual(index.suggest("chris p"), [2, 1])
+        self.assertEqual(index.suggest(""), [3, 4])
+        self.assertEqual(index.suggest("c", 1), [3])
+        self.assertEqual(index.suggest("x"), [])
+        # only prefixes with at least k keys are stored
+        self.assertEqual(len(index), len(["", "c", "ch", "chr", "chri", "chris", "chris ", "chris p"]))
+
+    def test_ties(self):
+        index = SuggestIndex.from_scores(["a", "ab", "ac"], [(1, 2), (1, 3), (1, 2)])
+        self.assertEqual(index.suggest("a"), [1, 0, 2])
+
+
+class SubstringIndexTestCase(unittest.TestCase):
+    def test_suffix_array(self):
+        for text in (b"banana", b"mississippi\x00miss\x00", b"aaaa", b""):
+            expected = sorted(range(len(text)), key=lambda i: text[i:])
+            self.assertEqual(suffix_array(text).tolist(), expected)
+
+    def test_search(self):
+        index = SubstringIndex.from_keys(["chris evans", "chris pratt", "pratt", "zoë kravitz"])
+        self.assertEqual(index.search("pratt").tolist(), [1, 2])
+        self.assertEqual(index.search("ë").tolist(), [3])
+        self.assertEqual(index.search("s p").tolist(), [1])
+        self.assertEqual(index.search("").tolist(), [0, 1, 2, 3])
+        # matches never span two keys
+        self.assertEqual(index.search("ttpr").tolist(), [])
+        self.assertEqual(index.count("r"), 5)
+
+
+class TextIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        builder = TextIndexBuilder()
+        builder.add(0, "A space station crew fights an alien in space")
+        builder.add(1, "A farmer becomes an astronaut")
+        builder.add(3, "Space farmers on a space farm, a comedy in space and in time about space")
+        self.index = builder.build(5)
+
+    def test_postings(self):
+        self.assertEqual(self.index.lengths.tolist(), [9, 5, 0, 15, 0])
+        self.assertEqual(self.index.document_frequency("space"), 2)
+        self.assertEqual(self.index.document_frequency("galaxy"), 0)
+        with self.assertRaises(ValueError):
+            builder = TextIndexBuilder()
+            builder.add(2, "late")
+            builder.add(1, "early")
+
+    def test_search(self):
+        self.assertEqual([x for x, _ in self.index.search("space")], [3, 0])
+        # the rarer word counts for more than the repeated common one
+        self.assertEqual([x for x, _ in self.index.search("space astronaut")], [1, 3, 0])
+        self.assertEqual([x for x, _ in self.index.search("space astronaut", k=1)], [1])
+        ids, scores = self.index.scores("farm alien")
+        self.assertEqual(ids.tolist(), [0, 3])
+        # a text matching several words scores the sum of their scores
+        both = dict(zip(*self.index.scores("space farm")))
+        self.assertAlmostEqual(both[3], self.index.scores("space")[1][1] + self.index.scores("farm")[1][0], places=5)
+        self.assertEqual(self.index.search("nothing"), [])
+
+
+class QueryParserTestCase(unittest.TestCase):
+    def test_plain_query(self):
+        self.assertEqual(parse_query("chris pratt", FIELDS), [QueryTerm("chris pratt")])
+        self.assertEqual(parse_query("", FIELDS), [QueryTerm("")])
+
+    def test_fielded_query(self):
+        terms = parse_query('actor:"chris pratt" genre:sci-fi year:2010..2016 -genre:horror', FIELDS)
+        self.assertEqual(
+            terms,
+            [
+                QueryTerm("chris pratt", "actor"),
+                QueryTerm("sci-fi", "genre"),
+                QueryTerm("2010..2016", "year"),
+                QueryTerm("horror", "genre", negated=True),
+            ],
+        )
+        self.assertEqual(terms[2].range, (2010, 2016))
+        self.assertIsNone(terms[1].range)
+        self.assertEqual(QueryTerm("..1999", "year").range, (None, 1999))
+        self.assertEqual(QueryTerm("7.5..8", "rating").range, (7.5, 8))
+        self.assertEqual(QueryTerm("8.1", "rating").number, 8.1)
+        self.assertIsNone(QueryTerm("high", "rating").number)
+
+    def test_bare_words_merge(self):
+        terms = parse_query("chris pratt genre:action re:zero", FIELDS)
+        self.assertEqual(terms, [QueryTerm("chris pratt"), QueryTerm("action", "genre"), QueryTerm("re:zero")])
+
+    def test_evaluate(self):
+        postings = {"a": PostingList([1, 2, 3, 4]), "b": PostingList([2, 3, 5]), "c": PostingList([3])}
+        all_ids = PostingList(range(6))
+        lookup = lambda term: postings.get(term.value, PostingList())
+        self.assertEqual(evaluate_query(parse_query("genre:a genre:b", FIELDS), lookup, all_ids), PostingList([2, 3]))
+        self.assertEqual(
+            evaluate_query(parse_query("genre:a -genre:c", FIELDS), lookup, all_ids), PostingList([1, 2, 4])
+        )
+        self.assertEqual(evaluate_query(parse_query("-genre:a", FIELDS), lookup, all_ids), PostingList([0, 5]))
+        self.assertEqual(evaluate_query(parse_query("genre:a genre:x", FIELDS), lookup, all_ids), PostingList())
+
+
+class MovieTableTestCase(unittest.TestCase):
+    def setUp(self):
+        movie1 = Movie("Guardians of the Galaxy", 2014)
+        movie1.actors = [Actor("Chris Pratt"), Actor("Zoe Saldana")]
+        movie1.genres = [Genre("Action"), Genre("Sci-Fi")]
+        movie1.rating = 8.1
+        movie1.revenue_millions = 333.13
+        movie2 = Movie("Passengers", 2016)
+        movie2.actors = [Actor("Chris Pratt"), Actor("Jennifer Lawrence")]
+        movie2.genres = [Genre("Romance"), Genre("Sci-Fi")]
+        movie2.rating = 7.0
+        movie3 = Movie("Moana", 2016)
+        self.table = MovieTable.from_movies([movie1, movie2, movie3])
+
+    def test_columns(self):
+        self.assertEqual(len(self.table), 3)
+        self.assertEqual(self.table["year"].tolist(), [2014, 2016, 2016])
+        self.assertEqual(self.table["title"][2], "Moana")
+        self.assertEqual(self.table["actors"][1], ["Chris Pratt", "Jennifer Lawrence"])
+        self.assertEqual(self.table["genres"].mask("Sci-Fi").tolist(), [True, True, False])
+        self.assertEqual(self.table["actors"].mask("Nobody").tolist(), [False, False, False])
+
+    def test_range(self):
+        self.assertEqual(self.table.range_postings("year", 2015, None), PostingList([1, 2]))
+        self.assertEqual(self.table.range_postings("rating", 8.1, 8.1), PostingList([0]))
+        # missing values never match a range
+        self.assertEqual(self.table.range_postings("revenue", None, None), PostingList([0]))
+
+    def test_sort_and_summary(self):
+        order, rank = self.table.sort_order("rating")
+        self.assertEqual(order.tolist(), [2, 1, 0])
+        self.assertEqual(rank.tolist(), [2, 1, 0])
+        # missing years would sort last, equal years keep ascending rows in both directions
+        self.assertEqual(self.table.sort_order("year")[0].tolist(), [0, 1, 2])
+        self.assertEqual(self.table.sort_order("year", reverse=True)[0].tolist(), [1, 2, 0])
+        self.assertEqual(self.table.sort_order("rating", reverse=True)[0].tolist(), [0, 1, 2])
+        summary = self.table.summary("rating", PostingList([0, 1]))
+        self.assertEqual(summary["count"], 2)
+        self.assertAlmostEqual(summary["mean"], 7.55, places=5)
+        self.assertEqual(self.table.summary("revenue", PostingList([2]))["count"], 0)
+
+
+class ArrayUtilsTestCase(unittest.TestCase):
+    def test_ranges(self):
+        starts, stops = np.array([2, 7, 4, 0]), np.array([5, 7, 6, 1])
+        self.assertEqual(ranges(starts, stops).tolist(), [2, 3, 4, 4, 5, 0])
+        self.assertEqual(ranges(np.array([], dtype=np.int64), np.array([], dtype=np.int64)).tolist(), [])
+
+
+class CoStarGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        casts = [["a", "b", "c"], ["c", "d"], ["d", "e"], ["a", "b"], ["f"]]
+        names = ["a", "b", "c", "d", "e", "f"]
+        offsets = np.cumsum([0] + [len(x) for x in casts])
+        self.graph = CoStarGraph.from_casts(offsets, [names.index(x) for cast in casts for x in cast], names)
+
+    def test_colleagues(self):
+        ids, shared = self.graph.colleagues(self.graph.actor_id("A"))
+        self.assertEqual([self.graph.names[i] for i in ids], ["b", "c"])
+        self.assertEqual(shared.tolist(), [2, 1])
+        self.assertTrue(self.graph.worked_with(0, 2))
+        self.assertFalse(self.graph.worked_with(0, 3))
+        self.assertEqual(len(self.graph.colleagues(self.graph.actor_id("f"))[0]), 0)
+
+    def test_path(self):
+        a, e, f = (self.graph.actor_id(x) for x in "aef")
+        self.assertEqual([self.graph.names[i] for i in self.graph.path(a, e)], ["a", "c", "d", "e"])
+        self.assertEqual([self.graph.names[i] for i in self.graph.path(e, a)], ["e", "d", "c", "a"])
+        self.assertEqual(self.graph.degrees(a, e), 3)
+        self.assertEqual(self.graph.degrees(a, a), 0)
+        self.assertIsNone(self.graph.degrees(a, e, max_degrees=2))
+        self.assertIsNone(self.graph.path(a, f))
+
+
+class SimilarityIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        # movie 0 shares two features with movies 1 and 4, one with movie 2 and none with movie 3
+        features_of = {0: [0, 1, 2], 1: [0, 1], 2: [2, 3], 3: [4], 4: [0, 1, 3]}
+        movies = [movie for movie, features in features_of.items() for _ in features]
+        features = [feature for features in features_of.values() for feature in features]
+        self.index = SimilarityIndex.from_features(5, movies, features, [1] * len(movies), 5)
+
+    def test_similar(self):
+        similar = self.index.similar(0)
+        self.assertEqual([x for x, _ in similar], [1, 4, 2])
+        self.assertAlmostEqual(similar[0][1], 2 / (3 ** 0.5 * 2 ** 0.5), places=6)
+        self.assertAlmostEqual(similar[1][1], 2 / (3 ** 0.5 * 3 ** 0.5), places=6)
+        self.assertEqual([x for x, _ in self.index.similar(0, k=1)], [1])
+        self.assertEqual(self.index.similar(3), [])
+
+    def test_broad_features(self):
+        exact = self.index.similar(0)
+        # features 0 and 1 are only added to movies found through feature 2
+        with mock.patch.object(similarity_index, "MAX_SCANNED_POSTINGS", 2):
+            self.assertEqual(self.index.similar(0), [exact[2]])
+        # a movie with only broad features still reads them all
+        with mock.patch.object(similarity_index, "MAX_SCANNED_POSTINGS", 0):
+            self.assertEqual(self.index.similar(0), exact)
+
+    def test_from_table(self):
+        table = MovieTable.from_movies(self.movies())
+        index = SimilarityIndex.from_table(table)
+        self.assertEqual([x for x, _ in index.similar(0)], [1, 2])
+
+    @staticmethod
+    def movies():
+        movie1 = Movie("Guardians of the Galaxy", 2014)
+        movie1.actors = [Actor("Chris Pratt"), Actor("Zoe Saldana")]
+        movie1.genres = [Genre("Action"), Genre("Sci-Fi")]
+        movie2 = Movie("Avengers: Infinity War", 2018)
+        movie2.actors = [Actor("Chris Pratt"), Actor("Zoe Saldana")]
+        movie2.genres = [Genre("Action")]
+        movie3 = Movie("Passengers", 2016)
+        movie3.actors = [Actor("Chris Pratt"), Actor("Jennifer Lawrence")]
+        movie3.genres = [Genre("Romance")]
+        movie4 = Movie("Moana", 2016)
+        movie4.genres = [Genre("Animation")]
+        return [movie1, movie2, movie3, movie4]
+
+
+class MovieIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.movies = SimilarityIndexTestCase.movies()
+        for i, movie in enumerate(self.movies):
+            movie.description = f"movie number {i}"
+            movie.rating = 5.0 + i
+            movie.votes = 1000
+        self.index = MovieIndex.from_movies(self.movies)
+
+    def assert_same(self, edited, built, ids):
+        """edited answers like built, whose movie i has the id ids[i] in edited"""
+
+        def renumber(postings):
+            return PostingList(sorted(ids[x] for x in postings))
+
+        self.assertEqual(list(edited.all_ids), sorted(ids))
+        for field in FIELDS:
+            for prefix in ["", "a", "chris", "zoe saldana", "new", "201"]:
+                self.assertEqual(edited.field_postings(field, prefix), renumber(built.field_postings(field, prefix)))
+        for field in ["title", "actor", "genre"]:
+            for value in ["chirs prat", "newcomer", "romance", "ssengers"]:
+                matches = built.fuzzy_matches(field, value)
+                self.assertEqual(edited.fuzzy_matches(field, value), {ids[x]: y for x, y in matches.items()})
+                self.assertEqual(
+                    edited.substring_postings(field, value), renumber(built.substring_postings(field, value))
+                )
+            for prefix in ["", "a", "n", "z"]:
+                self.assertEqual(edited.suggestions(field, prefix), built.suggestions(field, prefix))
+        for key in ["title", "actors", "rating", "votes"]:
+            for reverse in (False, True):
+                page = built.sort_orders[key].page(built.all_ids, 0, 10, reverse)
+                self.assertEqual(edited.sort_orders[key].page(edited.all_ids, 0, 10, reverse), [ids[x] for x in page])
+        self.assertEqual(edited.range_postings("year", 2016, None), renumber(built.range_postings("year", 2016, None)))
+        movie_ids, scores = edited.text_scores("description", "newcomer number 2")
+        built_ids, built_scores = built.text_scores("description", "newcomer number 2")
+        self.assertEqual(movie_ids.tolist(), [ids[x] for x in built_ids.tolist()])
+        np.testing.assert_allclose(scores, built_scores)
+        for i, movie_id in enumerate(ids):
+            self.assertEqual(json.loads(edited.row_json[movie_id]), {**built.rows[i], "idx": movie_id})
+            self.assertEqual(edited.table["actors"][movie_id], built.table["actors"][i])
+            similar = [(ids[x], score) for x, score in built.similar(i)]
+            self.assertEqual([x for x, _ in edited.similar(movie_id)], [x for x, _ in similar])
+            np.testing.assert_allclose([x for _, x in edited.similar(movie_id)], [x for _, x in similar], rtol=1e-6)
+
+    def test_edited(self):
+        added = Movie("Newcomer", 2021)
+        added.actors = [Actor("Zoe Saldana"), Actor("New Face")]
+        added.genres = [Genre("Romance")]
+        added.description = "newcomer"
+        added.rating = 9.5
+        added.votes = 5000
+        updated = Movie("Passengers", 2016)
+        updated.actors = [Actor("Jennifer Lawrence")]
+        updated.genres = [Genre("Romance"), Genre("Newgenre")]
+        edited = self.index.edited({4: added, 2: updated}, removed=[1])
+        # the edited index is new, the one requests already hold is never changed
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(len(edited), 5)
+        built = MovieIndex.from_movies([self.movies[0], updated, self.movies[3], added])
+        self.assert_same(edited, built, [0, 2, 3, 4])
+        self.assertEqual(edited.suggestions("actor", "new"), [("New Face", 1, (47500.0, 1))])
+        # a movie removed by a later edit leaves the keys it added
+        edited = edited.edited(removed=[4])
+        built = MovieIndex.from_movies([self.movies[0], updated, self.movies[3]])
+        self.assert_same(edited, built, [0, 2, 3])
+        self.assertEqual(edited.suggestions("actor", "new"), [])
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        movie1 = Movie("Guardians of the Galaxy", 2014)
+        movie1.actors = [Actor("Chris Pratt"), Actor("Zoe Saldana")]
+        movie1.genres = [Genre("Action"), Genre("Sci-Fi")]
+        movie2 = Movie("Passengers", 2016)
+        movie2.actors = [Actor("Chris Pratt"), Actor("Jennifer Lawrence")]
+        movie2.genres = [Genre("Romance"), Genre("Sci-Fi")]
+        movie2.description = "A spacecraft traveling to a distant colony planet"
+        self.movies = [movie1, movie2]
+        self.movie_index = MovieIndex.from_movies(self.movies)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source_path = os.path.join(self.tmp_dir.name, "movies.csv")
+        self.snapshot_path = os.path.join(self.tmp_dir.name, "movies.csv.snapshot")
+        with open(self.source_path, "w") as f:
+            f.write("placeholder")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        write_snapshot(self.snapshot_path, self.movie_index, source_stamp(self.source_path))
+        loaded = load_snapshot(self.snapshot_path, self.source_path)
+        self.assertIsNotNone(loaded)
+        self.assertEqual(loaded.rows[1], self.movie_index.rows[1])
+        self.assertEqual(list(loaded.field_indexes["actor"]), ["chris pratt", "jennifer lawrence", "zoe saldana"])
+        self.assertEqual(loaded.field_postings("actor", "chris"), PostingList([0, 1]))
+        self.assertEqual(loaded.field_postings("genre", "rom"), PostingList([1]))
+        self.assertEqual(loaded.sort_orders["year"].page(loaded.all_ids, 0, 2, reverse=True), [1, 0])
+        self.assertEqual(loaded.table["genres"][1], ["Romance", "Sci-Fi"])
+        self.assertEqual(loaded.range_postings("year", 2015, None), PostingList([1]))
+        built = self.movie_index.text_indexes["description"]
+        self.assertEqual(loaded.text_indexes["description"].search("colony"), built.search("colony"))
+        self.assertEqual(bytes(loaded.row_json[1]), encode_row(self.movie_index.rows[1]))
+        self.assertEqual(json.loads(loaded.row_json[0]), self.movie_index.rows[0])
+        self.assertEqual(loaded.fuzzy_matches("actor", "chirs prat"), {0: 2, 1: 2})
+        self.assertEqual(list(loaded.fuzzy_index("title").words), self.movie_index.fuzzy_index("title").words)
+        self.assertEqual(sorted(loaded.suggest_indexes), ["actor", "genre", "title"])
+        self.assertEqual(loaded.suggestions("actor", "j"), self.movie_index.suggestions("actor", "j"))
+        # the suffix arrays are mapped rather than sorted again
+        self.assertFalse(loaded.substring_index("title").suffixes.flags.owndata)
+        self.assertEqual(loaded.substring_postings("actor", "pratt"), PostingList([0, 1]))
+        self.assertEqual(loaded.substring_count("title", "a"), self.movie_index.substring_count("title", "a"))
+        self.assertFalse(loaded.similarity_index.movies.flags.owndata)
+        self.assertEqual(loaded.similar(0), self.movie_index.similar(0))
+        graph = loaded.costar_graph
+        self.assertEqual(graph.degrees(graph.actor_id("zoe saldana"), graph.actor_id("jennifer lawrence")), 2)
+        # a mapped index is edited without copying what the edit leaves alone
+        edited = loaded.edited(removed=[0])
+        self.assertEqual(edited.field_postings("actor", "chris"), PostingList([1]))
+        self.assertEqual(edited.sort_orders["year"].page(edited.all_ids, 0, 2), [1])
+
+    def test_suggestions(self):
+        movie = Movie("Crowded", 2020)
+        movie.actors = [Actor(f"Actor {i}") for i in range(12)]
+        built = MovieIndex.from_movies([movie, *self.movies])
+        write_snapshot(self.snapshot_path, built, source_stamp(self.source_path))
+        loaded = load_snapshot(self.snapshot_path, self.source_path)
+        # the top completions are mapped rather than ranked again
+        index = loaded.suggest_index("actor")[0]
+        self.assertEqual(list(index.prefixes), built.suggest_index("actor")[0].prefixes)
+        self.assertIn("actor ", index.prefixes)
+        self.assertEqual(loaded.suggestions("actor", "ACT"), built.suggestions("actor", "act"))
+        self.assertEqual(loaded.suggestions("actor", "chris"), [("Chris Pratt", 2, (0.0, 2))])
+
+    def test_stale_snapshot(self):
+        write_snapshot(self.snapshot_path, self.movie_index, source_stamp(self.source_path))
+        with open(self.source_path, "w") as f:
+            f.write("changed content")
+        self.assertIsNone(load_snapshot(self.snapshot_path, self.source_path))
+        self.assertIsNone(load_snapshot(self.snapshot_path + ".missing", self.source_path))
+
+
+class IndexManagerTestCase(unittest.TestCase):
+    HEADER = (
+        "Rank,Title,Genre,Description,Director,Actors,Year,Runtime (Minutes),Rating,Votes,Revenue (Millions),Metascore"
+    )
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source_path = os.path.join(self.tmp_dir.name, "movies.csv")
+        self.write_movies(["Arrival", "Moana", "Shrek"])
+        self.manager = IndexManager(self.source_path)
+
+    def tearDown(self):
+        self.manager.stop_watching()
+        self.tmp_dir.cleanup()
+
+    def write_movies(self, titles):
+        with open(self.source_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.HEADER.split(","))
+            for i, title in enumerate(titles):
+                writer.writerow([i + 1, title, "Drama", "", "Someone", "A, B", 2016, 100, 7.5, 1000, "N/A", 70])
+
+    def titles(self):
+        index = self.manager.index
+        return [index.rows[i]["title"] for i in index.all_ids]
+
+    def test_edits(self):
+        served = self.manager.index
+        self.manager.add_movie(Movie("Saw", 2004))
+        self.assertEqual(self.titles(), ["Arrival", "Moana", "Shrek", "Saw"])
+        # the index a request already holds is never changed
+        self.assertEqual(len(served), 3)
+        updated = Movie("Moana", 2016)
+        updated.actors = [Actor("Dwayne Johnson")]
+        self.manager.update_movie(updated)
+        self.assertEqual(self.manager.index.field_postings("actor", "dwayne"), PostingList([1]))
+        self.assertEqual(self.manager.index.field_postings("actor", "a"), PostingList([0, 2]))
+        self.manager.remove_movie(Movie("Arrival", 2016))
+        # the other movies keep their ids
+        self.assertEqual(self.titles(), ["Moana", "Shrek", "Saw"])
+        self.assertEqual(self.manager.index.all_ids, PostingList([1, 2, 3]))
+        self.assertEqual(self.manager.index.field_postings("genre", "drama"), PostingList([2]))
+        self.assertEqual(self.manager.version, 3)
+        with self.assertRaises(ValueError):
+            self.manager.remove_movie(Movie("Arrival", 2016))
+        with self.assertRaises(ValueError):
+            self.manager.add_movie(Movie("Saw", 2004))
+        self.manager.add_movie(Movie("Arrival", 2016))
+        self.assertEqual(self.manager.index.all_ids, PostingList([1, 2, 3, 4]))
+
+    def test_invalid_edits(self):
+        with self.assertRaises(ValueError):
+            self.manager.add_movie(Movie("", 2020))
+        with self.assertRaises(ValueError):
+            self.manager.update_movie(Movie("Moana", 1066))
+        movie = Movie("Saw", 2004)
+        movie.actors = [Actor("")]
+        with self.assertRaises(ValueError):
+            self.manager.add_movie(movie)
+        self.assertEqual(self.manager.version, 0)
+
+    def test_reload_keeps_edits(self):
+        updated = Movie("Moana", 2016)
+        updated.actors = [Actor("Dwayne Johnson")]
+        self.manager.update_movie(updated)
+        self.manager.add_movie(Movie("Saw", 2004))
+        self.manager.remove_movie(Movie("Shrek", 2016))
+        self.write_movies(["Zootopia", "Shrek", "Moana", "Arrival"])
+        self.assertEqual(self.manager.reload(force=True), {"added": 1, "removed": 0})
+        self.assertEqual(self.titles(), ["Arrival", "Moana", "Zootopia", "Saw"])
+        self.assertEqual(self.manager.index.all_ids, PostingList([0, 1, 2, 4]))
+        self.assertEqual(self.manager.index.field_postings("actor", "dwayne"), PostingList([1]))
+        # the snapshot only holds the data file, edits stay in the process that made them
+        self.assertEqual(len(IndexManager(self.source_path).index.all_ids), 4)
+
+    def test_reload(self):
+        self.assertIsNone(self.manager.reload())
+        self.write_movies(["Zootopia", "Shrek", "Arrival"])
+        self.assertEqual(self.manager.reload(force=True), {"added": 1, "removed": 1})
+        # movies still in the file keep their order, new ones come last
+        self.assertEqual(self.titles(), ["Arrival", "Shrek", "Zootopia"])
+        # the rebuilt snapshot is picked up by a new worker
+        self.assertEqual(len(IndexManager(self.source_path).index), 3)
+
+    def test_watch(self):
+        published = []
+        self.manager.subscribe(published.append)
+        self.manager.watch(0.01)
+        self.write_movies(["Arrival"])
+        deadline = time.monotonic() + 5
+        while not published and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.titles(), ["Arrival"])
+        self.assertIs(published[-1], self.manager.index)
+
+    def test_follow(self):
+        self.assertFalse(self.manager.refresh())
+        self.write_movies(["Zootopia", "Arrival"])
+        # another process rebuilds the snapshot, this one only maps it
+        IndexManager(self.source_path).reload(force=True)
+        self.assertTrue(self.manager.refresh())
+        self.assertEqual(self.titles(), ["Zootopia", "Arrival"])
+        self.assertFalse(self.manager.refresh())
+
+
+if __name__ == "__main__":
+    unittest.main()
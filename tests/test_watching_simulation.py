@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from activitysimulations.watchingsimulation import (
+    MovieWatchingSimulation,
+    BinaryEventSink,
+    CsvEventSink,
+    UserSink,
+    EVENT_DTYPE,
+    read_events,
+    zipf_cdf,
+)
+from datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "datafiles", "Data1000Movies.csv")
+
+
+class _ListSink:
+    def __init__(self):
+        self.batches = []
+
+    def write(self, batch):
+        self.batches.append(batch)
+
+
+class MovieWatchingSimulationTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.reader = MovieFileCSVReader(DATA_PATH)
+        cls.reader.read_csv_file()
+        cls.movies = cls.reader.dataset_of_movies
+
+    def simulation(self, seed=7):
+        return MovieWatchingSimulation(self.movies, users=500, seed=seed, start_time=0)
+
+    def test_batches(self):
+        sink = _ListSink()
+        self.assertEqual(self.simulation().run(2500, sink, batch_size=1000), 2500)
+        self.assertEqual([len(x) for x in sink.batches], [1000, 1000, 500])
+        events = np.concatenate(sink.batches)
+        self.assertEqual(events.dtype, EVENT_DTYPE)
+        self.assertTrue(np.all(np.diff(events["timestamp"]) >= 0))
+        self.assertTrue(np.all(events["user"] < 500))
+        self.assertTrue(
+            np.all(events["minutes"] <= np.array([x.runtime_minutes for x in self.movies])[events["movie"]])
+        )
+        self.assertTrue(set(events["rating"].tolist()) <= set(range(11)))
+        # the most voted movie is picked most often
+        most_voted = max(range(len(self.movies)), key=lambda i: self.movies[i].votes or 0)
+        self.assertEqual(np.bincount(events["movie"]).argmax(), most_voted)
+
+    def test_reproducible(self):
+        serial = np.concatenate(list(self.simulation().iter_batches(3000, batch_size=500)))
+        parallel = np.concatenate(list(self.simulation().iter_batches(3000, batch_size=500, workers=2)))
+        self.assertTrue(np.array_equal(serial, parallel))
+        self.assertTrue(np.array_equal(self.simulation().batch(3, batch_size=500), serial[1500:2000]))
+        self.assertFalse(np.array_equal(self.simulation(seed=8).batch(0, batch_size=500), serial[:500]))
+
+    def test_zipf_cdf(self):
+        cdf = zipf_cdf(3, 1.0)
+        self.assertTrue(np.allclose(cdf, np.cumsum([1, 1 / 2, 1 / 3]) / (1 + 1 / 2 + 1 / 3)))
+
+    def test_file_sinks(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "events.bin")
+            with BinaryEventSink(path) as sink:
+                self.simulation().run(1200, sink, batch_size=500)
+            events = read_events(path)
+            self.assertTrue(np.array_equal(events, np.concatenate(list(self.simulation().iter_batches(1200, 500)))))
+            csv_path = os.path.join(tmp_dir, "events.csv")
+            with CsvEventSink(csv_path) as sink:
+                self.simulation().run(10, sink)
+            with open(csv_path) as f:
+                lines = f.read().splitlines()
+            self.assertEqual(lines[0], "timestamp,user,movie,minutes,rating")
+            self.assertEqual(len(lines), 11)
+
+    def test_user_sink(self):
+        sink = UserSink(self.movies, self.reader.registry)
+        sink.write(self.simulation().batch(0, batch_size=2000))
+        events = self.simulation().batch(0, batch_size=2000)
+        user_id = int(np.bincount(events["user"]).argmax())
+        user = sink.users[user_id]
+        mine = events[events["user"] == user_id]
+        self.assertEqual(user.user_name, f"user{user_id}")
+        self.assertEqual(user.time_spent_watching_movies_minutes, int(mine["minutes"].sum()))
+        self.assertEqual(len(user.watched_movies), len(set(mine["movie"].tolist())))
+        self.assertEqual(len(user.reviews), int((mine["rating"] > 0).sum()))
+        self.assertIs(user.watched_movies[0], self.movies[mine["movie"][0]])
+
+
+if __name__ == "__main__":
+    unittest.main()